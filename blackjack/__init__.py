@@ -1,74 +1,152 @@
+from array import array
 import itertools
-from random import shuffle
-import time
+import math
+import random
+
+from blackjack.clock import PAUSES, RealClock
+from blackjack.events import console_events
+from blackjack.rules import (ACTION_NAMES, BLACKJACK, BUST, DEALER_BLACKJACK,
+                             DOUBLE, FINISHED, HIT, NO_STATUS, SPLIT,
+                             STATUSES, STATUS_CODES, STAY, SURRENDER,
+                             DEFAULT_RULES, Rules)
+
+SUITS = ('Spades', 'Clubs', 'Diamonds', 'Hearts')
+RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen',
+         'King', 'Ace')
+# Cards are encoded as suit_index * 13 + rank_index, so a deck is range(52)
+DECK_SIZE = len(SUITS) * len(RANKS)
+CARD_CODES = {(rank, suit): suit_index * len(RANKS) + rank_index
+              for suit_index, suit in enumerate(SUITS)
+              for rank_index, rank in enumerate(RANKS)}
+RANK_INDEX = {rank: rank_index for rank_index, rank in enumerate(RANKS)}
 
 
 class Table(object):
-    """Table class."""
-
-    def __init__(self, min_bet=5, max_bet=100):
+    """Table class.
+
+    With a metrics registry (blackjack.metrics.Metrics) the table times
+    every phase of start_game, each player's bets and decisions and the
+    shoe's resets. Pauses go through clock, a blackjack.clock.RealClock
+    unless given, the table and its shoe share it. rules (a
+    blackjack.rules.Rules) default to the original single deck game.
+    """
+
+    def __init__(self,
+                 min_bet=5,
+                 max_bet=100,
+                 events=None,
+                 rng=None,
+                 shuffle_pool=None,
+                 metrics=None,
+                 clock=None,
+                 rules=None):
         self.game_mode = 'debug'
         self.min_bet = min_bet
         self.max_bet = max_bet
-        self.players = []
+        self.events = console_events() if events is None else events
+        self.players = PlayerRegistry()
         self.dealer = Player({'id': 'dealer', 'name': 'Max', 'chips': 1000000})
-        self.shoe = Shoe(1)
+        self.metrics = metrics
+        self.clock = RealClock() if clock is None else clock
+        self.rules = Rules(deck_count=1) if rules is None else rules
+        if self.rules.continuous_shuffle:
+            self.shoe = ContinuousShuffler(self.rules.deck_count, rng=rng)
+        else:
+            self.shoe = Shoe(self.rules.deck_count,
+                             events=self.events,
+                             rng=rng,
+                             shuffle_pool=shuffle_pool,
+                             metrics=metrics,
+                             clock=self.clock)
         self.game_on = False
 
+    @property
+    def players(self):
+        """PlayerRegistry of the seated players."""
+        return self._players
+
+    @players.setter
+    def players(self, players):
+        self._players = (players if isinstance(players, PlayerRegistry) else
+                         PlayerRegistry(players))
+
     def add_player(self, player):
         """Adds a player."""
-        self.players.append(player)
+        self.players.add(player)
 
     def remove_player(self, player_id):
-        """Remove player."""
-        player_to_remove = [
-            player for player in self.players if player.id == player_id
-        ][0]
+        """Remove player, raises KeyError when they aren't seated."""
+        return self.players.remove(player_id)
 
     def start_game(self):
         """Start game."""
         self.game_on = True
         self.shoe.shuffle()
-        while any([player.chips >= self.min_bet for player in self.players]):
-            self.clear_table()
-            self.take_bets()
-            self.deal_cards()
-            self.play_hand()
-            self.pay_out_and_collect()
-
-        print('GAME OVER!')
+        phases = [
+            self.clear_table, self.take_bets, self.deal_cards, self.play_hand,
+            self.pay_out_and_collect
+        ]
+        if self.metrics is not None:
+            rounds = self.metrics.counter('blackjack_rounds_total')
+            phases = [
+                self.metrics.timed(phase,
+                                   'blackjack_phase_seconds',
+                                   phase=phase.__name__) for phase in phases
+            ] + [rounds.inc]
+        # Players who can still bet, recounted by pay_out_and_collect
+        self.funded = sum(player.chips >= self.min_bet
+                          for player in self.players)
+        while self.funded:
+            for phase in phases:
+                phase()
+
+        self.events.emit('game_over')
+        self.events.flush()
 
     def take_bets(self):
         """Take bets."""
         for player in self.players:
             while True:
-                bet_amt = input(f'{player} how much would you like to bet? ')
+                self.events.flush()
+                bet_amt = self.ask(
+                    f'{player} how much would you like to bet? ', 'bet')
                 if not is_valid_bet_amt(bet_amt, self.min_bet, self.max_bet,
-                                        player.chips):
+                                        player.chips, self.events):
                     continue
                 else:
                     break
             player.hand.set_bet_amt(int(bet_amt))
 
+    def ask(self, prompt, activity):
+        """Player input for prompt, a 'bet' or 'decision' activity.
+
+        Timed into blackjack_<activity>_seconds with metrics on.
+        """
+        self.clock.think(activity)
+        if self.metrics is None:
+            return input(prompt)
+        with self.metrics.time(f'blackjack_{activity}_seconds'):
+            return input(prompt)
+
     def clear_table(self):
-        # Add old cards to discard_pile for each player
-        for player in self.players:
-            if player.hand:
-                self.shoe.discard_pile += player.hand.cards
-            player.hand = Hand()
+        # Add old cards to discard_pile for each player and the dealer
+        for player in itertools.chain(self.players, (self.dealer, )):
+            for hand in player.hands:
+                self.shoe.discard(hand.cards)
+            player.hands.clear()
 
-        # Add dealers cards to discard pile
-        if self.dealer.hand:
-            self.shoe.discard_pile += self.dealer.hand.cards
-        self.dealer.hand = Hand()
+        # Reshuffle once the cut card came out
+        if len(self.shoe) <= self.rules.reshuffle_at:
+            self.events.emit('reset')
+            self.shoe.reshuffle()
 
-        # Add sleep time to simulate time between hands
-        sleep(3)
+        # Pause to simulate time between hands
+        self.clock.sleep(PAUSES['round'], 'round')
 
     def deal_cards(self):
         """Deal cards."""
-        game_command('Dealing the cards...')
-        sleep(.5 * len(self.players))
+        self.events.emit('deal', players=self.players)
+        self.clock.sleep(PAUSES['deal'] * len(self.players), 'deal')
         # done_dealing is true when all players and the dealer have 2 cards
         done_dealing = all(
             [[len(player.hand.cards) == 2 for player in self.players],
@@ -77,163 +155,544 @@ class Table(object):
         while not done_dealing:
             for player in self.players:
                 if len(player.hand.cards) < 2:
-                    player.hand.cards.append(self.shoe.get_top_card())
-            self.dealer.hand.cards.append(self.shoe.get_top_card())
+                    player.hand.add_card(self.shoe.get_top_card())
+            self.dealer.hand.add_card(self.shoe.get_top_card())
             # reset done_dealing
             done_dealing = all(
                 [[len(player.hand.cards) == 2 for player in self.players],
                  len(self.dealer.hand.cards) == 2])
+        self.events.emit('dealt',
+                         players=self.players,
+                         dealer_hand=self.dealer.hand)
 
     def play_hand(self):
         """Play Hand."""
 
         if self.dealer.hand.check_for_blackjack():
-            print(f'BLACKJACK FOR DEALER {hand}')
+            self.events.emit('dealer_blackjack', hand=self.dealer.hand)
             # Set all other player hands to dealer_blackjack
             for player in self.players:
-                player.hand.set_status('dealer_blackjack')
+                player.hand.status_code = DEALER_BLACKJACK
 
         for player in self.players:
-            hand = player.hand
+            hands = player.hands
 
-            # In the event player is dealt double Aces,
-            # one ace will be downgraded to value=1
-            hand.check_for_bust()  # In case double Aces is dealt
-
-            if hand.check_for_blackjack():
-                print(f'BLACKJACK FOR {player} with {hand}!!!!')
+            if hands[0].check_for_blackjack():
+                self.events.emit('blackjack', player=player, hand=hands[0])
                 continue
 
-            while hand.status not in ('bust', 'stay', 'dealer_blackjack'):
-                print('')
-                print(
-                    f'{player} you have {player.hand.generate_hand_summary()}')
-                print('What would you like to do?')
-                game_legend('H=Hit, S=Stay')
-                decision = input('Decision: ').upper()
-
-                if decision == 'H':
-                    hand.set_status('hit')
-                    hand.hit(self.shoe.get_top_card())
-                    if hand.check_for_bust():
-                        print(f'{player} BUSTS!!!!!')
-                    if hand.calculate_total() == 21:
-                        print(f'Nice Hit {player}')
-                        print(
-                            f'You have {player.hand.generate_hand_summary()}')
-                        hand.set_status('stay')
-                elif decision == 'S':
-                    hand.set_status('stay')
-                    continue
+            # Splitting appends hands, which are played in turn
+            index = 0
+            while index < len(hands):
+                self.play_player_hand(player, index)
+                index += 1
 
         # Process dealers turn
         dealer_hand = self.dealer.hand
+        dealer_hits = self.rules.dealer_hits
+
+        while dealer_hits[dealer_hand.is_soft][dealer_hand.calculate_total()]:
+            card = self.shoe.get_top_card()
+            dealer_hand.hit(card)
+            self.events.emit('hit',
+                             player=self.dealer,
+                             hand=dealer_hand,
+                             card=card)
+            dealer_hand.check_for_bust()
 
-        # In event dealer is dealt double aces
-        # one ace will be downgraded to value=1
-        dealer_hand.check_for_bust()
+    def play_player_hand(self, player, index):
+        """Play the player's hand at index until it is finished."""
+        hands = player.hands
+        hand = hands[index]
+        if len(hand.cards) == 1:
+            self.deal_split_card(player, hand)
+
+        while hand.status_code not in FINISHED:
+            actions = self.rules.actions(hands, hand, player.chips)
+            options = ', '.join(f'{action}={ACTION_NAMES[action]}'
+                                for action in actions)
+            self.events.emit('decision',
+                             player=player,
+                             hand=hand,
+                             options=options)
+            self.events.flush()
+            decision = self.ask('Decision: ', 'decision').upper()
+            if decision not in actions:
+                continue
 
-        while (dealer_hand.calculate_total() < 17):
-            dealer_hand.hit(self.shoe.get_top_card())
-            dealer_hand.check_for_bust()
+            if decision == 'R':
+                hand.status_code = SURRENDER
+                self.events.emit('surrender', player=player, hand=hand)
+            elif decision == 'D':
+                card = self.shoe.get_top_card()
+                hand.double(card)
+                self.events.emit('double', player=player, hand=hand, card=card)
+                if hand.check_for_bust():
+                    self.events.emit('bust', player=player, hand=hand)
+            elif decision == 'P':
+                new_hand = hands.split(index)
+                self.events.emit('split',
+                                 player=player,
+                                 hand=hand,
+                                 new_hand=new_hand)
+                self.deal_split_card(player, hand)
+            elif decision == 'H':
+                card = self.shoe.get_top_card()
+                hand.hit(card)
+                self.events.emit('hit', player=player, hand=hand, card=card)
+                if hand.check_for_bust():
+                    self.events.emit('bust', player=player, hand=hand)
+                if hand.calculate_total() == 21:
+                    self.events.emit('nice_hit', player=player, hand=hand)
+                    hand.status_code = STAY
+            elif decision == 'S':
+                hand.status_code = STAY
+
+    def deal_split_card(self, player, hand):
+        """Deal the second card of a hand that was split.
+
+        The hand stays on 21, and split Aces stay unless they can split
+        again.
+        """
+        card = self.shoe.get_top_card()
+        hand.add_card(card)
+        self.events.emit('hit', player=player, hand=hand, card=card)
+        actions = self.rules.actions(player.hands, hand, player.chips)
+        if hand.calculate_total() == 21 or actions == 'S':
+            hand.status_code = STAY
 
     def pay_out_and_collect(self):
         """Pay out and collect."""
-        print('')
-        print('******************************************************************')
+        events = self.events
+        events.emit('settle')
         dealer_hand = self.dealer.hand
-        if dealer_hand.status == 'bust':
-            print(
-                f'DEALER BUSTS with {dealer_hand.generate_hand_summary(False)}'
-            )
-        else:
-            print(f'Dealer has {dealer_hand.generate_hand_summary(False)}')
-        dealer_total = self.dealer.hand.calculate_total()
+        events.emit('dealer_result', hand=dealer_hand)
 
         # For each player check if they beat dealer
+        settle = self.rules.settle
+        min_bet = self.min_bet
+        self.funded = 0
         for player in self.players:
-            hand = player.hand
-            bet_amt = player.hand.bet_amt
-
-            if hand.calculate_total() > 21:
-                player.subtract_chips(bet_amt)
-                print(
-                    f'{player} loses {bet_amt} dollars. Total remaining chips: {player.chips}'
-                )
-            elif dealer_total > 21:
-                player.add_chips(bet_amt)
-                print(
-                    f'{player} wins {bet_amt} dollars. Total remaining chips: {player.chips}'
-                )
-            elif (hand.calculate_total() > dealer_total):
-                player.add_chips(bet_amt)
-                print(
-                    f'{player} wins {bet_amt} dollars. Total remaining chips: {player.chips}'
-                )
-            elif (hand.status == 'blackjack') and (
-                    dealer_hand.status == 'blackjack'):
-                print(f'{player} and dealer both have blackjack. PUSH')
-            elif (
-                (hand.status == 'blackjack') 
-                and (dealer_hand.status !='blackjack')
-                ):
-                print(
-                    f'{player} wins {bet_amt} dollars. Total remaining chips: {player.chips}'
-                )
-            elif (hand.calculate_total() <= dealer_total):
-                player.subtract_chips(bet_amt)
-                print(
-                    f'{player} loses {bet_amt} dollars. Total remaining chips: {player.chips}'
-                )
-
-        print('******************************************************************')
-        print('')
+            for hand in player.hands:
+                amount = settle(hand, dealer_hand) * hand.bet_amt
+
+                if amount > 0:
+                    player.add_chips(amount)
+                    kind = 'win'
+                elif amount < 0:
+                    player.subtract_chips(-amount)
+                    kind = 'lose'
+                else:
+                    kind = 'push'
+                events.emit(kind,
+                            player=player,
+                            hand=hand,
+                            dealer_hand=dealer_hand,
+                            amount=abs(amount),
+                            chips=player.chips)
+            if player.chips >= min_bet:
+                self.funded += 1
 
+        events.emit('settled')
 
-class Shoe(object):
-    """Shoe class."""
 
-    def __init__(self, deck_count=6):
-        suits = ['Spades', 'Clubs', 'Diamonds', 'Hearts']
-        ranks = [
-            '2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen',
-            'King', 'Ace'
+class Shoe(object):
+    """Shoe class.
+
+    Shuffles with rng, the random module unless given, which can be any
+    object with a shuffle method such as a seeded random.Random. With a
+    shuffle_pool (a blackjack.shuffling.ShufflePool) the cards are put in a
+    pre-shuffled order instead, without the dealer's shuffling pauses.
+    Resets are timed into metrics when a registry is given, the dealer's
+    pauses go through clock (a RealClock unless given).
+    """
+
+    def __init__(self,
+                 deck_count=6,
+                 counting_systems=None,
+                 events=None,
+                 rng=None,
+                 shuffle_pool=None,
+                 metrics=None,
+                 clock=None):
+        self.events = console_events() if events is None else events
+        self.metrics = metrics
+        self.clock = RealClock() if clock is None else clock
+        self.rng = random if rng is None else rng
+        self.shuffle_pool = shuffle_pool
+        # Create one Card per physical card, so each deck has its own Aces
+        self.cards = [
+            Card(rank, suit) for _ in range(deck_count) for suit in SUITS
+            for rank in RANKS
         ]
-        # Create deck of cards and multiply by deck_count to create shoe
-        self.cards = [Card(rank, suit) for suit in suits
-                      for rank in ranks] * deck_count
         self.discard_pile = []
+        # Counting is opt-in, counting_systems=() only counts cards per rank
+        self.counter = (None if counting_systems is None else CardCounter(
+            deck_count, counting_systems))
+
+    def __len__(self):
+        return len(self.cards)
+
+    def reshuffle(self):
+        """Gather the undealt and discarded cards and shuffle them."""
+        self.discard_pile += self.cards
+        self.cards = []
+        self.reset()
 
     def shuffle(self):
         """Shuffle the cards."""
-        game_command('Dealer is shuffling...')
-        sleep(3)
-        shuffle(self.cards)
+        self.events.emit('shuffle')
+        if self.shuffle_pool is not None:
+            self.cards = self.shuffle_pool.order(self.cards)
+            return
+        self.clock.sleep(PAUSES['shuffle'], 'shuffle')
+        self.rng.shuffle(self.cards)
 
     def reset_ace_values(self):
-        """Resets all Ace values to 11 in a list of cards."""
+        """Resets all Ace values to 11 in a list of cards.
+
+        Hands no longer downgrade Aces, so reset doesn't need this anymore.
+        """
         aces = list(filter(lambda card: card.rank == 'Ace', self.cards))
         for ace in aces:
             ace.value = 11
 
     def reset(self):
-        """Move all cards from discard pile to shoe."""
+        """Move all cards from discard pile to shoe.
+
+        Timed into blackjack_shoe_reset_seconds with metrics on.
+        """
+        if self.metrics is None:
+            self._reset()
+        else:
+            with self.metrics.time('blackjack_shoe_reset_seconds'):
+                self._reset()
+
+    def _reset(self):
         self.cards = self.discard_pile
-        # Set value for all aces to 11
-        self.reset_ace_values()
         self.discard_pile = []
-        sleep(3)  # Simulate reset time when game mode is not debug
+        if self.counter is not None:
+            remaining = [0] * len(RANKS)
+            for card in self.cards:
+                remaining[RANK_INDEX[card.rank]] += 1
+            self.counter.reset(remaining)
+        if self.shuffle_pool is None:
+            self.clock.sleep(PAUSES['reset'], 'reset')
         self.shuffle()
 
     def get_top_card(self):
         """Gets top card from the shoe, handles end of shoe."""
         if len(self.cards) > 0:
-            return self.cards.pop(0)
+            card = self.cards.pop(0)
+            if self.counter is not None:
+                self.counter.remove(RANK_INDEX[card.rank])
+            return card
         else:  # If no more cards, reset the shoe
-            print('Dealer is resetting the shoe...')
+            self.events.emit('reset')
             self.reset()
             return self.get_top_card()
 
+    def discard(self, cards):
+        """Add cards to the discard pile."""
+        self.discard_pile += cards
+
+
+class CompactShoe(object):
+    """Shoe storing cards as integer codes in an array.
+
+    Cards are dealt by advancing a cursor and reshuffled in place,
+    get_top_card hands out the shared Card for a code. Shuffles and resets
+    silently, using rng (the random module unless given) to shuffle, or the
+    next ordering of shuffle_pool when one is given. Without a clock the
+    shoe doesn't pause at all.
+    """
+
+    def __init__(self,
+                 deck_count=6,
+                 rng=None,
+                 counting_systems=None,
+                 shuffle_pool=None,
+                 clock=None):
+        self.deck_count = deck_count
+        self.rng = random if rng is None else rng
+        self.shuffle_pool = shuffle_pool
+        self.clock = clock
+        self.cards = array('B', range(DECK_SIZE)) * deck_count
+        self.cursor = 0
+        self.discard_pile = array('B')
+        # Counting is opt-in, counting_systems=() only counts cards per rank
+        self.counter = (None if counting_systems is None else CardCounter(
+            deck_count, counting_systems))
+
+    def __len__(self):
+        return len(self.cards) - self.cursor
+
+    def shuffle(self):
+        """Shuffle the undealt cards in place."""
+        if self.cursor:
+            del self.cards[:self.cursor]
+            self.cursor = 0
+        self._shuffle_cards()
+
+    def reshuffle(self):
+        """Gather the undealt and discarded cards and shuffle them."""
+        self.discard_pile.extend(self.cards[self.cursor:])
+        self.cursor = len(self.cards)
+        self.reset()
+
+    def reset(self):
+        """Move all cards from discard pile to shoe."""
+        # Swap buffers so neither array is reallocated
+        self.cards, self.discard_pile = self.discard_pile, self.cards
+        del self.discard_pile[:]
+        self.cursor = 0
+        if self.counter is not None:
+            data = self.cards.tobytes()
+            remaining = [0] * len(RANKS)
+            for code in range(DECK_SIZE):
+                remaining[code % len(RANKS)] += data.count(code)
+            self.counter.reset(remaining)
+        if self.clock is not None and self.shuffle_pool is None:
+            self.clock.sleep(PAUSES['reset'], 'reset')
+        self._shuffle_cards()
+
+    def _shuffle_cards(self):
+        if self.shuffle_pool is None:
+            if self.clock is not None:
+                self.clock.sleep(PAUSES['shuffle'], 'shuffle')
+            self.rng.shuffle(self.cards)
+        else:
+            self.cards[:] = array('B', self.shuffle_pool.order(self.cards))
+
+    def deal(self):
+        """Deals the code of the top card, handles end of shoe."""
+        cursor = self.cursor
+        try:
+            code = self.cards[cursor]
+        except IndexError:
+            self.reset()
+            cursor = 0
+            code = self.cards[0]
+        self.cursor = cursor + 1
+        if self.counter is not None:
+            self.counter.remove(code % len(RANKS))
+        return code
+
+    def get_top_card(self):
+        """Gets top card from the shoe, handles end of shoe."""
+        # deal() inlined, saving a call per card
+        cursor = self.cursor
+        try:
+            code = self.cards[cursor]
+        except IndexError:
+            self.reset()
+            cursor = 0
+            code = self.cards[0]
+        self.cursor = cursor + 1
+        if self.counter is not None:
+            self.counter.remove(code % len(RANKS))
+        return CARDS[code]
+
+    def discard(self, cards):
+        """Add cards to the discard pile."""
+        self.discard_pile.extend([card.code for card in cards])
+
+    def discard_codes(self, codes):
+        """Add encoded cards to the discard pile."""
+        self.discard_pile.extend(codes)
+
+
+class ContinuousShuffler(object):
+    """Continuous shuffling machine.
+
+    Discards go straight back into the machine, each at a random position
+    among the cards in it, and cards are dealt from the top, so there is
+    never anything to reshuffle. Cards are kept as codes in blocks of fewer
+    than block_size, reinserting a card only shifts the codes of one block:
+    the block is drawn with chance proportional to its size by rejection,
+    which gives every position the same chance in constant expected time.
+    Full blocks are split in two. rng needs shuffle and random methods, it
+    is the random module unless given.
+    """
+
+    def __init__(self,
+                 deck_count=6,
+                 rng=None,
+                 counting_systems=None,
+                 block_size=None):
+        self.deck_count = deck_count
+        self.rng = random if rng is None else rng
+        self.block_size = block_size or max(
+            8, 2 * int(math.sqrt(deck_count * DECK_SIZE)))
+        self.blocks = []
+        self.count = 0
+        # Counting is opt-in, counting_systems=() only counts cards per rank
+        self.counter = (None if counting_systems is None else CardCounter(
+            deck_count, counting_systems))
+        self._fill(array('B', range(DECK_SIZE)) * deck_count)
+
+    def __len__(self):
+        return self.count
+
+    def _fill(self, cards):
+        self.rng.shuffle(cards)
+        half = self.block_size // 2
+        self.blocks = [
+            cards[start:start + half] for start in range(0, len(cards), half)
+        ]
+        self.count = len(cards)
+
+    def shuffle(self):
+        """Shuffle all cards in the machine."""
+        cards = array('B')
+        for block in self.blocks:
+            cards.extend(block)
+        self._fill(cards)
+
+    def reshuffle(self):
+        """Nothing to gather, discards are already back in the machine."""
+
+    def deal(self):
+        """Deals the code of the top card."""
+        if not self.count:
+            raise ValueError('The shuffling machine is empty')
+        blocks = self.blocks
+        block = blocks[-1]
+        code = block.pop()
+        if not block:
+            blocks.pop()
+        self.count -= 1
+        if self.counter is not None:
+            self.counter.remove(code % len(RANKS))
+        return code
+
+    def get_top_card(self):
+        """Gets top card from the machine."""
+        return CARDS[self.deal()]
+
+    def insert(self, code):
+        """Put the card encoded as code back at a random position."""
+        self.discard_codes((code, ))
+
+    def discard(self, cards):
+        """Put cards back into the machine."""
+        self.discard_codes([card.code for card in cards])
+
+    def discard_codes(self, codes):
+        """Put encoded cards back into the machine at random positions."""
+        random = self.rng.random
+        blocks = self.blocks
+        block_size = self.block_size
+        counter = self.counter
+        for code in codes:
+            if not blocks or random() * (self.count + 1) < 1:
+                # On top, to be dealt next
+                if not blocks:
+                    blocks.append(array('B'))
+                index = len(blocks) - 1
+                block = blocks[index]
+                block.append(code)
+            else:
+                while True:
+                    index = int(random() * len(blocks))
+                    block = blocks[index]
+                    size = len(block)
+                    if random() * block_size < size:
+                        block.insert(int(random() * size), code)
+                        break
+            if len(block) >= block_size:
+                half = len(block) // 2
+                blocks[index:index + 1] = [block[:half], block[half:]]
+            self.count += 1
+            if counter is not None:
+                counter.add(code % len(RANKS))
+
+
+class CountingSystem(object):
+    """Card counting tag system.
+
+    tags holds the tag of each rank in RANKS order. Unbalanced systems start
+    the running count at initial_count per deck past the first.
+    """
+
+    def __init__(self, name, tags, initial_count=0):
+        self.name = name
+        self.tags = tuple(tags)
+        self.initial_count = initial_count
+
+    def __repr__(self):
+        return f'{self.name}'
+
+    def starting_count(self, deck_count):
+        """Running count of a freshly shuffled shoe."""
+        return self.initial_count * (deck_count - 1)
+
+
+HI_LO = CountingSystem('Hi-Lo', (1, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, -1))
+KO = CountingSystem('KO', (1, 1, 1, 1, 1, 1, 0, 0, -1, -1, -1, -1, -1),
+                    initial_count=-4)
+
+
+class CardCounter(object):
+    """Incremental count of the cards left in a shoe.
+
+    Keeps the cards left per rank and a running count for each counting
+    system, updated as each card is dealt and rebuilt when the shoe resets.
+    """
+
+    def __init__(self, deck_count, systems=()):
+        self.deck_count = deck_count
+        self.systems = tuple(systems)
+        self.system_index = {
+            system.name: index
+            for index, system in enumerate(self.systems)
+        }
+        # Tag of each system per rank, so remove() is one lookup per system
+        self.rank_tags = [
+            tuple(system.tags[rank_index] for system in self.systems)
+            for rank_index in range(len(RANKS))
+        ]
+        self.reset([len(SUITS) * deck_count] * len(RANKS))
+
+    def reset(self, remaining):
+        """Start counting a shuffled shoe holding remaining cards per rank."""
+        self.remaining = list(remaining)
+        self.cards_left = sum(remaining)
+        self.running_counts = [
+            system.starting_count(self.deck_count) for system in self.systems
+        ]
+
+    def remove(self, rank_index):
+        """Count a card of rank RANKS[rank_index] leaving the shoe."""
+        self.remaining[rank_index] -= 1
+        self.cards_left -= 1
+        if self.systems:
+            running_counts = self.running_counts
+            for index, tag in enumerate(self.rank_tags[rank_index]):
+                running_counts[index] += tag
+
+    def add(self, rank_index):
+        """Count a card of rank RANKS[rank_index] going back into the shoe."""
+        self.remaining[rank_index] += 1
+        self.cards_left += 1
+        if self.systems:
+            running_counts = self.running_counts
+            for index, tag in enumerate(self.rank_tags[rank_index]):
+                running_counts[index] -= tag
+
+    def running_count(self, name='Hi-Lo'):
+        """Running count of the named counting system."""
+        return self.running_counts[self.system_index[name]]
+
+    def decks_remaining(self):
+        return self.cards_left / DECK_SIZE
+
+    def true_count(self, name='Hi-Lo'):
+        """Running count per deck left in the shoe."""
+        if not self.cards_left:
+            return 0.0
+        return self.running_count(name) * DECK_SIZE / self.cards_left
+
 
 class Card(object):
     """Card class."""
@@ -248,23 +707,41 @@ class Card(object):
         self.rank = rank
         self.suit = suit
         self.value = value
+        # Integer encoding of the card, see CompactShoe
+        self.code = CARD_CODES.get((rank, suit))
 
     def __repr__(self):
         return f'{self.rank} of {self.suit}'
 
+    @staticmethod
+    def from_code(code):
+        """Gets the shared Card encoded as code."""
+        return CARDS[code]
+
 
 class Player(object):
-    """Player class."""
+    """Player class.
+
+    hands holds the hands of the current round, hand is the first of them.
+    """
 
     def __init__(self, player_config):
         self.id = player_config['id']
         self.name = player_config['name']
         self.chips = player_config['chips']
-        self.hand = Hand()
+        self.hands = Hands()
 
     def __repr__(self):
         return f'{self.name}'
 
+    @property
+    def hand(self):
+        return self.hands.pool[0]
+
+    @hand.setter
+    def hand(self, hand):
+        self.hands.reset(hand)
+
     def add_chips(self, amt):
         """Add amt to players chips."""
         self.chips += amt
@@ -274,99 +751,288 @@ class Player(object):
         self.chips -= amt
 
 
+class PlayerRegistry(object):
+    """Players seated at a table, indexed by id.
+
+    Seating, lookup and removal by id take constant time, the players stay
+    in seat order in an insertion ordered dict keyed by id. Supports len(),
+    iteration, indexing by seat and ``player_id in registry``.
+    """
+
+    __slots__ = ('players', )
+
+    def __init__(self, players=()):
+        self.players = {}
+        for player in players:
+            self.add(player)
+
+    def __len__(self):
+        return len(self.players)
+
+    def __iter__(self):
+        return iter(self.players.values())
+
+    def __getitem__(self, seat):
+        return list(self.players.values())[seat]
+
+    def __contains__(self, player_id):
+        return player_id in self.players
+
+    def __repr__(self):
+        return f'PlayerRegistry({list(self.players.values())})'
+
+    def get(self, player_id, default=None):
+        """Seated player with player_id, default if there is none."""
+        return self.players.get(player_id, default)
+
+    def add(self, player):
+        """Seat player, raises ValueError when their id is taken."""
+        if player.id in self.players:
+            raise ValueError(f'Player {player.id} is already seated')
+        self.players[player.id] = player
+
+    def remove(self, player_id):
+        """Unseat and return the player with player_id.
+
+        Raises KeyError when they aren't seated.
+        """
+        return self.players.pop(player_id)
+
+
 class Hand(object):
-    """Hand class."""
+    """Hand class.
+
+    Keeps a running hard total, counting every Ace as 1, and the number of
+    Aces so totals are available without re-summing the cards. One Ace
+    counts as 11 whenever that doesn't bust the hand.
+    """
 
     def __init__(self):
         self.bet_amt = 0
-        self.cards = []
-        self.status = None
+        self._cards = []
+        self.hard_total = 0
+        self.aces = 0
+        self.status_code = NO_STATUS
 
     def __repr__(self):
         return f'{self.cards}'
 
+    @property
+    def status(self):
+        """Name of the status, see blackjack.rules.STATUSES."""
+        return STATUSES[self.status_code]
+
+    @status.setter
+    def status(self, status):
+        self.status_code = STATUS_CODES[status]
+
+    @property
+    def cards(self):
+        return self._cards
+
+    @cards.setter
+    def cards(self, cards):
+        self._cards = []
+        self.hard_total = 0
+        self.aces = 0
+        for card in cards:
+            self.add_card(card)
+
+    @property
+    def is_soft(self):
+        """True when an Ace is counted as 11."""
+        return self.aces > 0 and self.hard_total <= 11
+
+    def add_card(self, card):
+        """Add card to the hand and update the running totals."""
+        self._cards.append(card)
+        if card.rank == 'Ace':
+            self.aces += 1
+            self.hard_total += 1
+        else:
+            self.hard_total += card.value
+
     def calculate_total(self):
-        return sum([card.value for card in self.cards])
+        if self.aces and self.hard_total <= 11:
+            return self.hard_total + 10
+        return self.hard_total
 
     def generate_hand_summary(self, show_ace_alt_score=True):
         """Generates hand summary."""
         total = self.calculate_total()
         total_str = f'for a total of {total}'
-        if self.get_big_aces() and show_ace_alt_score:
+        if self.is_soft and show_ace_alt_score:
             total_str += f' ({total-10})'
         summary = f'{self.cards} {total_str}'
         return summary
 
     def set_status(self, status):
-        assert status in ('hit', 'stay', 'split', 'bust', 'double', 'ace',
-                          'blackjack', 'dealer_blackjack')
-        self.status = status
+        """Set the status by name, raises KeyError for unknown statuses."""
+        self.status_code = STATUS_CODES[status]
 
     def check_for_blackjack(self):
-        if (self.calculate_total() == 21) and (len(self.cards) == 2):
-            self.status = 'blackjack'
+        if (len(self._cards) == 2) and (self.calculate_total() == 21):
+            self.status_code = BLACKJACK
             return True
 
     def hit(self, card):
-        self.cards.append(card)
-        self.set_status('hit')
+        self.add_card(card)
+        self.status_code = HIT
 
     def check_for_bust(self):
         """Check if total of cards is greater than 21."""
-        big_aces = self.get_big_aces()
-        if self.calculate_total() > 21 and not big_aces:
-            self.set_status('bust')
+        if self.hard_total > 21:
+            self.status_code = BUST
             return True
-        elif self.calculate_total() > 21 and big_aces:
-            big_aces[0].value = 1
 
     def set_bet_amt(self, amt):
         """Set current bet to the amount provided."""
         self.bet_amt = amt
 
+    def double(self, card):
+        """Double the bet for exactly one more card."""
+        self.bet_amt *= 2
+        self.add_card(card)
+        self.status_code = DOUBLE
+
+    def pop_card(self):
+        """Remove the last card and update the running totals."""
+        card = self._cards.pop()
+        if card.rank == 'Ace':
+            self.aces -= 1
+            self.hard_total -= 1
+        else:
+            self.hard_total -= card.value
+        return card
+
+    def clear(self):
+        """Empty the hand for another round."""
+        del self._cards[:]
+        self.hard_total = 0
+        self.aces = 0
+        self.status_code = NO_STATUS
+        self.bet_amt = 0
+
     def get_big_aces(self):
-        """Filter hand for Aces."""
-        return [
-            card for card in self.cards
-            if card.rank == 'Ace' and card.value == 11
-        ]
+        """Filter hand for the Ace counted as 11."""
+        if not self.is_soft:
+            return []
+        return [card for card in self._cards if card.rank == 'Ace'][:1]
 
 
-def is_valid_bet_amt(amt, min_bet, max_bet, chips_available):
+class Hands(object):
+    """Hands of one seat in a round, more than one once a pair is split.
+
+    Hands are cleared and reused from round to round rather than created
+    anew, so a seat only allocates a Hand when it splits into more hands
+    than it ever held before. Supports len(), indexing and iteration over
+    the hands in play.
+    """
+
+    __slots__ = ('pool', 'count')
+
+    def __init__(self, hand=None):
+        self.pool = [Hand() if hand is None else hand]
+        self.count = 1
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.pool[range(self.count)[index]]
+
+    def __iter__(self):
+        return itertools.islice(self.pool, self.count)
+
+    def __repr__(self):
+        return f'{list(self)}'
+
+    def clear(self):
+        """Empty the hands for another round, leaving one in play."""
+        for hand in self.pool[:self.count]:
+            hand.clear()
+        self.count = 1
+
+    def reset(self, hand):
+        """Play hand alone, dropping the other hands."""
+        self.pool = [hand]
+        self.count = 1
+
+    def index(self, hand):
+        """Index of hand, raises ValueError when it isn't in play."""
+        for index in range(self.count):
+            if self.pool[index] is hand:
+                return index
+        raise ValueError(f'{hand} is not in play')
+
+    def total_bet(self):
+        """Sum of the bets on the hands in play."""
+        return sum(hand.bet_amt for hand in self)
+
+    def split(self, index):
+        """Split the pair of the hand at index into two hands.
+
+        The second card moves to a new hand with the same bet, played right
+        after the split one. Both hands are marked SPLIT, the new hand is
+        returned.
+        """
+        hand = self[index]
+        if self.count == len(self.pool):
+            self.pool.append(Hand())
+        new_hand = self.pool.pop(self.count)
+        self.pool.insert(index + 1, new_hand)
+        self.count += 1
+        new_hand.add_card(hand.pop_card())
+        new_hand.bet_amt = hand.bet_amt
+        hand.status_code = new_hand.status_code = SPLIT
+        return new_hand
+
+
+# One shared Card per code, hands never modify their cards
+CARDS = tuple(Card(rank, suit) for suit in SUITS for rank in RANKS)
+
+
+def is_valid_bet_amt(amt, min_bet, max_bet, chips_available, events=None):
     """Validates player input of bet amt."""
     try:
         amt = int(amt)
     except ValueError:
-        game_warning('Bet amount must be full dollar')
+        game_warning('Bet amount must be full dollar', events)
         return False
     if not (min_bet <= amt <= max_bet):
-        game_warning(f'Amount must be between ${min_bet} and ${max_bet}')
+        game_warning(f'Amount must be between ${min_bet} and ${max_bet}',
+                     events)
         return False
     elif amt > chips_available:
-        game_warning('You may not bet more than you have')
+        game_warning('You may not bet more than you have', events)
     else:
         return True
 
 
-def sleep(seconds, mode='live'):
-    time.sleep(seconds) if mode != 'debug' else time.sleep(0)
+def settle_hand(hand, dealer_hand, rules=DEFAULT_RULES):
+    """Settles hand against dealer_hand.
+
+    Returns the payout per unit bet, with the default rules 1 when the
+    player wins, -1 when the player loses and 0 for a push. Ties lose,
+    except blackjack against blackjack which is a push.
+    """
+    return rules.settle(hand, dealer_hand)
+
+
+def game_command(message, events=None):
+    (events or CONSOLE_EVENTS).emit('command', message=message)
 
 
-def game_command(message):
-    print('')
-    print(f'{message}')
-    print('')
+def game_legend(message, events=None):
+    (events or CONSOLE_EVENTS).emit('legend', message=message)
 
 
-def game_legend(message):
-    print('')
-    print(f'     {message}')
-    print('')
+def game_warning(message, events=None):
+    (events or CONSOLE_EVENTS).emit('warning', message=message)
 
 
-def game_warning(message):
-    print(f'*** {message} ***')
-    print('')
+# Event bus of the helpers above when no bus is given
+CONSOLE_EVENTS = console_events()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+"""Streaming bankroll and risk of ruin analytics.
+
+BankrollAnalytics subscribes to a table's events and folds every settled
+hand into constant-memory aggregates per player and per strategy: win
+rate, variance (Welford's online algorithm), maximum drawdown, N0, risk of
+ruin and a histogram of the chips won or lost per hand. No hand results are
+kept, and aggregates of separate runs merge into the aggregate of the runs
+played one after the other.
+"""
+import math
+
+# Sign of the chips won by each settlement event kind
+SIGNS = {'win': 1, 'push': 0, 'lose': -1}
+
+
+class BankrollStats(object):
+    """Online aggregate of the chips won or lost per hand.
+
+    net, peak and trough follow the bankroll relative to its start,
+    max_drawdown is the largest fall from a peak. histogram counts the hands
+    by chips won, negative for losses.
+    """
+
+    def __init__(self):
+        self.hands = 0
+        self.wins = 0
+        self.losses = 0
+        self.pushes = 0
+        self.total_bet = 0
+        self.net = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.peak = 0
+        self.trough = 0
+        self.max_drawdown = 0
+        self.histogram = {}
+
+    def __repr__(self):
+        return (f'BankrollStats(hands={self.hands}, net={self.net}, '
+                f'win_rate={self.win_rate:.4f}, '
+                f'max_drawdown={self.max_drawdown})')
+
+    def add(self, amount, bet):
+        """Add a hand on which bet won amount chips, negative if it lost."""
+        self.hands += 1
+        self.total_bet += bet
+        delta = amount - self.mean
+        self.mean += delta / self.hands
+        self.m2 += delta * (amount - self.mean)
+        net = self.net = self.net + amount
+        if net > self.peak:
+            self.peak = net
+        elif self.peak - net > self.max_drawdown:
+            self.max_drawdown = self.peak - net
+        if net < self.trough:
+            self.trough = net
+        if amount > 0:
+            self.wins += 1
+        elif amount < 0:
+            self.losses += 1
+        else:
+            self.pushes += 1
+        self.histogram[amount] = self.histogram.get(amount, 0) + 1
+
+    def merge(self, other):
+        """Add the hands of other, played after these, into these stats."""
+        hands = self.hands + other.hands
+        if not hands:
+            return self
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.hands * other.hands / hands
+        self.mean += delta * other.hands / hands
+        net = self.net
+        self.max_drawdown = max(self.max_drawdown, other.max_drawdown,
+                                self.peak - (net + other.trough))
+        self.peak = max(self.peak, net + other.peak)
+        self.trough = min(self.trough, net + other.trough)
+        self.net = net + other.net
+        self.hands = hands
+        self.wins += other.wins
+        self.losses += other.losses
+        self.pushes += other.pushes
+        self.total_bet += other.total_bet
+        for amount, count in other.histogram.items():
+            self.histogram[amount] = self.histogram.get(amount, 0) + count
+        return self
+
+    @property
+    def win_rate(self):
+        """Chips won per hand."""
+        return self.mean
+
+    @property
+    def edge(self):
+        """Chips won per chip wagered."""
+        return self.net / self.total_bet if self.total_bet else 0.0
+
+    @property
+    def variance(self):
+        """Sample variance of the chips won per hand."""
+        return self.m2 / (self.hands - 1) if self.hands > 1 else 0.0
+
+    @property
+    def std_dev(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def n0(self):
+        """Hands until the expected win equals one standard deviation."""
+        return self.variance / self.mean**2 if self.mean else float('inf')
+
+    def risk_of_ruin(self, bankroll):
+        """Chance of ever losing bankroll chips, by the diffusion estimate.
+
+        Certain ruin unless the win rate is positive.
+        """
+        if self.mean <= 0:
+            return 1.0
+        if not self.variance:
+            return 0.0
+        return math.exp(-2 * self.mean * bankroll / self.variance)
+
+
+class BankrollAnalytics(object):
+    """Event subscriber aggregating settled hands.
+
+    players maps player ids to their BankrollStats. strategy names the
+    strategy the players follow, or is a callable returning it for a
+    player, strategies then maps names to BankrollStats.
+    """
+
+    def __init__(self, strategy=None):
+        self.strategy = strategy
+        self.players = {}
+        self.strategies = {}
+
+    def __call__(self, event):
+        sign = SIGNS.get(event.kind)
+        if sign is None:
+            return
+        fields = event.fields
+        player = fields['player']
+        amount = sign * fields['amount']
+        bet = fields['hand'].bet_amt
+        stats = self.players.get(player.id)
+        if stats is None:
+            stats = self.players[player.id] = BankrollStats()
+        stats.add(amount, bet)
+        strategy = self.strategy
+        if strategy is not None:
+            name = strategy(player) if callable(strategy) else strategy
+            stats = self.strategies.get(name)
+            if stats is None:
+                stats = self.strategies[name] = BankrollStats()
+            stats.add(amount, bet)
+
+    def merge(self, other):
+        """Add the aggregates of other, a later run, into these."""
+        for mine, theirs in ((self.players, other.players),
+                             (self.strategies, other.strategies)):
+            for key, stats in theirs.items():
+                mine.setdefault(key, BankrollStats()).merge(stats)
+        return self
@@ -0,0 +1,223 @@
+"""Vectorized batch simulator.
+
+Plays many independent one-seat rounds at once as NumPy arrays, following
+the rules of Table.play_hand and settle_hand. Every round is dealt from its
+own freshly shuffled shoe.
+
+Strategies are lookup tables indexed by [soft, player_total, dealer_upcard]
+where the upcard is 1 for an Ace and 2-10 otherwise, holding HIT or STAND.
+"""
+import numpy as np
+
+from blackjack import Card, Hand, DECK_SIZE
+
+STAND = 0
+HIT = 1
+
+# Card values as dealt by the batch simulator, Aces are 1
+VALUES = np.arange(1, 11)
+# Cards of each value in one deck, the four ten-valued ranks share value 10
+DECK_COUNTS = np.array([4, 4, 4, 4, 4, 4, 4, 4, 4, 16])
+# Value of every card position in one deck
+SHOE_LAYOUT = np.repeat(VALUES, DECK_COUNTS).astype(np.int16)
+STRATEGY_SHAPE = (2, 22, 11)
+
+# Rank used to build sample cards of each value for compile_policy
+_VALUE_RANKS = (None, 'Ace', '2', '3', '4', '5', '6', '7', '8', '9', '10')
+
+
+def dealer_mimic_strategy():
+    """Strategy table hitting below 17, like simulation.dealer_mimic."""
+    strategy = np.full(STRATEGY_SHAPE, STAND, dtype=np.int8)
+    strategy[:, :17, :] = HIT
+    return strategy
+
+
+def compile_policy(decision_policy):
+    """Compile a HeadlessTable decision policy into a strategy table.
+
+    The policy is asked once for a sample two card hand of every total, so
+    only policies that depend on the total, softness and upcard compile
+    exactly.
+    """
+    strategy = np.full(STRATEGY_SHAPE, STAND, dtype=np.int8)
+    for upcard_value in range(1, 11):
+        upcard = Card(_VALUE_RANKS[upcard_value], 'Spades')
+        for total in range(4, 21):
+            hand = Hand()
+            first = min(total - 2, 10)
+            hand.cards = [
+                Card(_VALUE_RANKS[first], 'Hearts'),
+                Card(_VALUE_RANKS[total - first], 'Clubs')
+            ]
+            decision = decision_policy(None, hand, upcard)
+            strategy[0, total, upcard_value] = decision == 'H'
+        for total in range(12, 21):
+            hand = Hand()
+            hand.cards = [
+                Card('Ace', 'Hearts'),
+                Card(_VALUE_RANKS[total - 11], 'Clubs')
+            ]
+            decision = decision_policy(None, hand, upcard)
+            strategy[1, total, upcard_value] = decision == 'H'
+    return strategy
+
+
+class BatchResult(object):
+    """Per-round outcome arrays of a batch simulation."""
+
+    def __init__(self, player_total, player_soft, player_blackjack,
+                 dealer_upcard, dealer_total, dealer_blackjack, result):
+        self.player_total = player_total
+        self.player_soft = player_soft
+        self.player_blackjack = player_blackjack
+        self.dealer_upcard = dealer_upcard
+        self.dealer_total = dealer_total
+        self.dealer_blackjack = dealer_blackjack
+        self.result = result
+
+    def __repr__(self):
+        return f'BatchResult(rounds={self.rounds}, edge={self.edge:.4f})'
+
+    def __len__(self):
+        return len(self.result)
+
+    @classmethod
+    def concatenate(cls, results):
+        """Join results of several batches into one."""
+        return cls(*[
+            np.concatenate([getattr(result, name) for result in results])
+            for name in ('player_total', 'player_soft', 'player_blackjack',
+                         'dealer_upcard', 'dealer_total', 'dealer_blackjack',
+                         'result')
+        ])
+
+    @property
+    def rounds(self):
+        return len(self.result)
+
+    @property
+    def edge(self):
+        """Player net result per unit wagered."""
+        return float(self.result.mean()) if len(self.result) else 0.0
+
+    @property
+    def standard_error(self):
+        """Standard error of edge."""
+        return float(self.result.std() / np.sqrt(max(len(self.result), 1)))
+
+
+class BatchSimulator(object):
+    """Plays rounds in batches of NumPy arrays.
+
+    Each draw deals one card to every round that needs one in a single
+    vectorized step.
+    """
+
+    def __init__(self, deck_count=6, strategy=None, seed=None,
+                 batch_size=1 << 18):
+        self.deck_count = deck_count
+        self.strategy = (dealer_mimic_strategy()
+                         if strategy is None else np.asarray(strategy))
+        if self.strategy.shape != STRATEGY_SHAPE:
+            raise ValueError(f'Strategy shape must be {STRATEGY_SHAPE}')
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+
+    def run(self, rounds):
+        """Play rounds rounds and return their BatchResult."""
+        results = []
+        while rounds > 0:
+            size = min(rounds, self.batch_size)
+            results.append(self.play_batch(size))
+            rounds -= size
+        if not results:
+            return self.play_batch(0)
+        return BatchResult.concatenate(results)
+
+    def play_batch(self, size):
+        """Play size rounds at once."""
+        shoe_size = DECK_SIZE * self.deck_count
+        layout = np.tile(SHOE_LAYOUT, self.deck_count)
+        rows = np.arange(size)
+        rng = self.rng
+        # Shoe positions already dealt in each round, one column per draw
+        dealt = [np.full(size, -1, dtype=np.int16)]
+        draws = [0]
+
+        def draw(index):
+            """Draw one card for each round in index."""
+            # Cards are drawn by position and redrawn when the position was
+            # dealt before, a round only ever uses a few of the shoe's cards
+            position = rng.integers(0, shoe_size, len(index), dtype=np.int16)
+            previous = np.stack([column[index] for column in dealt], axis=1)
+            repeat = np.flatnonzero(
+                (previous == position[:, None]).any(axis=1))
+            while len(repeat):
+                position[repeat] = rng.integers(0, shoe_size, len(repeat))
+                repeat = repeat[(previous[repeat] == position[repeat,
+                                                              None]).any(1)]
+            if draws[0] == len(dealt):
+                dealt.append(np.full(size, -1, dtype=np.int16))
+            dealt[draws[0]][index] = position
+            draws[0] += 1
+            return layout[position]
+
+        def total(hard, aces):
+            return hard + 10 * (aces & (hard <= 11))
+
+        # Deal in the same order as Table.deal_cards
+        first = draw(rows)
+        dealer_upcard = draw(rows)
+        second = draw(rows)
+        hole = draw(rows)
+        player_hard = first + second
+        player_aces = (first == 1) | (second == 1)
+        dealer_hard = dealer_upcard + hole
+        dealer_aces = (dealer_upcard == 1) | (hole == 1)
+
+        player_blackjack = total(player_hard, player_aces) == 21
+        dealer_blackjack = total(dealer_hard, dealer_aces) == 21
+
+        # Players hit from the strategy until they stand, bust or reach 21
+        strategy = self.strategy
+        active = rows[~player_blackjack & ~dealer_blackjack]
+        while len(active):
+            hard = player_hard[active]
+            soft = player_aces[active] & (hard <= 11)
+            hits = strategy[soft.view(np.int8), hard + 10 * soft,
+                            dealer_upcard[active]] == HIT
+            active = active[hits]
+            if not len(active):
+                break
+            value = draw(active)
+            player_hard[active] += value
+            player_aces[active] |= value == 1
+            active = active[total(player_hard[active],
+                                  player_aces[active]) < 21]
+
+        # Dealer hits while total < 17
+        active = rows[total(dealer_hard, dealer_aces) < 17]
+        while len(active):
+            value = draw(active)
+            dealer_hard[active] += value
+            dealer_aces[active] |= value == 1
+            active = active[total(dealer_hard[active],
+                                  dealer_aces[active]) < 17]
+
+        player_total = total(player_hard, player_aces)
+        dealer_total = total(dealer_hard, dealer_aces)
+        # Same order of checks as settle_hand
+        result = np.where(
+            player_total > 21, -1,
+            np.where((dealer_total > 21) | (player_total > dealer_total), 1,
+                     np.where(player_blackjack,
+                              np.where(dealer_blackjack, 0, 1), -1)))
+        return BatchResult(
+            player_total.astype(np.int8),
+            (player_aces & (player_hard <= 11)),
+            player_blackjack,
+            dealer_upcard.astype(np.int8),
+            dealer_total.astype(np.int8),
+            dealer_blackjack,
+            result.astype(np.int8))
@@ -0,0 +1,357 @@
+"""Benchmarks of the engine's hot paths with JSON baselines.
+
+Run every benchmark and save the results:
+
+    python -m blackjack.benchmark run --output baseline.json
+
+Compare a later run with the baseline, exiting with status 1 when any
+benchmark got slower by more than the threshold:
+
+    python -m blackjack.benchmark run --output current.json
+    python -m blackjack.benchmark compare baseline.json current.json
+
+Each result holds the best time per operation of several repeats in
+nanoseconds and the matching operations per second. For the round
+benchmarks an operation is one player hand, so ops_per_sec is hands/sec,
+for table.snapshot_restore it is a snapshot restored into its table.
+The dealer's pauses only advance a VirtualClock, Table rounds are played
+by scripted players answering its input prompts.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from unittest import mock
+
+from blackjack import (Card, CompactShoe, ContinuousShuffler, Hand, Player,
+                       Shoe, Table)
+from blackjack.clock import VirtualClock
+from blackjack.events import NULL_EVENTS, EventBus
+from blackjack.rules import Rules
+from blackjack.simulation import HeadlessTable
+from blackjack.snapshot import restore, snapshot
+
+# Benchmark functions by name, see benchmark()
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark function.
+
+    The function takes no arguments and returns (run, ops): run() performs
+    ops operations and is timed, everything before it is setup.
+    """
+
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+def measure(run, ops, repeat=5):
+    """Best time per operation of repeat calls of run, in nanoseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best / ops * 1e9
+
+
+@benchmark('shoe.get_top_card')
+def shoe_get_top_card():
+    shoe = Shoe(6, events=NULL_EVENTS, clock=VirtualClock())
+    cards = list(shoe.cards)
+
+    def run():
+        shoe.cards = list(cards)
+        for _ in range(len(cards)):
+            shoe.get_top_card()
+
+    return run, len(cards)
+
+
+@benchmark('shoe.shuffle')
+def shoe_shuffle():
+    shoe = Shoe(6, events=NULL_EVENTS, clock=VirtualClock())
+
+    def run():
+        for _ in range(20):
+            shoe.shuffle()
+
+    return run, 20
+
+
+@benchmark('shoe.reset')
+def shoe_reset():
+    shoe = Shoe(6, events=NULL_EVENTS, clock=VirtualClock())
+    cards = shoe.cards
+
+    def run():
+        for _ in range(20):
+            shoe.discard_pile = list(cards)
+            shoe.reset()
+
+    return run, 20
+
+
+@benchmark('compact_shoe.get_top_card')
+def compact_shoe_get_top_card():
+    shoe = CompactShoe(6)
+    count = len(shoe)
+
+    def run():
+        shoe.cursor = 0
+        for _ in range(count):
+            shoe.get_top_card()
+
+    return run, count
+
+
+@benchmark('compact_shoe.reset')
+def compact_shoe_reset():
+    shoe = CompactShoe(6)
+
+    def run():
+        for _ in range(100):
+            shoe.reshuffle()
+
+    return run, 100
+
+
+@benchmark('csm.deal_and_discard')
+def csm_deal_and_discard():
+    machine = ContinuousShuffler(6)
+    count = len(machine) // 2
+
+    def run():
+        deal = machine.deal
+        machine.discard_codes([deal() for _ in range(count)])
+
+    return run, count
+
+
+def benchmark_hand():
+    hand = Hand()
+    for rank, suit in (('Ace', 'Spades'), ('6', 'Hearts'), ('9', 'Clubs')):
+        hand.add_card(Card(rank, suit))
+    return hand
+
+
+@benchmark('hand.calculate_total')
+def hand_calculate_total():
+    calculate_total = benchmark_hand().calculate_total
+
+    def run():
+        for _ in range(100000):
+            calculate_total()
+
+    return run, 100000
+
+
+@benchmark('hand.check_for_bust')
+def hand_check_for_bust():
+    check_for_bust = benchmark_hand().check_for_bust
+
+    def run():
+        for _ in range(100000):
+            check_for_bust()
+
+    return run, 100000
+
+
+@benchmark('hand.get_big_aces')
+def hand_get_big_aces():
+    get_big_aces = benchmark_hand().get_big_aces
+
+    def run():
+        for _ in range(100000):
+            get_big_aces()
+
+    return run, 100000
+
+
+@benchmark('card.construct')
+def card_construct():
+
+    def run():
+        for _ in range(100000):
+            Card('Queen', 'Hearts')
+
+    return run, 100000
+
+
+class ScriptedPlayers(object):
+    """Answers Table's input prompts, subscribed to its events.
+
+    Bets bet and hits below 17, like HeadlessTable's default policies.
+    """
+
+    def __init__(self, bet):
+        self.bet = bet
+        self.hand = None
+
+    def __call__(self, event):
+        if event.kind == 'decision':
+            self.hand = event.fields['hand']
+
+    def input(self, prompt=''):
+        if prompt.endswith('bet? '):
+            return str(self.bet)
+        return 'H' if self.hand.calculate_total() < 17 else 'S'
+
+
+@benchmark('table.round')
+def table_round(rounds=2000, players=3):
+    events = EventBus()
+    script = events.subscribe(ScriptedPlayers(10))
+    table = Table(min_bet=10,
+                  max_bet=25,
+                  events=events,
+                  clock=VirtualClock())
+    for player_id in range(players):
+        table.add_player(
+            Player({
+                'id': player_id,
+                'name': f'Bot {player_id}',
+                'chips': 10**9
+            }))
+
+    def run():
+        with mock.patch('builtins.input', script.input):
+            for _ in range(rounds):
+                table.clear_table()
+                table.take_bets()
+                table.deal_cards()
+                table.play_hand()
+                table.pay_out_and_collect()
+
+    return run, rounds * players
+
+
+@benchmark('headless.round')
+def headless_round(rounds=20000, players=3):
+    table = HeadlessTable(min_bet=10, max_bet=25)
+    for player_id in range(players):
+        table.add_player(
+            Player({
+                'id': player_id,
+                'name': f'Bot {player_id}',
+                'chips': 10**9
+            }))
+    return lambda: table.run(rounds), rounds * players
+
+
+@benchmark('csm.round')
+def csm_round(rounds=20000, players=3):
+    table = HeadlessTable(min_bet=10,
+                          max_bet=25,
+                          rules=Rules(continuous_shuffle=True))
+    for player_id in range(players):
+        table.add_player(
+            Player({
+                'id': player_id,
+                'name': f'Bot {player_id}',
+                'chips': 10**9
+            }))
+    return lambda: table.run(rounds), rounds * players
+
+
+@benchmark('table.snapshot_restore')
+def table_snapshot_restore(snapshots=2000, players=5):
+    table = HeadlessTable(min_bet=10, max_bet=25)
+    for player_id in range(players):
+        table.add_player(
+            Player({
+                'id': player_id,
+                'name': f'Bot {player_id}',
+                'chips': 10**9
+            }))
+    table.run(100)
+
+    def run():
+        for _ in range(snapshots):
+            restore(table, snapshot(table))
+
+    return run, snapshots
+
+
+def run_benchmarks(names=None, repeat=5):
+    """Run the named benchmarks, all of them by default.
+
+    Returns the results document saved as a baseline.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        run, ops = BENCHMARKS[name]()
+        ns_per_op = measure(run, ops, repeat)
+        results[name] = {
+            'ns_per_op': ns_per_op,
+            'ops_per_sec': 1e9 / ns_per_op
+        }
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': results
+    }
+
+
+def compare(baseline, current, threshold=.1):
+    """Rows of (name, baseline ns, current ns, change, regressed).
+
+    change is the relative change in time per operation, a benchmark
+    regressed when it got slower by more than threshold. Benchmarks missing
+    from either run are left out.
+    """
+    rows = []
+    for name, result in current['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        before = baseline['benchmarks'][name]['ns_per_op']
+        after = result['ns_per_op']
+        change = after / before - 1
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m blackjack.benchmark')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('names',
+                            nargs='*',
+                            help='benchmarks to run, all by default')
+    run_parser.add_argument('--output', help='JSON file for the results')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    compare_parser = commands.add_parser('compare',
+                                         help='compare results to a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=.1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        unknown = set(args.names) - set(BENCHMARKS)
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+        results = run_benchmarks(args.names, args.repeat)
+        for name, result in results['benchmarks'].items():
+            print(f"{name:28} {result['ns_per_op']:14.1f} ns/op "
+                  f"{result['ops_per_sec']:14.0f} ops/s")
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2)
+        return 0
+
+    with open(args.baseline) as baseline, open(args.current) as current:
+        rows = compare(json.load(baseline), json.load(current), args.threshold)
+    for name, before, after, change, regressed in rows:
+        print(f"{name:28} {before:14.1f} {after:14.1f} ns/op {change:+8.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
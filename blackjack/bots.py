@@ -0,0 +1,174 @@
+"""Bot players deciding for every seat of a table at once.
+
+BatchTable plays like HeadlessTable but asks its policies once per phase
+for all seats instead of once per seat: one call for the bets of every
+player, then one call per pass over the hands still in play, each pass
+asking for a decision on the current hand of every seat. A policy can
+answer a whole table with one vectorized lookup or one model call.
+
+Passes carry out the decisions seat by seat, so cards go out in a
+different order than at a table playing each seat to the end, which
+doesn't change the odds of any hand.
+"""
+from collections import namedtuple
+
+from blackjack.rules import DEALER_BLACKJACK, FINISHED, STAY, SURRENDER
+from blackjack.simulation import HeadlessTable, dealer_mimic
+
+# A hand waiting for a decision, actions as returned by Rules.actions
+DecisionRequest = namedtuple('DecisionRequest',
+                             'player hand dealer_upcard actions')
+
+
+def flat_bets(players, table):
+    """Batch bet policy that always bets the table minimum."""
+    return [table.min_bet] * len(players)
+
+
+def batched(decision_policy):
+    """Batch decision policy asking a HeadlessTable decision policy."""
+
+    def decide(requests):
+        return [
+            decision_policy(request.player, request.hand,
+                            request.dealer_upcard) for request in requests
+        ]
+
+    return decide
+
+
+def batched_bets(bet_policy):
+    """Batch bet policy asking a HeadlessTable bet policy."""
+
+    def bet(players, table):
+        return [bet_policy(player, table) for player in players]
+
+    return bet
+
+
+class BatchTable(HeadlessTable):
+    """HeadlessTable asking batch policies for all seats at once.
+
+    bet_policy(players, table) returns the bet of each of players, the
+    players able to cover the minimum bet, 0 to sit the round out.
+    decision_policy(requests) returns the decision, a letter of its
+    actions, for each of a list of DecisionRequests. batched() and
+    batched_bets() turn HeadlessTable policies into batch policies. With a
+    clock the players think once per call of a policy. Other arguments are
+    HeadlessTable's.
+    """
+
+    def __init__(self,
+                 bet_policy=flat_bets,
+                 decision_policy=batched(dealer_mimic),
+                 **kwargs):
+        super().__init__(bet_policy=bet_policy,
+                         decision_policy=decision_policy,
+                         **kwargs)
+
+    def take_bets(self):
+        """Take the bets of every funded player in one bet policy call."""
+        min_bet = self.min_bet
+        max_bet = self.max_bet
+        players = [
+            player for player in self.players if player.chips >= min_bet
+        ]
+        self.active_players = []
+        if not players:
+            return
+        if self.clock is not None:
+            self.clock.think('bet')
+        bets = self.bet_policy(players, self)
+        if len(bets) != len(players):
+            raise ValueError(f'{len(bets)} bets for {len(players)} players')
+        for player, bet_amt in zip(players, bets):
+            if not bet_amt:
+                continue
+            if not (min_bet <= bet_amt <= max_bet and bet_amt <= player.chips):
+                raise ValueError(f'Invalid bet of {bet_amt} for {player}')
+            player.hand.set_bet_amt(bet_amt)
+            self.active_players.append(player)
+
+    def play_hand(self):
+        """Play every seat's hands in passes of one decision each."""
+        get_top_card = self.shoe.get_top_card
+        decision_policy = self.decision_policy
+        actions = self.rules.actions
+        emit = self.events.emit
+        clock = self.clock
+        dealer_hand = self.dealer.hand
+        dealer_upcard = dealer_hand.cards[0]
+        dealer_blackjack = dealer_hand.check_for_blackjack()
+
+        # [player, index of the hand in play] of the seats still deciding
+        seats = []
+        for player in self.active_players:
+            hand = player.hands.pool[0]
+            if dealer_blackjack:
+                hand.status_code = DEALER_BLACKJACK
+            if not (hand.check_for_blackjack() or dealer_blackjack):
+                seats.append([player, 0])
+
+        while seats:
+            requests = []
+            for player, index in seats:
+                hands = player.hands
+                hand = hands.pool[index]
+                requests.append(
+                    DecisionRequest(player, hand, dealer_upcard,
+                                    actions(hands, hand, player.chips)))
+            if clock is not None:
+                clock.think('decision')
+            decisions = decision_policy(requests)
+            if len(decisions) != len(requests):
+                raise ValueError(f'{len(decisions)} decisions for '
+                                 f'{len(requests)} hands')
+            playing = []
+            for seat, request, decision in zip(seats, requests, decisions):
+                player, index = seat
+                hand = request.hand
+                hands = player.hands
+                if len(decision) != 1 or decision not in request.actions:
+                    raise ValueError(f'Invalid decision {decision!r}')
+                if decision == 'H':
+                    card = get_top_card()
+                    hand.hit(card)
+                    emit('hit', player=player, hand=hand, card=card)
+                    if (not hand.check_for_bust()
+                            and hand.calculate_total() == 21):
+                        hand.status_code = STAY
+                elif decision == 'S':
+                    hand.status_code = STAY
+                elif decision == 'D':
+                    card = get_top_card()
+                    hand.double(card)
+                    emit('double', player=player, hand=hand, card=card)
+                    hand.check_for_bust()
+                elif decision == 'P':
+                    new_hand = hands.split(index)
+                    emit('split', player=player, hand=hand, new_hand=new_hand)
+                    self.deal_split_card(player, hand)
+                elif decision == 'R':
+                    hand.status_code = SURRENDER
+                else:
+                    raise ValueError(f'Invalid decision {decision!r}')
+                # Move on to the next hand split off this seat's pair
+                while hand.status_code in FINISHED:
+                    index += 1
+                    if index == hands.count:
+                        break
+                    hand = hands.pool[index]
+                    self.deal_split_card(player, hand)
+                else:
+                    seat[1] = index
+                    playing.append(seat)
+            seats = playing
+
+        # Process dealers turn
+        dealer = self.dealer
+        dealer_hits = self.rules.dealer_hits
+        while dealer_hits[dealer_hand.is_soft][dealer_hand.calculate_total()]:
+            card = get_top_card()
+            dealer_hand.hit(card)
+            emit('hit', player=dealer, hand=dealer_hand, card=card)
+            dealer_hand.check_for_bust()
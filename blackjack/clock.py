@@ -0,0 +1,74 @@
+"""Clocks timing the pauses of a table.
+
+Table and Shoe pause through a clock instead of sleeping themselves:
+sleep(seconds, activity) for the dealer's pauses and think(activity) before
+a player bets or decides. RealClock sleeps for real and leaves the thinking
+to the players at the terminal. VirtualClock only advances simulated time,
+charging players a modelled think time, and keeps the time spent per
+activity to work out hands per hour and how the table's time is used.
+"""
+import time
+
+# Dealer pauses in seconds, 'deal' is per player
+PAUSES = {'round': 3, 'deal': .5, 'shuffle': 3, 'reset': 3}
+
+# Modelled player think times in seconds
+THINK_TIMES = {'bet': 3, 'decision': 2}
+
+
+class RealClock(object):
+    """Wall clock time with real sleeps."""
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds, activity=None):
+        time.sleep(seconds)
+
+    def think(self, activity):
+        """Players at the terminal take their own time."""
+
+
+class VirtualClock(object):
+    """Simulated time that advances instantly.
+
+    think_times override THINK_TIMES per activity, a think time is a number
+    of seconds or a callable returning one, so it can be drawn at random.
+    spent holds the seconds spent per activity.
+    """
+
+    def __init__(self, start=0.0, think_times=None):
+        self.start = start
+        self.time = start
+        self.think_times = dict(THINK_TIMES, **(think_times or {}))
+        self.spent = {}
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds, activity=None):
+        """Advance the clock by seconds spent on activity."""
+        self.time += seconds
+        self.spent[activity] = self.spent.get(activity, 0) + seconds
+
+    def think(self, activity):
+        """Advance the clock by a player's think time for activity."""
+        seconds = self.think_times[activity]
+        self.sleep(seconds() if callable(seconds) else seconds, activity)
+
+    @property
+    def elapsed(self):
+        """Simulated seconds since start."""
+        return self.time - self.start
+
+    def hands_per_hour(self, hands):
+        """Rate of hands over the elapsed simulated time."""
+        return hands * 3600 / self.elapsed if self.elapsed else 0.0
+
+    def utilisation(self):
+        """Share of the elapsed time spent per activity."""
+        elapsed = self.elapsed
+        return {
+            activity: seconds / elapsed
+            for activity, seconds in self.spent.items()
+        } if elapsed else {}
@@ -0,0 +1,177 @@
+"""Game events and their subscribers.
+
+Table and Shoe report everything that happens as events on an EventBus
+instead of printing. An event is a kind and the fields describing it, text
+is only produced by subscribers that need it, such as ConsoleRenderer.
+NULL_EVENTS drops events without creating them.
+"""
+import logging
+import sys
+
+STARS = '*' * 66
+
+
+def _payout(verb):
+    return lambda f: (f"{f['player']} {verb} {f['amount']} dollars. "
+                      f"Total remaining chips: {f['chips']}\n")
+
+
+def _push(f):
+    if f['hand'].status == f['dealer_hand'].status == 'blackjack':
+        return f"{f['player']} and dealer both have blackjack. PUSH\n"
+    return f"{f['player']} pushes with {f['hand'].calculate_total()}. PUSH\n"
+
+
+# Console text of every event kind, the game's original output
+TEMPLATES = {
+    'command': lambda f: f"\n{f['message']}\n\n",
+    'legend': lambda f: f"\n     {f['message']}\n\n",
+    'warning': lambda f: f"*** {f['message']} ***\n\n",
+    'message': lambda f: f"{f['message']}\n",
+    'shuffle': lambda f: '\nDealer is shuffling...\n\n',
+    'reset': lambda f: 'Dealer is resetting the shoe...\n',
+    'deal': lambda f: '\nDealing the cards...\n\n',
+    'dealt': lambda f: '',
+    'hit': lambda f: '',
+    'dealer_blackjack': lambda f: f"BLACKJACK FOR DEALER {f['hand']}\n",
+    'blackjack': lambda f: f"BLACKJACK FOR {f['player']} with {f['hand']}!!!!\n",
+    'decision': lambda f: (
+        f"\n{f['player']} you have {f['hand'].generate_hand_summary()}\n"
+        f"What would you like to do?\n\n     {f['options']}\n\n"),
+    'bust': lambda f: f"{f['player']} BUSTS!!!!!\n",
+    'surrender': lambda f: f"{f['player']} SURRENDERS\n",
+    'split': lambda f: f"{f['player']} SPLITS {f['hand'].cards[0].rank}s\n",
+    'double': lambda f: (f"{f['player']} DOUBLES DOWN\n"
+                         f"You have {f['hand'].generate_hand_summary()}\n"),
+    'nice_hit': lambda f: (f"Nice Hit {f['player']}\n"
+                           f"You have {f['hand'].generate_hand_summary()}\n"),
+    'settle': lambda f: f'\n{STARS}\n',
+    'dealer_result': lambda f: (
+        f"DEALER BUSTS with {f['hand'].generate_hand_summary(False)}\n"
+        if f['hand'].status == 'bust' else
+        f"Dealer has {f['hand'].generate_hand_summary(False)}\n"),
+    'win': _payout('wins'),
+    'lose': _payout('loses'),
+    'push': _push,
+    'settled': lambda f: f'{STARS}\n\n',
+    'game_over': lambda f: 'GAME OVER!\n',
+}
+
+
+class Event(object):
+    """Something that happened in the game."""
+
+    __slots__ = ('kind', 'fields')
+
+    def __init__(self, kind, fields):
+        self.kind = kind
+        self.fields = fields
+
+    def __repr__(self):
+        return f'Event({self.kind!r}, {self.fields!r})'
+
+
+class EventBus(object):
+    """Hands every emitted event to its subscribers.
+
+    Subscribers are callables taking an Event, they may have a flush()
+    method for buffered output.
+    """
+
+    def __init__(self, subscribers=()):
+        self.subscribers = list(subscribers)
+
+    def subscribe(self, subscriber):
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+
+    def emit(self, kind, **fields):
+        """Send an event of kind to the subscribers."""
+        if self.subscribers:
+            event = Event(kind, fields)
+            for subscriber in self.subscribers:
+                subscriber(event)
+
+    def flush(self):
+        """Flush buffered subscribers, done before waiting for input."""
+        for subscriber in self.subscribers:
+            flush = getattr(subscriber, 'flush', None)
+            if flush is not None:
+                flush()
+
+
+class NullEventBus(EventBus):
+    """Event bus that drops every event."""
+
+    def subscribe(self, subscriber):
+        raise TypeError('NullEventBus takes no subscribers')
+
+    def emit(self, kind, **fields):
+        pass
+
+    def flush(self):
+        pass
+
+
+NULL_EVENTS = NullEventBus()
+
+
+class ConsoleRenderer(object):
+    """Writes events as console text.
+
+    Text is buffered until buffer_size events are waiting or flush() is
+    called, a buffer_size of 0 writes every event straight away. stream
+    defaults to the current sys.stdout.
+    """
+
+    def __init__(self, stream=None, buffer_size=0):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.buffer = []
+
+    def __call__(self, event):
+        self.buffer.append(render(event))
+        if len(self.buffer) > self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            stream = self.stream or sys.stdout
+            stream.write(''.join(self.buffer))
+            stream.flush()
+            self.buffer = []
+
+
+class LoggingSubscriber(object):
+    """Logs events as their console text."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('blackjack')
+        self.level = level
+
+    def __call__(self, event):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, '%s', render(event).strip())
+
+
+class EventCounter(object):
+    """Counts events by kind."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, event):
+        self.counts[event.kind] = self.counts.get(event.kind, 0) + 1
+
+
+def render(event):
+    """Console text of event."""
+    return TEMPLATES[event.kind](event.fields)
+
+
+def console_events():
+    """New event bus writing to the console."""
+    return EventBus([ConsoleRenderer()])
@@ -0,0 +1,279 @@
+"""Compact binary hand history.
+
+HandHistoryWriter subscribes to a table's events and appends every hand to
+a file of fixed-size little endian records:
+
+    round   uint32  round number, counted from 1
+    kind    uint8   ROUND, DEAL, HIT, SETTLE, SPLIT, DOUBLE or SURRENDER in
+                    the low 4 bits, the index of the seat's hand in the high
+                    4 bits
+    seat    uint8   position of the player in the round, DEALER_SEAT for
+                    the dealer
+    card    uint8   card code (suit_index * 13 + rank_index), NO_CARD if none
+    result  int8    sign of the settlement of a SETTLE record, 1 won, 0
+                    pushed, -1 lost, see amount for the chips
+    amount  int32   hundredths of a chip won or lost (negative) by a SETTLE
+                    record, as payouts like 3:2 aren't whole chips, the
+                    number of players of a ROUND record
+
+A SPLIT record splits the hand at its index, the new hand following it. A
+SURRENDER record comes before the SETTLE record of a surrendered hand. The
+file starts with an 8 byte header holding MAGIC and VERSION. Records are
+packed into a buffer and written by a background thread, so the table only
+pays for the packing. HandHistory memory-maps a file and unpacks records in
+place.
+"""
+from collections import namedtuple
+import mmap
+import queue
+import struct
+import threading
+
+from blackjack import CARDS, Hands
+from blackjack.rules import SURRENDER as SURRENDER_STATUS
+
+MAGIC = b'BJHH'
+VERSION = 4
+HEADER = struct.Struct('<4sI')
+RECORD = struct.Struct('<IBBBbi')
+
+ROUND = 0
+DEAL = 1
+HIT = 2
+SETTLE = 3
+SPLIT = 4
+DOUBLE = 5
+SURRENDER = 6
+
+DEALER_SEAT = 255
+NO_CARD = 255
+
+# Result of each settlement event kind
+RESULTS = {'win': 1, 'push': 0, 'lose': -1}
+
+# Bits of the kind byte holding the kind, the rest hold the hand index
+KIND_BITS = 4
+KIND_MASK = (1 << KIND_BITS) - 1
+
+Record = namedtuple('Record', 'round kind seat card result amount hand')
+
+
+def card_code(card):
+    """Record code of card, NO_CARD for cards outside the deck."""
+    return NO_CARD if card.code is None else card.code
+
+
+def hand_index(player, hand):
+    """Index of hand among the player's hands, 0 unless they split."""
+    hands = player.hands
+    return hands.index(hand) if len(hands) > 1 else 0
+
+
+def unpack_record(values):
+    """Record of the values of a packed record."""
+    round_number, kind, seat, card, result, amount = values
+    return Record(round_number, kind & KIND_MASK, seat, card, result, amount,
+                  kind >> KIND_BITS)
+
+
+class HandHistoryWriter(object):
+    """Event subscriber appending hands to a hand-history file.
+
+    Records are buffered until buffer_records are waiting, then handed to a
+    writer thread. close() writes whatever is left and must be called once
+    the table is done, the writer is also a context manager.
+    """
+
+    def __init__(self, path, buffer_records=65536):
+        self.path = path
+        self.buffer_size = buffer_records * RECORD.size
+        self.buffer = bytearray()
+        self.round = 0
+        self.seats = {}
+        self.file = open(path, 'ab')
+        if not self.file.tell():
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.queue = queue.Queue(maxsize=8)
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __call__(self, event):
+        kind = event.kind
+        fields = event.fields
+        if kind == 'hit':
+            player = fields['player']
+            seat = self.seats.get(id(player), DEALER_SEAT)
+            index = 0 if seat == DEALER_SEAT else hand_index(
+                player, fields['hand'])
+            self.buffer += RECORD.pack(self.round, index << KIND_BITS | HIT,
+                                       seat, card_code(fields['card']), 0, 0)
+        elif kind in RESULTS:
+            result = RESULTS[kind]
+            player = fields['player']
+            hand = fields['hand']
+            index = hand_index(player, hand) << KIND_BITS
+            seat = self.seats[id(player)]
+            if hand.status_code == SURRENDER_STATUS:
+                self.buffer += RECORD.pack(self.round, index | SURRENDER,
+                                           seat, NO_CARD, 0, 0)
+            self.buffer += RECORD.pack(self.round, index | SETTLE, seat,
+                                       NO_CARD, result,
+                                       round(result * fields['amount'] * 100))
+        elif kind == 'split' or kind == 'double':
+            player = fields['player']
+            self.buffer += RECORD.pack(
+                self.round,
+                hand_index(player, fields['hand']) << KIND_BITS |
+                (SPLIT if kind == 'split' else DOUBLE),
+                self.seats[id(player)],
+                card_code(fields['card']) if kind == 'double' else NO_CARD,
+                0, 0)
+        elif kind == 'dealt':
+            self._deal(fields['players'], fields['dealer_hand'])
+        else:
+            return
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def _deal(self, players, dealer_hand):
+        self.round += 1
+        round_number = self.round
+        self.seats = {id(player): seat for seat, player in enumerate(players)}
+        pack = RECORD.pack
+        buffer = self.buffer
+        buffer += pack(round_number, ROUND, DEALER_SEAT, NO_CARD, 0,
+                       len(players))
+        for seat, player in enumerate(players):
+            for card in player.hand.cards:
+                buffer += pack(round_number, DEAL, seat, card_code(card), 0, 0)
+        for card in dealer_hand.cards:
+            buffer += pack(round_number, DEAL, DEALER_SEAT, card_code(card), 0,
+                           0)
+
+    def flush(self):
+        """Hand the buffered records to the writer thread."""
+        if self.buffer:
+            self.queue.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+    def close(self):
+        """Write the remaining records and close the file."""
+        if self.file.closed:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def _write(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                self.file.flush()
+                return
+            self.file.write(data)
+
+
+class HandHistory(object):
+    """Memory-mapped hand-history file.
+
+    Supports len() and indexing by record number, records() iterates every
+    record and rounds() groups them by round. Also a context manager.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as history_file:
+            self.map = mmap.mmap(history_file.fileno(),
+                                 0,
+                                 access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f'{path} is not a version {VERSION} hand history')
+        self.count = (len(self.map) - HEADER.size) // RECORD.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('record index out of range')
+        return unpack_record(
+            RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size))
+
+    def close(self):
+        self.map.close()
+
+    def records(self, start=0):
+        """Iterate over the records from record number start."""
+        with memoryview(self.map) as mapped:
+            view = mapped[HEADER.size + start * RECORD.size:HEADER.size +
+                          self.count * RECORD.size]
+            try:
+                for values in RECORD.iter_unpack(view):
+                    yield unpack_record(values)
+            finally:
+                view.release()
+
+    def rounds(self):
+        """Iterate over the records of each round as lists."""
+        records = []
+        for record in self.records():
+            if record.kind == ROUND and records:
+                yield records
+                records = []
+            records.append(record)
+        if records:
+            yield records
+
+
+def replay(records):
+    """Hands of one round's records as {seat: Hands} and their results.
+
+    The dealer's hands are under DEALER_SEAT, hands have their blackjack,
+    double, surrender or bust status set so settle_hand settles them as the
+    table did.
+    Results map seats to a list of (result, chips won or lost) per settled
+    hand, in the order of the hands.
+    """
+    seats = {}
+    results = {}
+    for record in records:
+        kind = record.kind
+        if kind == ROUND or kind == SETTLE:
+            if kind == SETTLE:
+                results.setdefault(record.seat, []).append(
+                    (record.result, record.amount / 100))
+            continue
+        hands = seats.get(record.seat)
+        if hands is None:
+            hands = seats[record.seat] = Hands()
+        if kind == SPLIT:
+            hands.split(record.hand)
+        elif kind == SURRENDER:
+            hands[record.hand].status_code = SURRENDER_STATUS
+        elif kind == DOUBLE:
+            hands[record.hand].double(CARDS[record.card])
+        elif record.card != NO_CARD:
+            hands[record.hand].add_card(CARDS[record.card])
+    for hands in seats.values():
+        if len(hands) == 1:
+            hands[0].check_for_blackjack()
+        for hand in hands:
+            hand.check_for_bust()
+    return seats, results
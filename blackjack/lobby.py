@@ -0,0 +1,225 @@
+"""Lobby seating a large player population at tables sharded over processes.
+
+Every table belongs to a shard, and each shard's tables are played by one
+worker process. The lobby only keeps the seating: an index of players by id,
+each table's PlayerRegistry and per shard the tables with a free seat, so
+joining, leaving and finding a player take constant time however many
+players are seated.
+
+Joining players go to the shard with the fewest players and fill its open
+tables before a new one opens. When players leave, a table that falls to
+half full or less moves its players to another open table of its shard,
+and a table moves from the fullest shard to the emptiest whenever their
+players differ by more than two tables' worth.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+
+from blackjack import Player, PlayerRegistry
+from blackjack.parallel import chunk_rng
+from blackjack.simulation import HeadlessTable, SimulationStats
+
+
+class LobbyTable(object):
+    """Seating of one lobby table."""
+
+    __slots__ = ('id', 'shard', 'players')
+
+    def __init__(self, table_id, shard):
+        self.id = table_id
+        self.shard = shard
+        self.players = PlayerRegistry()
+
+    def __len__(self):
+        return len(self.players)
+
+    def __repr__(self):
+        return f'LobbyTable({self.id}, players={len(self.players)})'
+
+
+class Shard(object):
+    """Tables played by one worker process.
+
+    open_tables holds the tables with a free seat in the order they opened,
+    a dict used as an ordered set.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.tables = {}
+        self.open_tables = {}
+        self.player_count = 0
+
+    def __repr__(self):
+        return (f'Shard({self.index}, tables={len(self.tables)}, '
+                f'players={self.player_count})')
+
+
+def play_tables(task):
+    """Play rounds at each table of a shard.
+
+    Returns the chips of every player by id and the shard's merged
+    SimulationStats.
+    """
+    table_config, tables, seed, batch, rounds = task
+    chips = {}
+    stats = SimulationStats()
+    for table_id, player_configs in tables:
+        table = HeadlessTable(rng=chunk_rng(seed, f'{table_id}:{batch}'),
+                              **table_config)
+        for player_config in player_configs:
+            table.add_player(Player(dict(player_config)))
+        stats.merge(table.run(rounds))
+        for player in table.players:
+            chips[player.id] = player.chips
+    return chips, stats
+
+
+class Lobby(object):
+    """Seats players at tables sharded over shards worker processes.
+
+    table_config holds the HeadlessTable keyword arguments of every table,
+    its policies must be picklable. Tables seat up to seats_per_table
+    players.
+    """
+
+    def __init__(self, shards=1, seats_per_table=5, table_config=None, seed=0):
+        self.shards = [Shard(index) for index in range(shards)]
+        self.seats_per_table = seats_per_table
+        self.table_config = dict(table_config or {})
+        self.seed = seed
+        self.players = {}
+        self.seating = {}
+        self.table_ids = itertools.count(1)
+        self.batches = 0
+
+    def __len__(self):
+        return len(self.players)
+
+    def table_of(self, player_id):
+        """LobbyTable the player sits at, raises KeyError if not seated."""
+        return self.seating[player_id]
+
+    def join(self, player):
+        """Seat player and return their LobbyTable.
+
+        Raises ValueError when their id is already seated.
+        """
+        if player.id in self.players:
+            raise ValueError(f'Player {player.id} is already seated')
+        shard = min(self.shards, key=lambda shard: shard.player_count)
+        if shard.open_tables:
+            table = next(iter(shard.open_tables.values()))
+        else:
+            table = self._open_table(shard)
+        self._seat(player, table)
+        return table
+
+    def leave(self, player_id):
+        """Unseat and return the player, rebalancing the tables.
+
+        Raises KeyError when they aren't seated.
+        """
+        table = self.seating.pop(player_id)
+        player = self.players.pop(player_id)
+        table.players.remove(player_id)
+        shard = table.shard
+        shard.player_count -= 1
+        shard.open_tables[table.id] = table
+        if not table.players:
+            self._close_table(table)
+        elif len(table) <= self.seats_per_table // 2:
+            self._merge(table)
+        self._balance_shards()
+        return player
+
+    def _open_table(self, shard):
+        table = LobbyTable(next(self.table_ids), shard)
+        shard.tables[table.id] = table
+        shard.open_tables[table.id] = table
+        return table
+
+    def _close_table(self, table):
+        del table.shard.tables[table.id]
+        table.shard.open_tables.pop(table.id, None)
+
+    def _seat(self, player, table):
+        table.players.add(player)
+        self.players[player.id] = player
+        self.seating[player.id] = table
+        table.shard.player_count += 1
+        if len(table) >= self.seats_per_table:
+            del table.shard.open_tables[table.id]
+
+    def _merge(self, table):
+        """Move the players of table to the newest other open table."""
+        shard = table.shard
+        other = None
+        for other in reversed(shard.open_tables.values()):
+            if other is not table:
+                break
+        if (other is None or other is table
+                or self.seats_per_table - len(other) < len(table)):
+            return
+        for player in list(table.players):
+            table.players.remove(player.id)
+            shard.player_count -= 1
+            self._seat(player, other)
+        self._close_table(table)
+
+    def _balance_shards(self):
+        """Move a table from the fullest shard to the emptiest if needed."""
+        if len(self.shards) < 2:
+            return
+        fullest = max(self.shards, key=lambda shard: shard.player_count)
+        emptiest = min(self.shards, key=lambda shard: shard.player_count)
+        if (fullest.player_count - emptiest.player_count <=
+                2 * self.seats_per_table):
+            return
+        table = next(iter(fullest.tables.values()))
+        self._close_table(table)
+        fullest.player_count -= len(table)
+        table.shard = emptiest
+        emptiest.tables[table.id] = table
+        if len(table) < self.seats_per_table:
+            emptiest.open_tables[table.id] = table
+        emptiest.player_count += len(table)
+
+    def tasks(self, rounds):
+        """One play_tables task per shard with tables."""
+        for shard in self.shards:
+            if not shard.tables:
+                continue
+            tables = [(table.id, [{
+                'id': player.id,
+                'name': player.name,
+                'chips': player.chips
+            } for player in table.players])
+                      for table in shard.tables.values()]
+            yield (self.table_config, tables, self.seed, self.batches, rounds)
+
+    def play(self, rounds, workers=None):
+        """Play rounds rounds at every table, a process per shard.
+
+        Players' chips are updated and players who can no longer cover the
+        minimum bet leave. Returns the merged SimulationStats and the
+        players who left.
+        """
+        stats = SimulationStats()
+        tasks = list(self.tasks(rounds))
+        self.batches += 1
+        if workers == 1 or len(tasks) < 2:
+            results = map(play_tables, tasks)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers or len(tasks))
+            with executor:
+                results = list(executor.map(play_tables, tasks))
+        min_bet = self.table_config.get('min_bet', 5)
+        busted = []
+        for chips, shard_stats in results:
+            stats.merge(shard_stats)
+            for player_id, player_chips in chips.items():
+                self.players[player_id].chips = player_chips
+                if player_chips < min_bet:
+                    busted.append(player_id)
+        return stats, [self.leave(player_id) for player_id in busted]
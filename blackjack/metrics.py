@@ -0,0 +1,173 @@
+"""In-process counters and histograms with Prometheus and JSON exporters.
+
+Table and Shoe record into a Metrics registry when given one:
+
+    blackjack_phase_seconds{phase=...}  time of each start_game phase
+    blackjack_bet_seconds               wait for each bet
+    blackjack_decision_seconds          wait for each hit or stay decision
+    blackjack_shoe_reset_seconds        time of each shoe reset
+    blackjack_rounds_total              rounds played
+
+Histogram counts double as call counts. Without a registry nothing is
+timed, so the tables run as before.
+"""
+from bisect import bisect_left
+import json
+import time
+
+# Upper bounds in seconds, from fast engine phases to slow players
+DEFAULT_BUCKETS = (.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5, 10, 30,
+                   60)
+
+
+class Counter(object):
+    """Count that only goes up."""
+
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        """(suffix, extra labels, value) of each exported sample."""
+        yield '', (), self.value
+
+    def to_dict(self):
+        return {'value': self.value}
+
+
+class Histogram(object):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(bound, count of values <= bound) per bucket, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'), ), self.counts):
+            total += count
+            yield bound, total
+
+    def samples(self):
+        for bound, count in self.cumulative():
+            yield '_bucket', (('le', format_bound(bound)), ), count
+        yield '_sum', (), self.sum
+        yield '_count', (), self.count
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {
+                format_bound(bound): count
+                for bound, count in self.cumulative()
+            }
+        }
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class Timer(object):
+    """Context manager observing its duration into a histogram."""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metrics(object):
+    """Registry of counters and histograms by name and labels."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.metrics = {}
+
+    def _get(self, kind, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            metric = self.metrics[key] = (Histogram(self.buckets) if kind
+                                          == 'histogram' else Counter())
+        elif metric.kind != kind:
+            raise ValueError(f'{name} is a {metric.kind}, not a {kind}')
+        return metric
+
+    def counter(self, name, **labels):
+        """Counter name with labels, created on first use."""
+        return self._get('counter', name, labels)
+
+    def histogram(self, name, **labels):
+        """Histogram name with labels, created on first use."""
+        return self._get('histogram', name, labels)
+
+    def time(self, name, **labels):
+        """Context manager timing its block into histogram name."""
+        return Timer(self.histogram(name, **labels))
+
+    def timed(self, function, name, **labels):
+        """function wrapped to time every call into histogram name."""
+        histogram = self.histogram(name, **labels)
+
+        def timed_function(*args, **kwargs):
+            with Timer(histogram):
+                return function(*args, **kwargs)
+
+        return timed_function
+
+    def to_prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+        for (name, labels), metric in sorted(self.metrics.items(),
+                                             key=lambda item: item[0]):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {metric.kind}')
+            for suffix, extra, value in metric.samples():
+                lines.append(
+                    f'{name}{suffix}{format_labels(labels + extra)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        """Metrics as {name: [{'labels': ..., **values}]}."""
+        result = {}
+        for (name, labels), metric in sorted(self.metrics.items(),
+                                             key=lambda item: item[0]):
+            result.setdefault(name, []).append(
+                dict(labels=dict(labels), **metric.to_dict()))
+        return result
+
+    def to_json(self):
+        """Metrics as a JSON document, see to_dict."""
+        return json.dumps(self.to_dict())
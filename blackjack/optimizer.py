@@ -0,0 +1,254 @@
+"""Strategy search with common random numbers.
+
+Candidates, each a decision policy and a bet policy, are raced through the
+same pre-shuffled shoes: shoe k deals the same cards in the same order to
+every candidate, so what differs between two candidates on a shoe comes
+from their play alone. Comparing the paired per-shoe results needs far
+fewer hands than comparing independent runs.
+
+Shoes are played in batches. After each batch a candidate is pruned once
+the confidence interval of its paired difference to the leader lies
+entirely below zero, the survivors play on until one is left or the shoes
+run out.
+"""
+from array import array
+from collections import namedtuple
+import math
+import random
+
+from blackjack import DECK_SIZE, HI_LO, Player
+from blackjack.probability import card_value
+from blackjack.rules import Rules
+from blackjack.simulation import HeadlessTable, dealer_mimic, flat_bet
+from blackjack.strategy import ACTIONS, HIT, STAND
+
+Candidate = namedtuple('Candidate', 'name decision_policy bet_policy')
+Candidate.__new__.__defaults__ = (dealer_mimic, flat_bet)
+
+
+class LookupPolicy(object):
+    """Decision policy playing a hit or stand lookup table.
+
+    table is indexed [soft][player_total][dealer_upcard] with the upcard 1
+    for an Ace and 2-10 otherwise, holding HIT or STAND like the tables of
+    blackjack.strategy and blackjack.batch.
+    """
+
+    def __init__(self, table):
+        self.table = [[list(row) for row in rows] for rows in table]
+
+    def __call__(self, player, hand, dealer_upcard):
+        return ACTIONS[self.table[hand.is_soft][hand.calculate_total()][
+            card_value(dealer_upcard)]]
+
+    def flipped(self, soft, total, upcard):
+        """Copy of the policy with one decision switched."""
+        policy = LookupPolicy(self.table)
+        row = policy.table[soft][total]
+        row[upcard] = STAND if row[upcard] == HIT else HIT
+        return policy
+
+    def variants(self, cells):
+        """Candidates switching each (soft, total, upcard) of cells."""
+        for soft, total, upcard in cells:
+            yield Candidate(f"{'soft' if soft else 'hard'} {total} "
+                            f"v {upcard}", self.flipped(soft, total, upcard))
+
+
+class BetSpread(object):
+    """Bet policy raising the bet with the true count.
+
+    Bets unit times spread[true_count], the true count floored and clamped
+    to the spread, so spread[0] covers counts of 0 and below. Needs a table
+    counting cards with system.
+    """
+
+    def __init__(self, spread, unit, system='Hi-Lo'):
+        self.spread = tuple(spread)
+        self.unit = unit
+        self.system = system
+
+    def __call__(self, player, table):
+        true_count = table.shoe.counter.true_count(self.system)
+        index = min(max(math.floor(true_count), 0), len(self.spread) - 1)
+        return min(self.unit * self.spread[index], table.max_bet,
+                   player.chips)
+
+
+class CandidateResult(object):
+    """Per-shoe results of a candidate.
+
+    shoe_nets holds the chips won or lost on each shoe played, stats the
+    merged SimulationStats and pruned the number of shoes played before the
+    candidate was pruned, None while it survives.
+    """
+
+    def __init__(self, candidate, table):
+        self.candidate = candidate
+        self.table = table
+        self.shoe_nets = []
+        self.pruned = None
+
+    def __repr__(self):
+        return (f'CandidateResult({self.name!r}, shoes={len(self.shoe_nets)},'
+                f' ev={self.ev:.4f}, pruned={self.pruned})')
+
+    @property
+    def name(self):
+        return self.candidate.name
+
+    @property
+    def stats(self):
+        return self.table.stats
+
+    @property
+    def ev(self):
+        """Chips won per round."""
+        stats = self.stats
+        return stats.net / stats.rounds if stats.rounds else 0.0
+
+    @property
+    def mean(self):
+        """Chips won per shoe."""
+        shoe_nets = self.shoe_nets
+        return sum(shoe_nets) / len(shoe_nets) if shoe_nets else 0.0
+
+
+def paired_difference(nets, other_nets):
+    """Mean and standard error of the per-shoe differences nets - other_nets.
+
+    Only the shoes both played are compared.
+    """
+    differences = [net - other for net, other in zip(nets, other_nets)]
+    count = len(differences)
+    if count < 2:
+        return 0.0, float('inf')
+    mean = sum(differences) / count
+    variance = sum(
+        (difference - mean)**2 for difference in differences) / (count - 1)
+    return mean, math.sqrt(variance / count)
+
+
+class StrategyOptimizer(object):
+    """Races candidates through common pre-shuffled shoes.
+
+    Every candidate plays at its own HeadlessTable with the same rules,
+    limits and players seats, counting cards with counting_systems so bet
+    spreads can read the count. Shoes are dealt down to the rules' cut card,
+    so rules with penetration below 1 keep the candidates on the same cards
+    for longer. Candidates are pruned once their difference to the leader is
+    below zero by more than z standard errors, never before min_shoes.
+    """
+
+    def __init__(self,
+                 candidates,
+                 rules=None,
+                 seed=0,
+                 min_bet=10,
+                 max_bet=100,
+                 players=1,
+                 chips=10**9,
+                 batch_shoes=50,
+                 min_shoes=100,
+                 z=3.0,
+                 counting_systems=(HI_LO, )):
+        self.rules = Rules(penetration=.75) if rules is None else rules
+        if self.rules.continuous_shuffle:
+            raise ValueError('Common shoes need rules without continuous '
+                             'shuffling')
+        self.seed = seed
+        self.batch_shoes = batch_shoes
+        self.min_shoes = min_shoes
+        self.z = z
+        self.results = []
+        for candidate in candidates:
+            table = HeadlessTable(min_bet=min_bet,
+                                  max_bet=max_bet,
+                                  bet_policy=candidate.bet_policy,
+                                  decision_policy=candidate.decision_policy,
+                                  counting_systems=counting_systems,
+                                  rules=self.rules)
+            for seat in range(players):
+                table.add_player(
+                    Player({
+                        'id': seat,
+                        'name': f'Seat {seat}',
+                        'chips': chips
+                    }))
+            self.results.append(CandidateResult(candidate, table))
+        self.shoes = 0
+
+    def shoe(self, index):
+        """Card codes of shoe index, the same for every candidate."""
+        cards = array('B', range(DECK_SIZE)) * self.rules.deck_count
+        random.Random(f'{self.seed}:{index}').shuffle(cards)
+        return cards
+
+    def play_shoe(self, result, cards, index):
+        """Play the candidate's table through cards, returns the net won."""
+        table = result.table
+        shoe = table.shoe
+        for player in table.players:
+            player.hands.clear()
+        table.dealer.hands.clear()
+        shoe.cards = array('B', cards)
+        shoe.cursor = 0
+        del shoe.discard_pile[:]
+        # A shoe dealt to its end reshuffles the same way for everyone
+        shoe.rng = random.Random(f'{self.seed}:{index}:reset')
+        if shoe.counter is not None:
+            shoe.counter.reset([len(cards) // 13] * 13)
+        net = table.stats.net
+        reshuffle_at = self.rules.reshuffle_at
+        table.game_on = True
+        while len(shoe) > reshuffle_at:
+            if not table.play_round():
+                break
+        table.game_on = False
+        return table.stats.net - net
+
+    def survivors(self):
+        """Results of the candidates not pruned yet."""
+        return [result for result in self.results if result.pruned is None]
+
+    def leader(self):
+        """Surviving result with the most chips won per shoe."""
+        return max(self.survivors(), key=lambda result: result.mean)
+
+    def prune(self):
+        """Prune the survivors that are clearly behind the leader."""
+        if self.shoes < self.min_shoes:
+            return
+        leader = self.leader()
+        for result in self.survivors():
+            if result is leader:
+                continue
+            mean, error = paired_difference(result.shoe_nets,
+                                            leader.shoe_nets)
+            if mean + self.z * error < 0:
+                result.pruned = self.shoes
+
+    def run(self, max_shoes=1000):
+        """Race the candidates for up to max_shoes shoes.
+
+        Returns the results ranked, see ranking().
+        """
+        while self.shoes < max_shoes and len(self.survivors()) > 1:
+            for _ in range(min(self.batch_shoes, max_shoes - self.shoes)):
+                cards = self.shoe(self.shoes)
+                for result in self.survivors():
+                    result.shoe_nets.append(
+                        self.play_shoe(result, cards, self.shoes))
+                self.shoes += 1
+            self.prune()
+        return self.ranking()
+
+    def ranking(self):
+        """Results by chips won per shoe, the survivors first.
+
+        Pruned candidates follow the survivors, the last pruned first.
+        """
+        return sorted(self.results,
+                      key=lambda result: (result.pruned is None, result.pruned
+                                          or 0, result.mean),
+                      reverse=True)
@@ -0,0 +1,70 @@
+"""Multi-core runner for headless simulations.
+
+A simulation is split into fixed-size chunks of rounds. Every chunk plays on
+a fresh HeadlessTable whose shoe has its own random.Random seeded from the
+run seed and the chunk number, so the merged result only depends on the seed
+and never on how many workers played the chunks. Workers only send back
+their SimulationStats.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+
+from blackjack import Player
+from blackjack.simulation import HeadlessTable, SimulationStats
+
+
+def chunk_rng(seed, chunk):
+    """Independent random generator for one chunk of a run."""
+    return random.Random(f'{seed}:{chunk}')
+
+
+def run_chunk(task):
+    """Play one chunk of rounds and return its SimulationStats."""
+    table_config, player_configs, seed, chunk, rounds = task
+    table = HeadlessTable(rng=chunk_rng(seed, chunk), **table_config)
+    for player_config in player_configs:
+        table.add_player(Player(dict(player_config)))
+    return table.run(rounds)
+
+
+class ParallelRunner(object):
+    """Runs a HeadlessTable configuration across a pool of processes.
+
+    table_config holds the HeadlessTable keyword arguments, its policies
+    must be picklable (module level functions). player_configs are the
+    Player configs seated at every chunk's table, players start every chunk
+    with their configured chips.
+    """
+
+    def __init__(self,
+                 table_config,
+                 player_configs,
+                 seed=0,
+                 workers=None,
+                 chunk_rounds=50000):
+        self.table_config = dict(table_config)
+        self.player_configs = list(player_configs)
+        self.seed = seed
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_rounds = chunk_rounds
+
+    def tasks(self, rounds):
+        """Split rounds into chunk tasks."""
+        rounds = int(rounds)
+        for chunk, start in enumerate(range(0, rounds, self.chunk_rounds)):
+            yield (self.table_config, self.player_configs, self.seed, chunk,
+                   min(self.chunk_rounds, rounds - start))
+
+    def run(self, rounds):
+        """Play rounds rounds and return the merged SimulationStats."""
+        stats = SimulationStats()
+        if self.workers == 1:
+            for task in self.tasks(rounds):
+                stats.merge(run_chunk(task))
+            return stats
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for chunk_stats in executor.map(run_chunk, self.tasks(rounds)):
+                stats.merge(chunk_stats)
+        return stats
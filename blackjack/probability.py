@@ -0,0 +1,139 @@
+"""Exact dealer outcome probabilities.
+
+Follows the dealer rules of Table.play_hand: the dealer hits while the total
+is below 17, counting an Ace as 11 when that doesn't bust the hand.
+
+Shoe compositions are tuples of 10 counts of the cards left in the shoe, by
+value: Aces first, then 2 to 9, then all ten-valued cards.
+"""
+from collections import OrderedDict
+
+from blackjack import CARDS
+
+# Order of the probabilities returned by DealerProbabilities.distribution
+DEALER_OUTCOMES = ('17', '18', '19', '20', '21', 'blackjack', 'bust')
+BLACKJACK = 5
+BUST = 6
+
+
+def card_value(card):
+    """Value of card with Aces counted as 1."""
+    return 1 if card.rank == 'Ace' else card.value
+
+
+def shoe_composition(deck_count=6):
+    """Composition of a full shoe of deck_count decks."""
+    return (4 * deck_count, ) * 9 + (16 * deck_count, )
+
+
+def composition_of(cards):
+    """Composition of an iterable of Cards."""
+    counts = [0] * 10
+    for card in cards:
+        counts[card_value(card) - 1] += 1
+    return tuple(counts)
+
+
+def composition_of_shoe(shoe):
+    """Composition of the undealt cards of a Shoe or CompactShoe."""
+    if shoe.counter is not None:
+        remaining = shoe.counter.remaining
+        # RANKS order is 2-10, Jack, Queen, King, Ace
+        return (remaining[12], ) + tuple(remaining[:8]) + (sum(
+            remaining[8:12]), )
+    if hasattr(shoe, 'cursor'):
+        return composition_of(CARDS[code] for code in shoe.cards[shoe.cursor:])
+    return composition_of(shoe.cards)
+
+
+def remove_cards(composition, *values):
+    """Composition left after dealing cards of the given values."""
+    counts = list(composition)
+    for value in values:
+        if not counts[value - 1]:
+            raise ValueError(f'No card of value {value} left in the shoe')
+        counts[value - 1] -= 1
+    return tuple(counts)
+
+
+class DealerProbabilities(object):
+    """Exact dealer final total distribution per upcard and composition.
+
+    Results are kept in a least recently used memo holding up to cache_size
+    (upcard, composition) entries.
+    """
+
+    def __init__(self, cache_size=4096):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def distribution(self, upcard, composition):
+        """Probabilities of DEALER_OUTCOMES for the dealer.
+
+        upcard is the value of the dealer's upcard (1 for an Ace) and
+        composition the cards left in the shoe, not counting the upcard.
+        """
+        key = (upcard, composition)
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+
+        result = [0.0] * len(DEALER_OUTCOMES)
+        remaining = sum(composition)
+        memo = {}
+        for index, count in enumerate(composition):
+            if not count:
+                continue
+            value = index + 1
+            probability = count / remaining
+            hard = upcard + value
+            has_ace = upcard == 1 or value == 1
+            if has_ace and hard == 11:
+                result[BLACKJACK] += probability
+                continue
+            drawn = composition[:index] + (count - 1, ) + composition[index +
+                                                                      1:]
+            outcome = self._draw(hard, has_ace, drawn, remaining - 1, memo)
+            for outcome_index, outcome_probability in enumerate(outcome):
+                result[outcome_index] += probability * outcome_probability
+
+        result = tuple(result)
+        cache[key] = result
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return result
+
+    def bust_probability(self, upcard, composition):
+        """Probability of the dealer busting."""
+        return self.distribution(upcard, composition)[BUST]
+
+    def _draw(self, hard, has_ace, composition, remaining, memo):
+        """Outcome distribution of a dealer hand that has two or more cards."""
+        total = hard + 10 if has_ace and hard <= 11 else hard
+        if total >= 17:
+            result = [0.0] * len(DEALER_OUTCOMES)
+            result[BUST if total > 21 else total - 17] = 1.0
+            return result
+
+        key = (hard, has_ace, composition)
+        if key in memo:
+            return memo[key]
+
+        result = [0.0] * len(DEALER_OUTCOMES)
+        for index, count in enumerate(composition):
+            if not count:
+                continue
+            probability = count / remaining
+            drawn = composition[:index] + (count - 1, ) + composition[index +
+                                                                      1:]
+            outcome = self._draw(hard + index + 1, has_ace or index == 0,
+                                 drawn, remaining - 1, memo)
+            for outcome_index, outcome_probability in enumerate(outcome):
+                result[outcome_index] += probability * outcome_probability
+        memo[key] = result
+        return result
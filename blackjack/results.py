@@ -0,0 +1,448 @@
+"""Columnar store of settled hands with precomputed group-by indexes.
+
+ResultStoreWriter subscribes to a table's events and appends a row per
+settled hand to a directory holding one file of packed little endian
+values per column, see COLUMNS:
+
+    total         uint8   player's total when the hand was dealt, a hand
+                          split off a pair keeps the pair's total
+    soft          uint8   1 when that total counted an Ace as 11
+    upcard        uint8   dealer upcard, 1 for an Ace
+    true_count    int8    true count before the cards of the round were
+                          dealt, floored, 0 without a counter
+    action        uint8   first action, ACTION_CODES, 0 for none
+    actions       uint32  every action in base 6, the first action in the
+                          lowest digit
+    dealer_total  uint8   dealer's final total, above 21 when they bust
+    bet           uint32  hundredths of a chip bet on the hand
+    net           int32   hundredths of a chip won or lost (negative)
+
+Actions are the decisions taken on the hand: H, D, P and R, plus S when
+the hand stood, automatically on 21 too. Hands split off a pair start
+with the pair's P.
+
+The writer also folds every row into group-by indexes, a running
+Aggregate per distinct key of the index's columns, saved to indexes.json
+with the number of rows on every flush. A writer reopening a store cuts
+off the rows a crash left past that number, so the columns always match
+the indexes. ResultStore memory-maps the columns and answers group_by()
+queries from the smallest index covering the queried columns, so
+aggregates over billions of rows only read the index. Queries no index
+covers scan the columns a chunk at a time.
+"""
+from array import array
+import json
+import math
+import mmap
+from operator import itemgetter
+import os
+import sys
+
+from blackjack import DECK_SIZE, RANK_INDEX
+from blackjack.probability import card_value
+from blackjack.rules import STAY, SURRENDER
+
+# Column names and array typecodes in row order
+COLUMNS = (('total', 'B'), ('soft', 'B'), ('upcard', 'B'),
+           ('true_count', 'b'), ('action', 'B'), ('actions', 'I'),
+           ('dealer_total', 'B'), ('bet', 'I'), ('net', 'i'))
+TYPECODES = dict(COLUMNS)
+
+# Digit of each action in the actions column
+ACTION_CODES = {'H': 1, 'S': 2, 'D': 3, 'P': 4, 'R': 5}
+ACTION_BASE = 6
+# Digits an uint32 holds, later actions aren't recorded
+MAX_ACTIONS = 12
+
+# Index names and their columns
+INDEXES = {'decision': ('total', 'soft', 'upcard', 'action', 'true_count')}
+
+# Sign of the chips won by each settlement event kind
+SIGNS = {'win': 1, 'push': 0, 'lose': -1}
+
+INDEX_FILE = 'indexes.json'
+
+
+def column_path(directory, name):
+    return os.path.join(directory, f'{name}.col')
+
+
+def key_getter(positions):
+    """Function returning the tuple of a row's values at positions."""
+    if len(positions) == 1:
+        position, = positions
+        return lambda row: (row[position], )
+    return itemgetter(*positions)
+
+
+def decode_actions(code):
+    """Action letters of an actions column value."""
+    letters = {digit: action for action, digit in ACTION_CODES.items()}
+    actions = ''
+    while code:
+        code, digit = divmod(code, ACTION_BASE)
+        actions += letters[digit]
+    return actions
+
+
+class Aggregate(object):
+    """Totals of a group of rows, amounts in chips."""
+
+    __slots__ = ('rows', 'bet', 'net', 'net_squared', 'dealer_busts')
+
+    def __init__(self, rows=0, bet=0, net=0, net_squared=0, dealer_busts=0):
+        self.rows = rows
+        self.bet = bet
+        self.net = net
+        self.net_squared = net_squared
+        self.dealer_busts = dealer_busts
+
+    def __repr__(self):
+        return (f'Aggregate(rows={self.rows}, ev={self.ev:.4f}, '
+                f'dealer_bust_rate={self.dealer_bust_rate:.4f})')
+
+    @classmethod
+    def from_hundredths(cls, rows, bet, net, net_squared, dealer_busts):
+        return cls(rows, bet / 100, net / 100, net_squared / 10000,
+                   dealer_busts)
+
+    def add(self, other):
+        """Add the rows of other into this aggregate."""
+        self.rows += other.rows
+        self.bet += other.bet
+        self.net += other.net
+        self.net_squared += other.net_squared
+        self.dealer_busts += other.dealer_busts
+        return self
+
+    @property
+    def ev(self):
+        """Chips won per hand."""
+        return self.net / self.rows if self.rows else 0.0
+
+    @property
+    def edge(self):
+        """Chips won per chip bet."""
+        return self.net / self.bet if self.bet else 0.0
+
+    @property
+    def std_dev(self):
+        """Standard deviation of the chips won per hand."""
+        if not self.rows:
+            return 0.0
+        return math.sqrt(max(self.net_squared / self.rows - self.ev**2, 0))
+
+    @property
+    def dealer_bust_rate(self):
+        return self.dealer_busts / self.rows if self.rows else 0.0
+
+
+class ResultStoreWriter(object):
+    """Event subscriber appending settled hands to a result store.
+
+    counter, usually the table's shoe.counter, gives the true count of the
+    counting system named system. Rows are buffered until buffer_rows are
+    waiting. indexes maps index names to their columns, an existing store
+    is appended to with the indexes it was created with. flush() writes the
+    buffered rows and the indexes, close() the remaining rows, the writer
+    is also a context manager.
+    """
+
+    def __init__(self,
+                 directory,
+                 counter=None,
+                 system='Hi-Lo',
+                 indexes=None,
+                 buffer_rows=65536):
+        self.directory = directory
+        self.counter = counter
+        self.system = system
+        self.buffer_rows = buffer_rows
+        os.makedirs(directory, exist_ok=True)
+        self.rows = 0
+        self.indexes = {
+            name: (tuple(columns), {})
+            for name, columns in (INDEXES if indexes is None else indexes
+                                  ).items()
+        }
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            self.rows, self.indexes = load_indexes(index_path)
+        truncate_columns(directory, self.rows)
+        # Key of a row in each index, and the index's groups
+        names = [name for name, _ in COLUMNS]
+        self.keys = [(key_getter([names.index(name) for name in columns]),
+                      groups) for columns, groups in self.indexes.values()]
+        self.buffer = []
+        self.hands = {}
+        self.true_count = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __call__(self, event):
+        kind = event.kind
+        sign = SIGNS.get(kind)
+        if sign is not None:
+            fields = event.fields
+            self._settle(fields['hand'], fields['dealer_hand'],
+                         sign * fields['amount'])
+            return
+        if kind == 'hit':
+            state = self.hands.get(event.fields['hand'])
+            if state is None:
+                return
+            if state[4]:
+                # The second card of a split hand isn't a decision
+                state[4] = False
+            else:
+                self._act(state, 'H')
+        elif kind == 'double':
+            state = self.hands.get(event.fields['hand'])
+            if state is not None:
+                self._act(state, 'D')
+        elif kind == 'split':
+            fields = event.fields
+            state = self.hands.get(fields['hand'])
+            if state is not None:
+                self._act(state, 'P')
+                state[4] = True
+                self.hands[fields['new_hand']] = list(state)
+        elif kind == 'dealt':
+            self._deal(event.fields['players'], event.fields['dealer_hand'])
+
+    def _act(self, state, action):
+        if state[3] < MAX_ACTIONS:
+            state[2] += ACTION_CODES[action] * ACTION_BASE**state[3]
+            state[3] += 1
+
+    def _deal(self, players, dealer_hand):
+        # [total, soft, actions, action count, awaiting split card]
+        self.hands = {
+            player.hand:
+            [player.hand.calculate_total(), player.hand.is_soft, 0, 0, False]
+            for player in players
+        }
+        counter = self.counter
+        if counter is None:
+            return
+        system = counter.system_index[self.system]
+        running_count = counter.running_counts[system]
+        cards_left = counter.cards_left
+        rank_tags = counter.rank_tags
+        for hand in list(self.hands) + [dealer_hand]:
+            for card in hand.cards:
+                running_count -= rank_tags[RANK_INDEX[card.rank]][system]
+                cards_left += 1
+        self.true_count = max(
+            -128, min(127, math.floor(running_count * DECK_SIZE /
+                                      cards_left))) if cards_left else 0
+
+    def _settle(self, hand, dealer_hand, amount):
+        state = self.hands.pop(hand, None)
+        if state is None:
+            # Dealt before the writer subscribed
+            return
+        status_code = hand.status_code
+        if status_code == STAY:
+            self._act(state, 'S')
+        elif status_code == SURRENDER:
+            self._act(state, 'R')
+        total, soft, actions = state[:3]
+        dealer_total = dealer_hand.calculate_total()
+        bet = round(hand.bet_amt * 100)
+        net = round(amount * 100)
+        row = (total, int(soft), card_value(dealer_hand.cards[0]),
+               self.true_count, actions % ACTION_BASE, actions, dealer_total,
+               bet, net)
+        self.buffer.append(row)
+        bust = dealer_total > 21
+        for key_of, groups in self.keys:
+            key = key_of(row)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0, 0, 0, 0]
+            group[0] += 1
+            group[1] += bet
+            group[2] += net
+            group[3] += net * net
+            group[4] += bust
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the column files, save the indexes."""
+        if not self.buffer:
+            return
+        for (name, typecode), values in zip(COLUMNS, zip(*self.buffer)):
+            column = array(typecode, values)
+            if sys.byteorder == 'big':
+                column.byteswap()
+            with open(column_path(self.directory, name), 'ab') as file:
+                column.tofile(file)
+        self.rows += len(self.buffer)
+        self.buffer = []
+        self.save()
+
+    def save(self):
+        save_indexes(os.path.join(self.directory, INDEX_FILE), self.rows,
+                     self.indexes)
+
+    def close(self):
+        """Write the remaining rows and the indexes."""
+        if self.closed:
+            return
+        if self.buffer:
+            self.flush()
+        else:
+            self.save()
+        self.closed = True
+
+
+def truncate_columns(directory, rows):
+    """Cut the column files down to rows, dropping the rows of a crash."""
+    for name, typecode in COLUMNS:
+        path = column_path(directory, name)
+        size = rows * array(typecode).itemsize
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+
+def save_indexes(path, rows, indexes):
+    """Write rows and indexes to path, atomically."""
+    data = {
+        'rows': rows,
+        'indexes': {
+            name: {
+                'columns': columns,
+                'groups': [list(key) + group for key, group in groups.items()]
+            }
+            for name, (columns, groups) in indexes.items()
+        }
+    }
+    partial_path = f'{path}.partial'
+    with open(partial_path, 'w') as index_file:
+        json.dump(data, index_file)
+    os.replace(partial_path, path)
+
+
+def load_indexes(path):
+    """Rows and indexes saved by save_indexes."""
+    with open(path) as index_file:
+        data = json.load(index_file)
+    indexes = {}
+    for name, index in data['indexes'].items():
+        columns = tuple(index['columns'])
+        width = len(columns)
+        indexes[name] = (columns, {
+            tuple(group[:width]): group[width:]
+            for group in index['groups']
+        })
+    return data['rows'], indexes
+
+
+class ResultStore(object):
+    """Memory-mapped result store.
+
+    Supports len(), column() gives a column as a memoryview without reading
+    it, scan() iterates columns a chunk at a time. Also a context manager.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.rows, self.indexes = load_indexes(
+            os.path.join(directory, INDEX_FILE))
+        self.maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """Values of the named column, release them before close()."""
+        typecode = TYPECODES[name]
+        if not self.rows:
+            return memoryview(array(typecode))
+        if name not in self.maps:
+            with open(column_path(self.directory, name), 'rb') as file:
+                self.maps[name] = mmap.mmap(file.fileno(),
+                                            0,
+                                            access=mmap.ACCESS_READ)
+        view = memoryview(self.maps[name]).cast(typecode)
+        return view[:self.rows]
+
+    def scan(self, names, chunk_rows=1 << 20):
+        """Chunks of the named columns, a tuple of memoryviews per chunk."""
+        columns = [self.column(name) for name in names]
+        for start in range(0, self.rows, chunk_rows):
+            yield tuple(column[start:start + chunk_rows]
+                        for column in columns)
+
+    def group_by(self, names=(), where=None):
+        """Aggregate of each group of rows, by their values of names.
+
+        where maps column names to the value, or a container of the values,
+        rows must have. Returns a dict of Aggregates keyed by tuples of the
+        values of names.
+        """
+        names = tuple(names)
+        where = dict(where or {})
+        needed = set(names) | set(where)
+        covering = [(columns, groups)
+                    for columns, groups in self.indexes.values()
+                    if needed <= set(columns)]
+        if covering:
+            columns, groups = min(covering, key=lambda index: len(index[1]))
+            rows = groups.items()
+        else:
+            columns = tuple(needed)
+            rows = self._scan_groups(columns)
+        positions = {name: columns.index(name) for name in needed}
+        tests = [(positions[name], value) for name, value in where.items()]
+        key_positions = [positions[name] for name in names]
+        results = {}
+        for key, group in rows:
+            if not all(
+                    key[position] in value if hasattr(value, '__contains__')
+                    else key[position] == value
+                    for position, value in tests):
+                continue
+            group_key = tuple(key[position] for position in key_positions)
+            aggregate = Aggregate.from_hundredths(*group)
+            if group_key in results:
+                results[group_key].add(aggregate)
+            else:
+                results[group_key] = aggregate
+        return results
+
+    def _scan_groups(self, columns):
+        """Group totals of the rows by columns, read from the column files."""
+        groups = {}
+        for chunk in self.scan(columns + ('bet', 'net', 'dealer_total')):
+            values = chunk[:len(columns)]
+            for key, bet, net, dealer_total in zip(zip(*values),
+                                                   *chunk[len(columns):]):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = [0, 0, 0, 0, 0]
+                group[0] += 1
+                group[1] += bet
+                group[2] += net
+                group[3] += net * net
+                group[4] += dealer_total > 21
+        return groups.items()
+
+    def close(self):
+        """Unmap the columns."""
+        for column_map in self.maps.values():
+            column_map.close()
+        self.maps = {}
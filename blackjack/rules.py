@@ -0,0 +1,190 @@
+"""House rules compiled into lookup tables.
+
+Hands keep their status as an integer code, STATUSES holds the names used
+by Hand.status and set_status. A Rules object is compiled once per table:
+the dealer's play becomes a table of hit or stand by softness and total,
+settlement a table of payouts by the outcome of the player's and the
+dealer's hands.
+"""
+# Hand status codes, index into STATUSES
+NO_STATUS = 0
+HIT = 1
+STAY = 2
+SPLIT = 3
+BUST = 4
+DOUBLE = 5
+ACE = 6
+BLACKJACK = 7
+DEALER_BLACKJACK = 8
+SURRENDER = 9
+
+STATUSES = (None, 'hit', 'stay', 'split', 'bust', 'double', 'ace',
+            'blackjack', 'dealer_blackjack', 'surrender')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Statuses of hands the player has finished playing
+FINISHED = frozenset((STAY, BUST, DOUBLE, DEALER_BLACKJACK, SURRENDER))
+
+# Player actions and their console names
+ACTION_NAMES = {
+    'H': 'Hit',
+    'S': 'Stay',
+    'D': 'Double',
+    'P': 'Split',
+    'R': 'Surrender'
+}
+
+# Hand outcomes indexing the settlement table, totals are their own outcome
+SURRENDERED = 0
+BUSTED = 1
+NATURAL = 22
+OUTCOMES = 23
+
+# Highest total a hand can reach, 20 plus a drawn Ace counted as 11
+MAX_TOTAL = 31
+
+
+def outcome(hand):
+    """Outcome of hand: SURRENDERED, BUSTED, NATURAL or else its total."""
+    status_code = hand.status_code
+    if status_code == SURRENDER:
+        return SURRENDERED
+    total = hand.calculate_total()
+    if total > 21:
+        return BUSTED
+    if status_code == BLACKJACK:
+        return NATURAL
+    return total
+
+
+# Constructor arguments of Rules, in order
+ARGUMENTS = ('dealer_hits_soft_17', 'blackjack_payout', 'deck_count',
+             'penetration', 'surrender', 'ties_push', 'double_down',
+             'double_after_split', 'max_hands', 'resplit_aces',
+             'continuous_shuffle')
+
+
+class Rules(object):
+    """House rules of a table.
+
+    dealer_hits_soft_17 switches from S17 to H17, blackjack_payout is paid
+    per unit bet on a player blackjack. The shoe holds deck_count decks and
+    is reshuffled between rounds once penetration of it has been dealt, or
+    with continuous_shuffle never, discards going straight back into a
+    continuous shuffling machine.
+    With surrender players may give up half their bet instead of acting on
+    their first two cards. ties_push makes equal totals a push rather than
+    a loss, a blackjack against a dealer blackjack always pushes.
+
+    With double_down players may double their bet on two cards for exactly
+    one more card, after a split too with double_after_split. Pairs of the
+    same rank split into up to max_hands hands (1 disables splitting), split
+    Aces take one card each and are only split again with resplit_aces.
+
+    The defaults are the game's original rules with doubling and splitting.
+    """
+
+    def __init__(self,
+                 dealer_hits_soft_17=False,
+                 blackjack_payout=1,
+                 deck_count=6,
+                 penetration=1.0,
+                 surrender=False,
+                 ties_push=False,
+                 double_down=True,
+                 double_after_split=True,
+                 max_hands=4,
+                 resplit_aces=False,
+                 continuous_shuffle=False):
+        if not 0 < penetration <= 1:
+            raise ValueError('penetration must be above 0 and at most 1')
+        self.dealer_hits_soft_17 = dealer_hits_soft_17
+        self.blackjack_payout = blackjack_payout
+        self.deck_count = deck_count
+        self.penetration = penetration
+        self.surrender = surrender
+        self.ties_push = ties_push
+        self.double_down = double_down
+        self.double_after_split = double_after_split
+        self.max_hands = max_hands
+        self.resplit_aces = resplit_aces
+        self.continuous_shuffle = continuous_shuffle
+
+        # Undealt cards left when the cut card comes out, -1 for never
+        self.reshuffle_at = -1 if continuous_shuffle else (
+            deck_count * 52 - int(deck_count * 52 * penetration))
+        # dealer_hits[soft][total]
+        self.dealer_hits = [[
+            total < 17 or (soft and total == 17 and dealer_hits_soft_17)
+            for total in range(MAX_TOTAL + 1)
+        ] for soft in (False, True)]
+        # settlement[player_outcome * OUTCOMES + dealer_outcome]
+        self.settlement = [
+            self._payout(player, dealer) for player in range(OUTCOMES)
+            for dealer in range(OUTCOMES)
+        ]
+
+    def __repr__(self):
+        return ('Rules(' + ', '.join(
+            f'{name}={value!r}'
+            for name, value in self.arguments().items()) + ')')
+
+    def arguments(self):
+        """The constructor arguments these rules were built with."""
+        return {name: getattr(self, name) for name in ARGUMENTS}
+
+    def _payout(self, player, dealer):
+        """Payout per unit bet of a player outcome against a dealer outcome."""
+        if player == SURRENDERED:
+            return -.5
+        if player == BUSTED:
+            return -1
+        if player == NATURAL:
+            return 0 if dealer == NATURAL else self.blackjack_payout
+        if dealer == NATURAL:
+            return -1
+        if dealer == BUSTED or player > dealer:
+            return 1
+        if player == dealer and self.ties_push:
+            return 0
+        return -1
+
+    def actions(self, hands, hand, chips):
+        """Actions, as a string of letters, allowed on hand of hands.
+
+        chips is what the player holds, doubling or splitting needs enough
+        chips to also cover the extra bet. A split Ace only ever stays, or
+        splits again, so 'S' alone means the hand is done.
+        """
+        cards = hand.cards
+        if len(cards) != 2:
+            return 'HS'
+        split = len(hands) > 1
+        split_aces = split and cards[0].rank == 'Ace'
+        affordable = hands.total_bet() + hand.bet_amt <= chips
+        can_split = (affordable and cards[0].rank == cards[1].rank
+                     and len(hands) < self.max_hands
+                     and (self.resplit_aces or not split_aces))
+        if split_aces:
+            # Split Aces get one card each
+            return 'SP' if can_split else 'S'
+        actions = 'HS'
+        if affordable and self.double_down and (self.double_after_split
+                                                or not split):
+            actions += 'D'
+        if can_split:
+            actions += 'P'
+        if self.surrender and not split:
+            actions += 'R'
+        return actions
+
+    def dealer_hits_hand(self, hand):
+        """Whether the dealer draws to hand."""
+        return self.dealer_hits[hand.is_soft][hand.calculate_total()]
+
+    def settle(self, hand, dealer_hand):
+        """Payout per unit bet of hand against dealer_hand."""
+        return self.settlement[outcome(hand) * OUTCOMES + outcome(dealer_hand)]
+
+
+DEFAULT_RULES = Rules()
@@ -0,0 +1,431 @@
+"""Asyncio game server hosting many tables in one event loop.
+
+Clients talk newline delimited JSON over TCP or a unix socket. A client
+joins with {"type": "join", "name": ..., "chips": ...} and is seated at the
+first table with a free seat. The table then sends requests and waits for
+the matching reply:
+
+    {"type": "bet", ...}       -> {"type": "bet", "amount": 10}
+    {"type": "decision", ...}  -> {"type": "decision", "action": "H"}
+
+Everything else the server sends ("joined", "warning", "result", "busted")
+needs no reply. Bets that time out sit the round out, decisions that time
+out stay, other invalid replies get a warning and are asked again. The
+dealing and shuffling pauses are asyncio sleeps, so waiting tables don't
+block each other.
+"""
+import asyncio
+import itertools
+import json
+import logging
+
+from blackjack import Player
+from blackjack.clock import PAUSES
+from blackjack.rules import DEALER_BLACKJACK, FINISHED, STAY, SURRENDER
+from blackjack.simulation import HeadlessTable
+
+# Pauses in seconds, the same as the clock pauses of Table and Shoe
+DELAYS = {name: PAUSES[name] for name in ('round', 'deal', 'shuffle')}
+
+
+class Seat(object):
+    """Connection of one player to a table."""
+
+    def __init__(self, player, reader, writer, timeout=30):
+        self.player = player
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.connected = True
+        self.closed = asyncio.get_running_loop().create_future()
+
+    async def send(self, message):
+        """Send message to the client."""
+        if not self.connected:
+            return
+        try:
+            self.writer.write(json.dumps(message).encode() + b'\n')
+            await self.writer.drain()
+        except ConnectionError:
+            self.connected = False
+
+    async def ask(self, message):
+        """Send message and wait for the reply, None if there isn't one."""
+        await self.send(message)
+        if not self.connected:
+            return None
+        try:
+            line = await asyncio.wait_for(self.reader.readline(),
+                                          self.timeout)
+        except asyncio.TimeoutError:
+            return None
+        except ConnectionError:
+            line = b''
+        if not line:
+            self.connected = False
+            return None
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            return {}
+        if not isinstance(reply, dict):
+            return {}
+        return reply if reply.get('type') == message['type'] else {}
+
+    def close(self):
+        """Release the client's connection handler."""
+        self.connected = False
+        if not self.closed.done():
+            self.closed.set_result(self.player.chips)
+
+
+class AsyncTable(HeadlessTable):
+    """HeadlessTable whose bets and decisions come from seated clients.
+
+    run, take_bets and play_hand are coroutines.
+    """
+
+    def __init__(self,
+                 min_bet=5,
+                 max_bet=100,
+                 deck_count=6,
+                 delays=None,
+                 rules=None):
+        super().__init__(min_bet=min_bet,
+                         max_bet=max_bet,
+                         deck_count=deck_count,
+                         rules=rules)
+        self.game_mode = 'server'
+        self.delays = dict(DELAYS, **(delays or {}))
+        self.seats = {}
+
+    def add_seat(self, seat):
+        """Seat a client, they play from the next round."""
+        self.seats[seat.player.id] = seat
+        self.add_player(seat.player)
+
+    def remove_seat(self, player_id):
+        """Unseat a client and release its connection."""
+        seat = self.seats.pop(player_id)
+        self.remove_player(player_id)
+        seat.close()
+
+    async def run(self):
+        """Play rounds until every client has left."""
+        self.game_on = True
+        self.shoe.shuffle()
+        await asyncio.sleep(self.delays['shuffle'])
+        while self.seats:
+            self.clear_table()
+            for player_id, seat in list(self.seats.items()):
+                if not seat.connected:
+                    self.remove_seat(player_id)
+                elif seat.player.chips < self.min_bet:
+                    await seat.send({'type': 'busted'})
+                    self.remove_seat(player_id)
+            if not self.seats:
+                break
+            await asyncio.sleep(self.delays['round'])
+
+            await self.take_bets()
+            if not self.active_players:
+                continue
+            # Reshuffle between rounds rather than in the middle of one
+            if len(self.shoe) < 10 * (len(self.active_players) + 1):
+                self.shoe.reshuffle()
+                await asyncio.sleep(self.delays['shuffle'])
+            self.deal_cards()
+            await asyncio.sleep(self.delays['deal'] *
+                                len(self.active_players))
+            await self.play_hand()
+            self.pay_out_and_collect()
+            await self.send_results()
+        self.game_on = False
+
+    async def take_bets(self):
+        """Ask every seat for its bet at once."""
+        players = [
+            seat.player for seat in self.seats.values() if seat.connected
+        ]
+        bets = await asyncio.gather(
+            *[self.ask_bet(player) for player in players])
+        self.active_players = []
+        for player, bet_amt in zip(players, bets):
+            if bet_amt:
+                player.hand.set_bet_amt(bet_amt)
+                self.active_players.append(player)
+
+    async def ask_bet(self, player):
+        """Ask a seat for a valid bet, None sits the round out."""
+        seat = self.seats.get(player.id)
+        if seat is None:
+            return None
+        while True:
+            reply = await seat.ask({
+                'type': 'bet',
+                'min_bet': self.min_bet,
+                'max_bet': self.max_bet,
+                'chips': player.chips
+            })
+            if reply is None:
+                return None
+            amount = reply.get('amount')
+            if amount == 0:
+                return None
+            if (isinstance(amount, int)
+                    and self.min_bet <= amount <= self.max_bet
+                    and amount <= player.chips):
+                return amount
+            await seat.send({
+                'type': 'warning',
+                'message': f'Amount must be between ${self.min_bet} and '
+                           f'${min(self.max_bet, player.chips)}'
+            })
+
+    async def play_hand(self):
+        """Ask each seat for decisions in turn, then play the dealer."""
+        get_top_card = self.shoe.get_top_card
+        dealer_hand = self.dealer.hand
+        dealer_upcard = dealer_hand.cards[0]
+        dealer_blackjack = dealer_hand.check_for_blackjack()
+
+        for player in self.active_players:
+            hands = player.hands
+            hand = hands[0]
+            if dealer_blackjack:
+                hand.status_code = DEALER_BLACKJACK
+            if hand.check_for_blackjack() or dealer_blackjack:
+                continue
+            # Splitting appends hands, which are played in turn
+            index = 0
+            while index < len(hands):
+                await self.play_player_hand(player, index, dealer_upcard)
+                index += 1
+
+        # Process dealers turn
+        dealer_hits = self.rules.dealer_hits
+        while dealer_hits[dealer_hand.is_soft][dealer_hand.calculate_total()]:
+            dealer_hand.hit(get_top_card())
+            dealer_hand.check_for_bust()
+
+    async def play_player_hand(self, player, index, dealer_upcard):
+        """Ask the player's seat for decisions on the hand at index."""
+        get_top_card = self.shoe.get_top_card
+        hands = player.hands
+        hand = hands[index]
+        seat = self.seats.get(player.id)
+        if len(hand.cards) == 1:
+            self.deal_split_card(player, hand)
+        if seat is None:
+            hand.status_code = STAY
+            return
+
+        while hand.status_code not in FINISHED:
+            actions = self.rules.actions(hands, hand, player.chips)
+            reply = await seat.ask({
+                'type': 'decision',
+                'hand': hand.generate_hand_summary(),
+                'hand_index': index,
+                'total': hand.calculate_total(),
+                'dealer_upcard': str(dealer_upcard),
+                'options': list(actions)
+            })
+            if reply is None:
+                reply = {'action': 'S'}
+            decision = str(reply.get('action')).upper()
+            if len(decision) != 1 or decision not in actions:
+                await seat.send({
+                    'type': 'warning',
+                    'message': f'Action must be one of {", ".join(actions)}'
+                })
+                continue
+            if decision == 'H':
+                hand.hit(get_top_card())
+                if not hand.check_for_bust() and hand.calculate_total() == 21:
+                    hand.status_code = STAY
+            elif decision == 'S':
+                hand.status_code = STAY
+            elif decision == 'D':
+                hand.double(get_top_card())
+                hand.check_for_bust()
+            elif decision == 'P':
+                hands.split(index)
+                self.deal_split_card(player, hand)
+            elif decision == 'R':
+                hand.status_code = SURRENDER
+
+    async def send_results(self):
+        """Tell every player in the round how it ended."""
+        dealer_summary = self.dealer.hand.generate_hand_summary(False)
+        seats = self.seats
+        await asyncio.gather(*[
+            seats[player.id].send({
+                'type': 'result',
+                'hand': player.hand.generate_hand_summary(False),
+                'status': player.hand.status,
+                'hands': [{
+                    'hand': hand.generate_hand_summary(False),
+                    'status': hand.status
+                } for hand in player.hands],
+                'dealer': dealer_summary,
+                'chips': player.chips
+            }) for player in self.active_players if player.id in seats
+        ])
+
+
+class GameServer(object):
+    """Hosts AsyncTables for clients connecting over TCP or a unix socket.
+
+    New tables open when every table is full and close once empty.
+    """
+
+    def __init__(self,
+                 seats_per_table=5,
+                 table_config=None,
+                 delays=None,
+                 timeout=30,
+                 backlog=1024):
+        self.seats_per_table = seats_per_table
+        self.backlog = backlog
+        self.table_config = dict(table_config or {})
+        self.delays = delays
+        self.timeout = timeout
+        self.tables = []
+        # Tasks playing the tables
+        self.tasks = set()
+        self.player_ids = itertools.count(1)
+
+    async def start_tcp(self, host='127.0.0.1', port=8765):
+        """Start listening on a TCP port."""
+        return await asyncio.start_server(self.handle_connection,
+                                          host,
+                                          port,
+                                          backlog=self.backlog)
+
+    async def start_unix(self, path):
+        """Start listening on a unix socket."""
+        return await asyncio.start_unix_server(self.handle_connection,
+                                               path,
+                                               backlog=self.backlog)
+
+    def close(self):
+        """Close every seat, tables stop after their current round.
+
+        Closed seats sit out the rest of the round and their tables unseat
+        them before the next one.
+        """
+        for table in self.tables:
+            for seat in table.seats.values():
+                seat.close()
+
+    async def wait_closed(self):
+        """Wait for every table to stop."""
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def find_table(self):
+        """First table with a free seat, opening a new one if needed."""
+        for table in self.tables:
+            if len(table.seats) < self.seats_per_table:
+                return table
+        table = AsyncTable(delays=self.delays, **self.table_config)
+        self.tables.append(table)
+        return table
+
+    async def play_table(self, table):
+        try:
+            await table.run()
+        except Exception:
+            logging.getLogger('blackjack').exception('Table %s failed',
+                                                     id(table))
+        finally:
+            self.tables.remove(table)
+            for player_id in list(table.seats):
+                table.remove_seat(player_id)
+
+    async def handle_connection(self, reader, writer):
+        """Seat a joining client and hold its connection while it plays."""
+        try:
+            join = json.loads(await reader.readline())
+            player = Player({
+                'id': next(self.player_ids),
+                'name': str(join['name']),
+                'chips': int(join.get('chips', 100))
+            })
+        except (ValueError, KeyError, TypeError):
+            writer.close()
+            return
+
+        seat = Seat(player, reader, writer, self.timeout)
+        table = self.find_table()
+        table.add_seat(seat)
+        await seat.send({
+            'type': 'joined',
+            'player_id': player.id,
+            'table': id(table),
+            'min_bet': table.min_bet,
+            'max_bet': table.max_bet
+        })
+        if not table.game_on:
+            table.game_on = True
+            task = asyncio.ensure_future(self.play_table(table))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        await seat.closed
+        writer.close()
+
+
+async def play_client(reader,
+                      writer,
+                      name,
+                      chips=100,
+                      bet=None,
+                      rounds=None,
+                      decide=None):
+    """Simple bot client, returns the chips it ends with.
+
+    Bets bet (the table minimum by default) for rounds rounds and decides
+    with decide(message), hitting below 17 by default.
+    """
+    writer.write(json.dumps({
+        'type': 'join',
+        'name': name,
+        'chips': chips
+    }).encode() + b'\n')
+    await writer.drain()
+    played = 0
+    while True:
+        try:
+            line = await reader.readline()
+        except ConnectionError:
+            break
+        if not line:
+            break
+        message = json.loads(line)
+        if message['type'] == 'bet':
+            if rounds is not None and played >= rounds:
+                writer.close()
+                break
+            reply = {'type': 'bet', 'amount': bet or message['min_bet']}
+        elif message['type'] == 'decision':
+            action = (decide(message) if decide else
+                      'H' if message['total'] < 17 else 'S')
+            reply = {'type': 'decision', 'action': action}
+        else:
+            if message['type'] == 'result':
+                played += 1
+                chips = message['chips']
+            continue
+        writer.write(json.dumps(reply).encode() + b'\n')
+        await writer.drain()
+    return chips
+
+
+if __name__ == "__main__":
+    """Serve tables on localhost."""
+
+    async def serve():
+        server = await GameServer().start_tcp()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
@@ -0,0 +1,69 @@
+"""Shoe orderings shuffled ahead of time.
+
+A ShufflePool shuffles orderings of a shoe in a background thread, so a Shoe
+or CompactShoe given the pool reorders its cards without shuffling when it
+is reset. Orderings come from one rng in the order they were made, so a
+seeded pool deals the same cards however far ahead the thread gets.
+"""
+import queue
+import random
+import threading
+
+
+class ShufflePool(object):
+    """Background thread keeping up to depth shuffled orderings ready.
+
+    An ordering is a random permutation of range(size), size being the
+    number of cards in a full shoe. rng is anything with a shuffle method,
+    a new random.Random by default. close() stops the thread, the pool is
+    also a context manager.
+    """
+
+    def __init__(self, size, rng=None, depth=4):
+        self.size = size
+        self.rng = random.Random() if rng is None else rng
+        self.orderings = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._fill, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _fill(self):
+        while not self.stopped.is_set():
+            ordering = list(range(self.size))
+            self.rng.shuffle(ordering)
+            while not self.stopped.is_set():
+                try:
+                    self.orderings.put(ordering, timeout=.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def next_ordering(self):
+        """Next shuffled ordering, waits for the thread if none is ready."""
+        return self.orderings.get()
+
+    def order(self, cards):
+        """List of cards in the next shuffled order.
+
+        Shoes with cards out on the table hold fewer than size cards, the
+        ordering then skips the positions they don't have, which leaves the
+        remaining cards uniformly shuffled.
+        """
+        count = len(cards)
+        if count > self.size:
+            raise ValueError(f'Pool shuffles {self.size} cards, not {count}')
+        ordering = self.next_ordering()
+        if count == self.size:
+            return [cards[index] for index in ordering]
+        return [cards[index] for index in ordering if index < count]
+
+    def close(self):
+        """Stop the shuffling thread."""
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,306 @@
+"""Headless simulation engine.
+
+Runs the same round sequence as Table.start_game (clear_table, take_bets,
+deal_cards, play_hand, pay_out_and_collect) without terminal I/O or sleeps.
+Bets and decisions come from pluggable policies.
+"""
+from blackjack import Table, CompactShoe, ContinuousShuffler
+from blackjack.clock import PAUSES
+from blackjack.rules import (BLACKJACK, DEALER_BLACKJACK, FINISHED, OUTCOMES,
+                             SPLIT, STAY, SURRENDER, Rules, outcome)
+from blackjack.events import NULL_EVENTS
+
+
+def flat_bet(player, table):
+    """Bet policy that always bets the table minimum."""
+    return table.min_bet
+
+
+def dealer_mimic(player, hand, dealer_upcard):
+    """Decision policy that plays like the dealer, hitting below 17.
+
+    Decision policies may also return 'D' to double down, 'P' to split a
+    pair and 'R' to surrender when the rules allow it, see Rules.actions.
+    """
+    return 'H' if hand.calculate_total() < 17 else 'S'
+
+
+class SimulationStats(object):
+    """Aggregated results of simulated rounds, mergeable across runs."""
+
+    def __init__(self):
+        self.rounds = 0
+        self.hands = 0
+        self.wins = 0
+        self.losses = 0
+        self.pushes = 0
+        self.blackjacks = 0
+        self.total_bet = 0
+        self.net = 0
+        self.net_squared = 0
+
+    def __repr__(self):
+        return (f'SimulationStats(rounds={self.rounds}, hands={self.hands}, '
+                f'net={self.net}, edge={self.edge:.4f})')
+
+    def record(self, hand, result):
+        """Record the settlement of one hand paying result per unit bet."""
+        won = result * hand.bet_amt
+        self.hands += 1
+        self.total_bet += hand.bet_amt
+        self.net += won
+        self.net_squared += won * won
+        if result > 0:
+            self.wins += 1
+        elif result < 0:
+            self.losses += 1
+        else:
+            self.pushes += 1
+        if hand.status_code == BLACKJACK:
+            self.blackjacks += 1
+
+    def merge(self, other):
+        """Add the counts of other into these stats."""
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+        return self
+
+    @property
+    def edge(self):
+        """Player net result per unit wagered."""
+        return self.net / self.total_bet if self.total_bet else 0.0
+
+
+class HeadlessTable(Table):
+    """Table that plays rounds unattended using bet and decision policies.
+
+    bet_policy(player, table) returns the bet amount, 0 to sit the round out.
+    decision_policy(player, hand, dealer_upcard) returns 'H' or 'S', or
+    another action allowed by Rules.actions.
+    rng, shuffle_pool and counting_systems are passed on to the CompactShoe,
+    rng and counting_systems to the ContinuousShuffler used instead when the
+    rules shuffle continuously. Bet policies can read the count from
+    table.shoe.counter. Only the 'dealt', 'hit', 'split', 'double' and
+    settlement events are emitted, on NULL_EVENTS unless events is given.
+    rules default to the original rules with deck_count decks, the rules'
+    deck count is used when they are given. With a clock,
+    usually a blackjack.clock.VirtualClock, the table and its shoe account
+    for the dealer's pauses and the players' think times, otherwise rounds
+    take no simulated time.
+    """
+
+    def __init__(self,
+                 min_bet=5,
+                 max_bet=100,
+                 deck_count=6,
+                 bet_policy=flat_bet,
+                 decision_policy=dealer_mimic,
+                 rng=None,
+                 counting_systems=None,
+                 events=None,
+                 shuffle_pool=None,
+                 clock=None,
+                 rules=None):
+        super().__init__(
+            min_bet=min_bet,
+            max_bet=max_bet,
+            events=NULL_EVENTS if events is None else events,
+            rules=Rules(deck_count=deck_count) if rules is None else rules)
+        self.game_mode = 'simulation'
+        self.clock = clock
+        if self.rules.continuous_shuffle:
+            self.shoe = ContinuousShuffler(self.rules.deck_count,
+                                           rng=rng,
+                                           counting_systems=counting_systems)
+        else:
+            self.shoe = CompactShoe(self.rules.deck_count,
+                                    rng=rng,
+                                    counting_systems=counting_systems,
+                                    shuffle_pool=shuffle_pool,
+                                    clock=clock)
+        self.bet_policy = bet_policy
+        self.decision_policy = decision_policy
+        self.active_players = []
+        self.stats = SimulationStats()
+
+    def run(self, rounds):
+        """Play up to rounds rounds, stops early once nobody can bet."""
+        self.game_on = True
+        self.shoe.shuffle()
+        for _ in range(rounds):
+            if not self.play_round():
+                break
+        self.game_on = False
+        return self.stats
+
+    def run_shift(self, seconds):
+        """Play rounds for seconds of clock time.
+
+        Stops early once nobody can bet, the table needs a clock.
+        """
+        if self.clock is None:
+            raise ValueError('run_shift needs a clock')
+        end = self.clock.now() + seconds
+        self.game_on = True
+        self.shoe.shuffle()
+        while self.clock.now() < end:
+            if not self.play_round():
+                break
+        self.game_on = False
+        return self.stats
+
+    def play_round(self):
+        """Play one round, returns False when nobody bet."""
+        self.clear_table()
+        self.take_bets()
+        if not self.active_players:
+            return False
+        self.deal_cards()
+        self.play_hand()
+        self.pay_out_and_collect()
+        return True
+
+    def clear_table(self):
+        discard = self.shoe.discard
+        for player in self.players:
+            hands = player.hands
+            for hand in hands.pool[:hands.count]:
+                discard(hand.cards)
+            hands.clear()
+        discard(self.dealer.hand.cards)
+        self.dealer.hands.clear()
+        if len(self.shoe) <= self.rules.reshuffle_at:
+            self.shoe.reshuffle()
+        if self.clock is not None:
+            self.clock.sleep(PAUSES['round'], 'round')
+
+    def take_bets(self):
+        """Take bets from the bet policy, players who can't bet sit out."""
+        self.active_players = []
+        for player in self.players:
+            if player.chips < self.min_bet:
+                continue
+            bet_amt = self.bet_policy(player, self)
+            if not bet_amt:
+                continue
+            if not (self.min_bet <= bet_amt <= self.max_bet
+                    and bet_amt <= player.chips):
+                raise ValueError(f'Invalid bet of {bet_amt} for {player}')
+            if self.clock is not None:
+                self.clock.think('bet')
+            player.hand.set_bet_amt(bet_amt)
+            self.active_players.append(player)
+
+    def deal_cards(self):
+        """Deal two cards to each active player and the dealer."""
+        get_top_card = self.shoe.get_top_card
+        dealer_hand = self.dealer.hand
+        if self.clock is not None:
+            self.clock.sleep(PAUSES['deal'] * len(self.active_players), 'deal')
+        hands = [player.hands.pool[0] for player in self.active_players]
+        for _ in range(2):
+            for hand in hands:
+                hand.add_card(get_top_card())
+            dealer_hand.add_card(get_top_card())
+        self.events.emit('dealt',
+                         players=self.active_players,
+                         dealer_hand=dealer_hand)
+
+    def play_hand(self):
+        """Play Hand."""
+        get_top_card = self.shoe.get_top_card
+        decision_policy = self.decision_policy
+        actions = self.rules.actions
+        emit = self.events.emit
+        clock = self.clock
+        dealer_hand = self.dealer.hand
+        dealer_upcard = dealer_hand.cards[0]
+        dealer_blackjack = dealer_hand.check_for_blackjack()
+
+        for player in self.active_players:
+            hands = player.hands
+            hand = hands.pool[0]
+            if dealer_blackjack:
+                hand.status_code = DEALER_BLACKJACK
+            if hand.check_for_blackjack() or dealer_blackjack:
+                continue
+
+            # Splitting adds hands, which are played in turn
+            index = 0
+            while True:
+                while hand.status_code not in FINISHED:
+                    if clock is not None:
+                        clock.think('decision')
+                    decision = decision_policy(player, hand, dealer_upcard)
+                    # Stays are always allowed, hits too but on split Aces
+                    if (decision != 'S' and
+                        (decision != 'H' or hand.status_code == SPLIT) and
+                        (len(decision) != 1 or decision not in actions(
+                            hands, hand, player.chips))):
+                        raise ValueError(f'Invalid decision {decision!r}')
+                    if decision == 'H':
+                        card = get_top_card()
+                        hand.hit(card)
+                        emit('hit', player=player, hand=hand, card=card)
+                        if hand.check_for_bust():
+                            break
+                        if hand.calculate_total() == 21:
+                            hand.status_code = STAY
+                            break
+                    elif decision == 'S':
+                        hand.status_code = STAY
+                    elif decision == 'D':
+                        card = get_top_card()
+                        hand.double(card)
+                        emit('double', player=player, hand=hand, card=card)
+                        hand.check_for_bust()
+                    elif decision == 'P':
+                        new_hand = hands.split(index)
+                        emit('split',
+                             player=player,
+                             hand=hand,
+                             new_hand=new_hand)
+                        self.deal_split_card(player, hand)
+                    elif decision == 'R':
+                        hand.status_code = SURRENDER
+                    else:
+                        raise ValueError(f'Invalid decision {decision!r}')
+                index += 1
+                if index == hands.count:
+                    break
+                hand = hands.pool[index]
+                self.deal_split_card(player, hand)
+
+        # Process dealers turn
+        dealer = self.dealer
+        dealer_hits = self.rules.dealer_hits
+        while dealer_hits[dealer_hand.is_soft][dealer_hand.calculate_total()]:
+            card = get_top_card()
+            dealer_hand.hit(card)
+            emit('hit', player=dealer, hand=dealer_hand, card=card)
+            dealer_hand.check_for_bust()
+
+    def pay_out_and_collect(self):
+        """Pay out and collect."""
+        dealer_hand = self.dealer.hand
+        stats = self.stats
+        emit = self.events.emit
+        settlement = self.rules.settlement
+        dealer_outcome = outcome(dealer_hand)
+        stats.rounds += 1
+        for player in self.active_players:
+            hands = player.hands
+            for hand in hands.pool[:hands.count]:
+                result = settlement[outcome(hand) * OUTCOMES + dealer_outcome]
+                amount = result * hand.bet_amt
+                player.chips += amount
+                stats.record(hand, result)
+                emit('win' if result > 0 else 'lose' if result < 0 else 'push',
+                     player=player,
+                     hand=hand,
+                     dealer_hand=dealer_hand,
+                     amount=abs(amount),
+                     chips=player.chips)
+        # Players who can still bet, for Table.start_game
+        min_bet = self.min_bet
+        self.funded = sum(player.chips >= min_bet for player in self.players)
@@ -0,0 +1,167 @@
+"""Compact snapshots of a table's state.
+
+snapshot(table) packs everything a round depends on into bytes: the shoe's
+cards, cursor and discard pile (the blocks of a ContinuousShuffler), the
+card counter, every player's chips and hands and the dealer's hands, plus a
+HeadlessTable's SimulationStats. Cards are stored as their codes, one byte
+each, so no Card or Hand object is copied. restore(table, data) writes a
+snapshot back into a table built with the same rules and shoe, reusing its
+Hand objects, and the table carries on from the phase it was in: between
+rounds, or mid-round by calling the remaining phases.
+
+Snapshots start with an 8 byte header holding MAGIC and VERSION followed
+by the state marshalled as a tuple, they are meant to be restored by the
+same Python version. Policies, events and clocks aren't part of the state,
+nor is the shoe's rng unless asked for: a restored table reshuffles with
+its own rng.
+"""
+from array import array
+import marshal
+import struct
+
+from blackjack import (CARDS, CompactShoe, ContinuousShuffler, Hand, Player,
+                       PlayerRegistry)
+
+MAGIC = b'BJTS'
+VERSION = 1
+HEADER = struct.Struct('<4sI')
+
+# Shoe kinds
+SHOE = 0
+COMPACT_SHOE = 1
+CONTINUOUS_SHUFFLER = 2
+
+
+def pack_hands(hands):
+    """Bets and codes of hands: status, card count and card codes per hand."""
+    codes = array('B')
+    bets = []
+    for hand in hands:
+        cards = hand.cards
+        codes.append(hand.status_code)
+        codes.append(len(cards))
+        codes.extend([card.code for card in cards])
+        bets.append(hand.bet_amt)
+    return codes.tobytes(), tuple(bets)
+
+
+def unpack_hands(hands, codes, bets):
+    """Put the hands packed by pack_hands into hands, reusing its Hands."""
+    hands.clear()
+    pool = hands.pool
+    while len(pool) < len(bets):
+        pool.append(Hand())
+    position = 0
+    for hand, bet_amt in zip(pool, bets):
+        count = codes[position + 1]
+        start = position + 2
+        position = start + count
+        hand.cards = [CARDS[code] for code in codes[start:position]]
+        hand.status_code = codes[start - 2]
+        hand.bet_amt = bet_amt
+    hands.count = len(bets)
+
+
+def pack_shoe(shoe):
+    if isinstance(shoe, CompactShoe):
+        return (COMPACT_SHOE, shoe.cards.tobytes(), shoe.cursor,
+                shoe.discard_pile.tobytes())
+    if isinstance(shoe, ContinuousShuffler):
+        blocks = shoe.blocks
+        cards = array('B')
+        for block in blocks:
+            cards.extend(block)
+        return (CONTINUOUS_SHUFFLER, cards.tobytes(),
+                array('H', [len(block) for block in blocks]).tobytes(), b'')
+    return (SHOE, bytes([card.code for card in shoe.cards]), 0,
+            bytes([card.code for card in shoe.discard_pile]))
+
+
+def unpack_shoe(shoe, state):
+    kind, cards, cursor, discard_pile = state
+    if isinstance(shoe, CompactShoe):
+        expected = COMPACT_SHOE
+    elif isinstance(shoe, ContinuousShuffler):
+        expected = CONTINUOUS_SHUFFLER
+    else:
+        expected = SHOE
+    if kind != expected:
+        raise ValueError('Snapshot of a different kind of shoe than '
+                         f'{type(shoe).__name__}')
+    if kind == COMPACT_SHOE:
+        shoe.cards = array('B', cards)
+        shoe.cursor = cursor
+        shoe.discard_pile = array('B', discard_pile)
+    elif kind == CONTINUOUS_SHUFFLER:
+        blocks = shoe.blocks = []
+        start = 0
+        for size in array('H', cursor):
+            blocks.append(array('B', cards[start:start + size]))
+            start += size
+        shoe.count = len(cards)
+    else:
+        shoe.cards = [CARDS[code] for code in cards]
+        shoe.discard_pile = [CARDS[code] for code in discard_pile]
+
+
+def snapshot(table, rng=False):
+    """Bytes holding the state of table, with the shoe's rng state if rng."""
+    shoe = table.shoe
+    counter = shoe.counter
+    stats = getattr(table, 'stats', None)
+    players = []
+    for player in table.players:
+        codes, bets = pack_hands(player.hands)
+        players.append((player.id, player.name, player.chips, codes, bets))
+    state = (pack_shoe(shoe),
+             None if counter is None else
+             (tuple(counter.remaining), tuple(counter.running_counts)),
+             tuple(players), pack_hands(table.dealer.hands),
+             None if stats is None else tuple(vars(stats).values()),
+             shoe.rng.getstate() if rng else None)
+    return HEADER.pack(MAGIC, VERSION) + marshal.dumps(state)
+
+
+def restore(table, data):
+    """Put the state snapshot() packed into data back into table.
+
+    Players are matched by id, the ones missing from the table are seated
+    and the ones missing from the snapshot unseated. Raises ValueError when
+    data isn't a snapshot of this version or of a different kind of shoe.
+    """
+    data = memoryview(data)
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a version {VERSION} table snapshot')
+    (shoe_state, counts, players, dealer_hands, stats,
+     rng_state) = marshal.loads(data[HEADER.size:])
+    shoe = table.shoe
+    unpack_shoe(shoe, shoe_state)
+    counter = shoe.counter
+    if counter is not None and counts is not None:
+        remaining, running_counts = counts
+        counter.remaining = list(remaining)
+        counter.cards_left = sum(remaining)
+        counter.running_counts = list(running_counts)
+    if rng_state is not None:
+        shoe.rng.setstate(rng_state)
+
+    seated = table.players
+    registry = PlayerRegistry()
+    for player_id, name, chips, codes, bets in players:
+        player = seated.get(player_id)
+        if player is None:
+            player = Player({'id': player_id, 'name': name, 'chips': chips})
+        player.chips = chips
+        unpack_hands(player.hands, codes, bets)
+        registry.add(player)
+    table.players = registry
+    unpack_hands(table.dealer.hands, *dealer_hands)
+    if stats is not None:
+        for name, value in zip(vars(table.stats), stats):
+            setattr(table.stats, name, value)
+    if hasattr(table, 'active_players'):
+        # Players betting this round, their first hand holds the bet
+        table.active_players = [
+            player for player in registry if player.hands.pool[0].bet_amt
+        ]
@@ -0,0 +1,142 @@
+"""Expected values and basic strategy tables for a shoe composition.
+
+Settles like settle_hand: ties lose and the player doesn't act when the
+dealer has blackjack, so decisions are valued against the dealer
+distribution given no dealer blackjack.
+
+Values are computed for a player total rather than the exact player cards:
+draws are weighted by the shoe composition less the dealer's upcard, which
+is the same composition used for the exact dealer probabilities.
+
+Tables are nested lists indexed [soft][player_total][dealer_upcard] where
+the upcard is 1 for an Ace and 2-10 otherwise, the layout used by
+blackjack.batch.
+"""
+from collections import OrderedDict
+
+from blackjack.probability import (DealerProbabilities, BLACKJACK, BUST,
+                                   card_value, composition_of_shoe,
+                                   remove_cards)
+
+STAND = 0
+HIT = 1
+ACTIONS = ('S', 'H')
+
+
+class Strategy(object):
+    """Compiled strategy and expected values for one composition."""
+
+    def __init__(self, composition, stand_ev, hit_ev):
+        self.composition = composition
+        self.stand_ev = stand_ev
+        self.hit_ev = hit_ev
+        self.table = [[[
+            HIT if hit > stand else STAND
+            for stand, hit in zip(stand_row, hit_row)
+        ] for stand_row, hit_row in zip(stand_rows, hit_rows)]
+                      for stand_rows, hit_rows in zip(stand_ev, hit_ev)]
+
+    def action(self, soft, total, upcard):
+        """Best action, 'H' or 'S', for a player total and dealer upcard."""
+        return ACTIONS[self.table[soft][total][upcard]]
+
+    def decision_policy(self, player, hand, dealer_upcard):
+        """HeadlessTable decision policy playing this strategy."""
+        return ACTIONS[self.table[hand.is_soft][hand.calculate_total()][
+            card_value(dealer_upcard)]]
+
+
+class StrategyAnalyzer(object):
+    """Builds Strategy objects, memoized by shoe composition.
+
+    Dealer probabilities come from a shared DealerProbabilities, so
+    recomputing for a partially depleted shoe only pays for the upcards
+    whose composition changed.
+    """
+
+    def __init__(self, dealer=None, cache_size=64):
+        self.dealer = dealer or DealerProbabilities()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def for_shoe(self, shoe):
+        """Strategy for the undealt cards of shoe."""
+        return self.analyze(composition_of_shoe(shoe))
+
+    def analyze(self, composition):
+        """Strategy for a shoe composition."""
+        composition = tuple(composition)
+        cache = self.cache
+        if composition in cache:
+            cache.move_to_end(composition)
+            return cache[composition]
+
+        stand_ev = [[[0.0] * 11 for _ in range(22)] for _ in range(2)]
+        hit_ev = [[[0.0] * 11 for _ in range(22)] for _ in range(2)]
+        for upcard in range(1, 11):
+            if not composition[upcard - 1]:
+                continue
+            drawn = remove_cards(composition, upcard)
+            stand, hit = self._upcard_values(upcard, drawn)
+            for soft in (0, 1):
+                for total in range(22):
+                    stand_ev[soft][total][upcard] = stand[total]
+                    hit_ev[soft][total][upcard] = hit[soft][total]
+
+        strategy = Strategy(composition, stand_ev, hit_ev)
+        cache[composition] = strategy
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return strategy
+
+    def _upcard_values(self, upcard, composition):
+        """Stand values by total and hit values by softness and total."""
+        distribution = self.dealer.distribution(upcard, composition)
+        no_blackjack = 1.0 - distribution[BLACKJACK]
+        if no_blackjack <= 0:
+            # The player never acts against a certain dealer blackjack
+            return [-1.0] * 22, [[-1.0] * 22, [-1.0] * 22]
+        bust = distribution[BUST] / no_blackjack
+        finals = [
+            probability / no_blackjack for probability in distribution[:5]
+        ]
+
+        # Ties lose, so standing wins when the dealer busts or ends lower
+        stand = []
+        for total in range(22):
+            win = bust + sum(finals[:max(0, min(total - 17, 5))])
+            stand.append(2 * win - 1)
+
+        remaining = sum(composition)
+        draws = [(index + 1, count / remaining)
+                 for index, count in enumerate(composition) if count]
+        memo = {}
+
+        def best(hard, has_ace):
+            """Value of the best play for a hand, and its hit value."""
+            key = (hard, has_ace)
+            if key in memo:
+                return memo[key]
+            total = hard + 10 if has_ace and hard <= 11 else hard
+            hit = 0.0
+            for value, probability in draws:
+                new_hard = hard + value
+                new_ace = has_ace or value == 1
+                new_total = (new_hard + 10
+                             if new_ace and new_hard <= 11 else new_hard)
+                if new_total > 21:
+                    hit -= probability
+                elif new_total == 21:
+                    # A hit to 21 stays automatically
+                    hit += probability * stand[21]
+                else:
+                    hit += probability * best(new_hard, new_ace)[0]
+            memo[key] = (max(stand[total], hit), hit)
+            return memo[key]
+
+        hit = [[-1.0] * 22, [-1.0] * 22]
+        for total in range(4, 21):
+            hit[0][total] = best(total, False)[1]
+        for total in range(12, 21):
+            hit[1][total] = best(total - 10, True)[1]
+        return stand, hit
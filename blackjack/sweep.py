@@ -0,0 +1,237 @@
+"""Parameter sweeps over table configurations with an on-disk result cache.
+
+A grid maps parameter names to the values to sweep, every combination is a
+cell. Cells play a HeadlessTable built from their HeadlessTable keyword
+arguments, seating players players with chips chips each for rounds
+rounds, on a worker pool.
+
+Finished cells are written to the cache directory as they come in, one
+JSON file per cell named after a hash of the cell's parameters, the seed
+and the engine version, so a rerun only plays the cells that are new or
+changed and a sweep that crashed resumes where it stopped. The engine
+version is a digest of the source of the modules that play rounds, see
+ENGINE_MODULES, any change to them starts a fresh cache.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import functools
+import hashlib
+import importlib
+import inspect
+import itertools
+import json
+import os
+
+from blackjack import Player
+from blackjack.parallel import chunk_rng
+from blackjack.rules import Rules
+from blackjack.simulation import HeadlessTable, SimulationStats
+
+# Modules whose source is part of the engine version
+ENGINE_MODULES = ('blackjack', 'blackjack.rules', 'blackjack.simulation',
+                  'blackjack.sweep')
+
+# Cell parameters that aren't HeadlessTable keyword arguments
+CELL_DEFAULTS = {'players': 1, 'chips': 100000, 'rounds': 10000}
+
+# A cell's parameters, cache key, stats and whether they came from the cache
+Cell = namedtuple('Cell', 'params key stats cached')
+
+_engine_version = None
+
+
+def engine_version():
+    """Digest of the source of ENGINE_MODULES."""
+    global _engine_version
+    if _engine_version is None:
+        digest = hashlib.sha256()
+        for name in ENGINE_MODULES:
+            with open(importlib.import_module(name).__file__, 'rb') as source:
+                digest.update(source.read())
+        _engine_version = digest.hexdigest()[:16]
+    return _engine_version
+
+
+def expand(grid, base=None):
+    """Parameters of every cell of grid, in grid order.
+
+    grid maps names to the sequence of values to sweep, base holds the
+    parameters shared by all cells.
+    """
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(base or {})
+        params.update(zip(names, values))
+        yield params
+
+
+def qualified_name(value):
+    return f'{value.__module__}.{value.__qualname__}'
+
+
+def canonical(value):
+    """JSON form of value, equal for equal configs.
+
+    Rules become their constructor arguments, functions and classes their
+    qualified name, bound methods their name and object, partials their
+    function and arguments, other objects their class and vars. Raises
+    TypeError for callables without such a form, like lambdas.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {
+            key if isinstance(key, str) else repr(key): canonical(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if isinstance(value, Rules):
+        return {'Rules': canonical(value.arguments())}
+    if isinstance(value, functools.partial):
+        return {
+            'functools.partial':
+            canonical([value.func, value.args, value.keywords])
+        }
+    if callable(value) and hasattr(value, '__qualname__'):
+        name = qualified_name(value)
+        if '<' in name:
+            raise TypeError(f'{name} has no canonical form, '
+                            'use a module level function')
+        bound_to = getattr(value, '__self__', None)
+        if bound_to is None or inspect.ismodule(bound_to):
+            return name
+        return {name: canonical(bound_to)}
+    if hasattr(value, 'tolist'):
+        # Arrays
+        return canonical(value.tolist())
+    if hasattr(value, '__dict__'):
+        return {qualified_name(type(value)): canonical(vars(value))}
+    if callable(value):
+        raise TypeError(f'{value!r} has no canonical form')
+    return repr(value)
+
+
+def cell_key(params, seed, version):
+    """Cache key of a cell, a digest of the canonical() JSON of the cell.
+
+    Functions are hashed by their qualified name, so a changed policy needs
+    a new name to be rerun.
+    """
+    data = json.dumps(canonical([params, seed, version]), sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def run_cell(task):
+    """Play a cell and return the vars of its SimulationStats."""
+    params, seed = task
+    table_config = dict(params)
+    cell = {
+        name: table_config.pop(name, default)
+        for name, default in CELL_DEFAULTS.items()
+    }
+    table = HeadlessTable(rng=chunk_rng(seed, 0), **table_config)
+    for player_id in range(cell['players']):
+        table.add_player(
+            Player({
+                'id': player_id,
+                'name': f'Player {player_id}',
+                'chips': cell['chips']
+            }))
+    return vars(table.run(cell['rounds']))
+
+
+class ResultCache(object):
+    """Directory of finished cells, one JSON file per cache key."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key):
+        """SimulationStats of the cell, None unless it is cached."""
+        try:
+            with open(self.path(key)) as cell_file:
+                data = json.load(cell_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        stats = SimulationStats()
+        vars(stats).update(data['stats'])
+        return stats
+
+    def put(self, key, stats):
+        """Store the vars of a cell's stats, atomically."""
+        path = self.path(key)
+        partial_path = f'{path}.partial'
+        with open(partial_path, 'w') as cell_file:
+            json.dump({'stats': stats}, cell_file)
+        os.replace(partial_path, path)
+
+
+class Sweep(object):
+    """Plays every cell of a grid, skipping the cells already cached.
+
+    grid and base are as for expand(), their parameters are HeadlessTable
+    keyword arguments plus players, chips and rounds (see CELL_DEFAULTS).
+    Policies must be picklable, module level functions. Every cell's shoe
+    is seeded from seed alone, so cells with the same shoe are dealt the
+    same cards. version defaults to engine_version().
+    """
+
+    def __init__(self,
+                 grid,
+                 cache_dir,
+                 base=None,
+                 seed=0,
+                 workers=None,
+                 version=None):
+        self.cells = list(expand(grid, base))
+        self.cache = ResultCache(cache_dir)
+        self.seed = seed
+        self.workers = workers or os.cpu_count() or 1
+        self.version = engine_version() if version is None else version
+
+    def __len__(self):
+        return len(self.cells)
+
+    def keys(self):
+        return [cell_key(params, self.seed, self.version)
+                for params in self.cells]
+
+    def run(self):
+        """Play the cells missing from the cache, returns every Cell."""
+        keys = self.keys()
+        results = {}
+        pending = {}
+        for params, key in zip(self.cells, keys):
+            stats = self.cache.get(key)
+            if stats is not None:
+                results[key] = Cell(params, key, stats, True)
+            elif key not in pending:
+                pending[key] = params
+        if self.workers == 1 or len(pending) < 2:
+            for key, params in pending.items():
+                self._finish(results, key, params,
+                             run_cell((params, self.seed)))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    executor.submit(run_cell, (params, self.seed)): key
+                    for key, params in pending.items()
+                }
+                for future in as_completed(futures):
+                    key = futures[future]
+                    self._finish(results, key, pending[key], future.result())
+        return [
+            results[key]._replace(params=params)
+            for params, key in zip(self.cells, keys)
+        ]
+
+    def _finish(self, results, key, params, stats):
+        self.cache.put(key, stats)
+        cell_stats = SimulationStats()
+        vars(cell_stats).update(stats)
+        results[key] = Cell(params, key, cell_stats, False)
@@ -1,7 +1,63 @@
 """Test module."""
+import asyncio
+import functools
+import io
+import json
+import math
+import os
+import random
+import tempfile
 import unittest
+from unittest import mock
 
-from blackjack import Table, Shoe, Player, Card, Hand, is_valid_bet_amt
+from blackjack import (Table, Shoe, CompactShoe, ContinuousShuffler, Player,
+                       PlayerRegistry, Card, Hand, Hands, DECK_SIZE, HI_LO,
+                       KO, RANKS, game_command, game_warning,
+                       is_valid_bet_amt, settle_hand)
+from blackjack import benchmark
+from blackjack.analytics import BankrollAnalytics, BankrollStats
+from blackjack.bots import BatchTable, batched, batched_bets
+from blackjack.clock import PAUSES, VirtualClock
+from blackjack.events import (ConsoleRenderer, EventBus, EventCounter,
+                              NULL_EVENTS)
+from blackjack.history import (HandHistory, HandHistoryWriter, DEALER_SEAT,
+                               DEAL, ROUND, SETTLE, SPLIT as SPLIT_RECORD,
+                               replay)
+from blackjack.lobby import Lobby
+from blackjack.metrics import Metrics
+from blackjack.optimizer import (BetSpread, Candidate, LookupPolicy,
+                                 StrategyOptimizer, paired_difference)
+from blackjack.parallel import ParallelRunner
+from blackjack.probability import (DealerProbabilities, BLACKJACK,
+                                   composition_of, composition_of_shoe,
+                                   remove_cards,
+                                   shoe_composition)
+from blackjack.results import ResultStore, ResultStoreWriter, decode_actions
+from blackjack.rules import (BLACKJACK as BLACKJACK_STATUS, DOUBLE, Rules,
+                             SPLIT, SURRENDER)
+from blackjack.server import GameServer, play_client
+from blackjack.shuffling import ShufflePool
+from blackjack.simulation import (HeadlessTable, SimulationStats,
+                                  dealer_mimic, flat_bet)
+from blackjack.snapshot import restore, snapshot
+from blackjack.sweep import Sweep, canonical, cell_key, run_cell
+from blackjack.strategy import HIT, STAND, StrategyAnalyzer
+
+try:
+    import numpy
+    from blackjack import batch
+except ImportError:
+    numpy = None
+
+
+def split_and_double(player, hand, dealer_upcard):
+    """Decision policy splitting Aces and 8s and doubling on 10 and 11."""
+    cards = hand.cards
+    if len(cards) == 2 and cards[0].rank == cards[1].rank in ('Ace', '8'):
+        return 'P'
+    if len(cards) == 2 and hand.calculate_total() in (10, 11):
+        return 'D'
+    return dealer_mimic(player, hand, dealer_upcard)
 
 
 class SetUpGame(unittest.TestCase):
@@ -88,6 +144,47 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(self.player.chips, 90)
 
 
+class TestPlayerRegistry(unittest.TestCase):
+    """Test case for the player registry."""
+
+    def setUp(self):
+        self.players = [
+            Player({'id': player_id, 'name': f'P{player_id}', 'chips': 100})
+            for player_id in range(4)
+        ]
+        self.registry = PlayerRegistry(self.players)
+
+    def test_lookup(self):
+        """Test players are found by id and iterate in seat order."""
+        self.assertEqual(list(self.registry), self.players)
+        self.assertIs(self.registry.get(2), self.players[2])
+        self.assertIsNone(self.registry.get(9))
+        self.assertIn(3, self.registry)
+        with self.assertRaises(ValueError):
+            self.registry.add(self.players[0])
+
+    def test_remove(self):
+        """Test removing a player keeps the others in seat order."""
+        self.assertIs(self.registry.remove(1), self.players[1])
+        self.assertEqual([player.id for player in self.registry], [0, 2, 3])
+        self.assertIs(self.registry[1], self.players[2])
+        self.assertNotIn(1, self.registry)
+        self.assertIs(self.registry.get(3), self.players[3])
+        with self.assertRaises(KeyError):
+            self.registry.remove(1)
+
+    def test_table(self):
+        """Test tables seat and remove players through the registry."""
+        table = HeadlessTable()
+        for player in self.players:
+            table.add_player(player)
+        self.assertIs(table.remove_player(0), self.players[0])
+        self.assertEqual(len(table.players), 3)
+        self.assertNotIn(0, table.players)
+        table.run(20)
+        self.assertEqual(table.stats.rounds, 20)
+
+
 class TestHand(unittest.TestCase):
     """Test case for hand."""
 
@@ -266,3 +363,1778 @@ class TestValidations(unittest.TestCase):
     def test_bet_above_max(self):
         """Test invalid bet above max."""
         self.assertFalse(is_valid_bet_amt(5, 10, 20, 100))
+
+
+class TestSettleHand(unittest.TestCase):
+    """Test case for settling a hand against the dealer."""
+
+    def make_hand(self, *ranks):
+        hand = Hand()
+        hand.cards = [Card(rank, 'Spades') for rank in ranks]
+        hand.check_for_bust()
+        hand.check_for_blackjack()
+        return hand
+
+    def test_player_bust_loses(self):
+        """Test player bust loses even when dealer busts."""
+        self.assertEqual(
+            settle_hand(self.make_hand('10', '6', '8'),
+                        self.make_hand('10', '6', '9')), -1)
+
+    def test_tie_loses(self):
+        """Test a tie goes to the dealer."""
+        self.assertEqual(
+            settle_hand(self.make_hand('10', '8'), self.make_hand('9', '9')),
+            -1)
+
+    def test_blackjack_push(self):
+        """Test blackjack against blackjack is a push."""
+        self.assertEqual(
+            settle_hand(self.make_hand('Ace', 'King'),
+                        self.make_hand('Ace', 'Queen')), 0)
+
+    def test_blackjack_beats_21(self):
+        """Test blackjack beats a three card 21."""
+        self.assertEqual(
+            settle_hand(self.make_hand('Ace', 'King'),
+                        self.make_hand('7', '7', '7')), 1)
+
+
+class TestHeadlessTable(unittest.TestCase):
+    """Test case for the headless simulation table."""
+
+    def setUp(self):
+        random.seed(1)
+        self.table = HeadlessTable(min_bet=10, max_bet=25, deck_count=2)
+        for player_id in (1, 2):
+            self.table.add_player(
+                Player({
+                    'id': player_id,
+                    'name': f'Player {player_id}',
+                    'chips': 100000
+                }))
+
+    @mock.patch('builtins.input', side_effect=AssertionError('input called'))
+    def test_run_without_input(self, mocked_input):
+        """Test rounds run without asking for input."""
+        stats = self.table.run(2000)
+        self.assertEqual(stats.rounds, 2000)
+        self.assertEqual(stats.hands, 4000)
+        self.assertEqual(stats.wins + stats.losses + stats.pushes, 4000)
+
+    def test_chips_match_stats(self):
+        """Test player chips move by the net result."""
+        stats = self.table.run(2000)
+        chips = sum(player.chips for player in self.table.players)
+        self.assertEqual(chips - 200000, stats.net)
+
+    def test_stops_when_broke(self):
+        """Test the run stops once no player can cover the minimum bet."""
+        for player in self.table.players:
+            player.chips = 10
+        stats = self.table.run(1000)
+        self.assertLess(stats.rounds, 1000)
+        for player in self.table.players:
+            self.assertLess(player.chips, 10)
+
+    def test_start_game_ends(self):
+        """Test start_game stops once no player can cover the minimum bet."""
+        for player in self.table.players:
+            player.chips = 30
+        self.table.start_game()
+        for player in self.table.players:
+            self.assertLess(player.chips, 10)
+
+    def test_invalid_bet(self):
+        """Test a bet policy outside the table limits raises."""
+        self.table.bet_policy = lambda player, table: 1000
+        with self.assertRaises(ValueError):
+            self.table.run(1)
+
+    def test_merge_stats(self):
+        """Test merging simulation stats."""
+        merged = SimulationStats().merge(self.table.run(10))
+        merged.merge(HeadlessTable().run(0))
+        self.assertEqual(merged.rounds, 10)
+
+
+class TestBatchTable(unittest.TestCase):
+    """Test case for the batch decision table."""
+
+    def table(self, seats, **kwargs):
+        table = BatchTable(min_bet=10,
+                           max_bet=25,
+                           rng=random.Random(5),
+                           **kwargs)
+        for player_id in range(seats):
+            table.add_player(
+                Player({
+                    'id': player_id,
+                    'name': f'Bot {player_id}',
+                    'chips': 100000
+                }))
+        return table
+
+    def test_one_call_per_pass(self):
+        """Test policies are asked once for every seat still deciding."""
+        batches = []
+        bets = []
+
+        def decide(requests):
+            batches.append(requests)
+            return ['H' if request.hand.calculate_total() < 17 else 'S'
+                    for request in requests]
+
+        def bet(players, table):
+            bets.append(len(players))
+            return [table.min_bet] * len(players)
+
+        table = self.table(7, bet_policy=bet, decision_policy=decide)
+        stats = table.run(200)
+        self.assertEqual(bets, [7] * 200)
+        self.assertLess(len(batches), stats.hands)
+        self.assertEqual(max(len(requests) for requests in batches), 7)
+        for requests in batches:
+            self.assertEqual(len({request.player.id
+                                  for request in requests}), len(requests))
+            for request in requests:
+                self.assertIn('H', request.actions)
+        chips = sum(player.chips for player in table.players)
+        self.assertEqual(chips - 700000, stats.net)
+
+    def test_matches_headless_table(self):
+        """Test a single seat plays exactly like a HeadlessTable."""
+        headless = HeadlessTable(min_bet=10,
+                                 max_bet=25,
+                                 rng=random.Random(5),
+                                 decision_policy=split_and_double)
+        headless.add_player(
+            Player({
+                'id': 0,
+                'name': 'Bot 0',
+                'chips': 100000
+            }))
+        table = self.table(1,
+                           bet_policy=batched_bets(flat_bet),
+                           decision_policy=batched(split_and_double))
+        self.assertEqual(vars(table.run(300)), vars(headless.run(300)))
+
+    def test_invalid_decisions(self):
+        """Test decisions outside the actions or missing ones raise."""
+        for decision in ('X', '', 'HS'):
+            table = self.table(
+                3, decision_policy=lambda requests: [decision] * len(requests))
+            with self.assertRaises(ValueError):
+                table.run(10)
+        table = self.table(3, decision_policy=lambda requests: ['S'])
+        with self.assertRaises(ValueError):
+            table.run(10)
+
+
+class TestCompactShoe(unittest.TestCase):
+    """Test case for CompactShoe."""
+
+    def setUp(self):
+        self.shoe = CompactShoe(2)
+
+    def test_card_codes(self):
+        """Test every card survives encoding round trip."""
+        for code in range(DECK_SIZE):
+            card = Card.from_code(code)
+            self.assertEqual(Card(card.rank, card.suit).code, code)
+
+    def test_get_top_card(self):
+        """Test get top card deals from the cursor."""
+        self.shoe.shuffle()
+        top_code = self.shoe.cards[0]
+        self.assertEqual(self.shoe.get_top_card().code, top_code)
+        self.assertEqual(len(self.shoe), 2 * DECK_SIZE - 1)
+
+    def test_no_more_cards(self):
+        """Test the shoe resets from the discard pile when empty."""
+        dealt = [self.shoe.get_top_card() for _ in range(2 * DECK_SIZE)]
+        self.shoe.discard(dealt)
+        self.assertEqual(len(self.shoe), 0)
+        self.assertTrue(isinstance(self.shoe.get_top_card(), Card))
+        self.assertEqual(len(self.shoe), 2 * DECK_SIZE - 1)
+        self.assertEqual(len(self.shoe.discard_pile), 0)
+
+    def test_shuffle_keeps_cards(self):
+        """Test shuffling keeps the composition of the shoe."""
+        self.shoe.deal()
+        self.shoe.shuffle()
+        self.assertEqual(len(self.shoe.cards), 2 * DECK_SIZE - 1)
+        self.assertEqual(self.shoe.cursor, 0)
+
+
+class TestContinuousShuffler(unittest.TestCase):
+    """Test case for the continuous shuffling machine."""
+
+    def setUp(self):
+        self.machine = ContinuousShuffler(2,
+                                          rng=random.Random(1),
+                                          counting_systems=(HI_LO, ),
+                                          block_size=8)
+
+    def contents(self):
+        return sorted(code for block in self.machine.blocks for code in block)
+
+    def test_discards_go_back(self):
+        """Test discards are reinserted and no card is lost or doubled."""
+        machine = self.machine
+        for _ in range(200):
+            cards = [machine.get_top_card() for _ in range(30)]
+            self.assertEqual(len(machine), 2 * DECK_SIZE - 30)
+            machine.discard(cards)
+        self.assertEqual(self.contents(), sorted(list(range(DECK_SIZE)) * 2))
+        self.assertTrue(
+            all(len(block) < machine.block_size for block in machine.blocks))
+        self.assertEqual(machine.counter.cards_left, 2 * DECK_SIZE)
+        self.assertEqual(machine.counter.running_count(), 0)
+
+    def test_insert_positions(self):
+        """Test a reinserted card can land anywhere in the machine."""
+        depths = set()
+        for _ in range(2000):
+            self.machine.insert(self.machine.deal())
+            for depth, code in enumerate(
+                    code for block in reversed(self.machine.blocks)
+                    for code in reversed(block)):
+                if code == 0:
+                    depths.add(depth)
+        self.assertGreater(len(depths), DECK_SIZE)
+
+    def test_empty(self):
+        """Test dealing from an empty machine raises."""
+        machine = ContinuousShuffler(1)
+        for _ in range(DECK_SIZE):
+            machine.deal()
+        with self.assertRaises(ValueError):
+            machine.deal()
+
+    def test_tables(self):
+        """Test tables deal from a machine with continuous shuffling."""
+        rules = Rules(continuous_shuffle=True)
+        self.assertEqual(rules.reshuffle_at, -1)
+        table = HeadlessTable(rules=rules)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 10**6}))
+        self.assertIsInstance(table.shoe, ContinuousShuffler)
+        self.assertEqual(table.run(500).rounds, 500)
+        table.clear_table()
+        self.assertEqual(len(table.shoe), 6 * DECK_SIZE)
+        self.assertIsInstance(
+            Table(events=NULL_EVENTS, rules=rules).shoe, ContinuousShuffler)
+
+
+class TestShufflePool(unittest.TestCase):
+    """Test case for seeded shoes and the pre-shuffled pool."""
+
+    def test_seeded_shoe(self):
+        """Test shoes with equally seeded generators deal the same cards."""
+        shoes = [
+            Shoe(events=NULL_EVENTS,
+                 rng=random.Random(7),
+                 clock=VirtualClock()) for _ in range(2)
+        ]
+        for shoe in shoes:
+            shoe.shuffle()
+        self.assertEqual(*[[str(card) for card in shoe.cards]
+                           for shoe in shoes])
+
+    def test_pool_order(self):
+        """Test pool orderings keep every card of partial shoes."""
+        with ShufflePool(DECK_SIZE, random.Random(1)) as pool:
+            cards = list(range(DECK_SIZE))
+            self.assertEqual(sorted(pool.order(cards)), cards)
+            self.assertNotEqual(pool.order(cards), cards)
+            self.assertEqual(sorted(pool.order(cards[:30])), cards[:30])
+            with self.assertRaises(ValueError):
+                pool.order(cards * 2)
+
+    def test_pool_shoe_reset(self):
+        """Test a pool reset doesn't pause and keeps the discarded cards."""
+        with ShufflePool(DECK_SIZE) as pool:
+            clock = VirtualClock()
+            shoe = Shoe(1, events=NULL_EVENTS, shuffle_pool=pool, clock=clock)
+            dealt = [shoe.get_top_card() for _ in range(DECK_SIZE)]
+            shoe.discard(dealt[2:])
+            shoe.get_top_card()
+            self.assertEqual(clock.elapsed, 0)
+            self.assertEqual(len(shoe.cards), DECK_SIZE - 3)
+
+    def test_pool_reproducible(self):
+        """Test seeded pools make headless runs reproducible."""
+        nets = []
+        for _ in range(2):
+            with ShufflePool(6 * DECK_SIZE, random.Random(3)) as pool:
+                table = HeadlessTable(shuffle_pool=pool)
+                table.add_player(
+                    Player({
+                        'id': 1,
+                        'name': 'Bot',
+                        'chips': 100000
+                    }))
+                nets.append(table.run(300).net)
+        self.assertEqual(nets[0], nets[1])
+
+
+class TestHandTotals(unittest.TestCase):
+    """Test case for the running hand totals."""
+
+    def test_soft_hand(self):
+        """Test an Ace counts as 11 while it doesn't bust the hand."""
+        hand = Hand()
+        hand.add_card(Card('Ace', 'Spades'))
+        hand.add_card(Card('6', 'Hearts'))
+        self.assertTrue(hand.is_soft)
+        self.assertEqual(hand.calculate_total(), 17)
+        hand.hit(Card('9', 'Clubs'))
+        self.assertFalse(hand.is_soft)
+        self.assertEqual(hand.calculate_total(), 16)
+
+    def test_cards_not_modified(self):
+        """Test totalling a hand leaves the Ace values alone."""
+        ace = Card('Ace', 'Spades')
+        hand = Hand()
+        hand.cards = [ace, ace, Card('King', 'Hearts')]
+        self.assertFalse(hand.check_for_bust())
+        self.assertEqual(hand.calculate_total(), 12)
+        self.assertEqual(ace.value, 11)
+
+    def test_shared_cards(self):
+        """Test the same shared Card can be dealt into many hands."""
+        hands = [Hand(), Hand()]
+        for hand in hands:
+            hand.cards = [Card.from_code(12), Card.from_code(25)]
+        for hand in hands:
+            self.assertTrue(hand.check_for_blackjack() is None)
+            self.assertEqual(hand.calculate_total(), 12)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestBatchSimulator(unittest.TestCase):
+    """Test case for the vectorized batch simulator."""
+
+    def test_compile_policy(self):
+        """Test compiling dealer_mimic gives the dealer mimic table."""
+        compiled = batch.compile_policy(dealer_mimic)
+        expected = batch.dealer_mimic_strategy()
+        numpy.testing.assert_array_equal(compiled[0, 4:21, 1:],
+                                         expected[0, 4:21, 1:])
+        numpy.testing.assert_array_equal(compiled[1, 12:21, 1:],
+                                         expected[1, 12:21, 1:])
+
+    def test_outcomes(self):
+        """Test outcome arrays are consistent with each other."""
+        result = batch.BatchSimulator(deck_count=2, seed=3).run(50000)
+        self.assertEqual(result.rounds, 50000)
+        self.assertTrue((result.dealer_total[~result.dealer_blackjack] >= 17
+                         ).all())
+        busts = result.player_total > 21
+        self.assertTrue((result.result[busts] == -1).all())
+        pushes = result.result == 0
+        self.assertTrue(result.player_blackjack[pushes].all())
+        self.assertTrue(result.dealer_blackjack[pushes].all())
+
+    def test_agrees_with_table(self):
+        """Test the batch edge agrees with the HeadlessTable edge."""
+        random.seed(5)
+        table = HeadlessTable(min_bet=1, max_bet=1, deck_count=6)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 10**9}))
+        stats = table.run(40000)
+        result = batch.BatchSimulator(deck_count=6, seed=5).run(200000)
+        self.assertAlmostEqual(stats.edge, result.edge, delta=0.025)
+
+
+class TestParallelRunner(unittest.TestCase):
+    """Test case for the multi-core simulation runner."""
+
+    def setUp(self):
+        self.player_configs = [{'id': 1, 'name': 'Bot', 'chips': 10**9}]
+
+    def make_runner(self, workers, seed=7):
+        return ParallelRunner({'deck_count': 2},
+                              self.player_configs,
+                              seed=seed,
+                              workers=workers,
+                              chunk_rounds=500)
+
+    def test_same_result_for_any_worker_count(self):
+        """Test results only depend on the seed."""
+        single = self.make_runner(1).run(2100)
+        pooled = self.make_runner(2).run(2100)
+        self.assertEqual(single.rounds, 2100)
+        self.assertEqual(vars(single), vars(pooled))
+
+    def test_seed_changes_result(self):
+        """Test different seeds play different cards."""
+        first = self.make_runner(1, seed=1).run(1000)
+        second = self.make_runner(1, seed=2).run(1000)
+        self.assertNotEqual(vars(first), vars(second))
+
+
+class TestSweep(unittest.TestCase):
+    """Test case for parameter sweeps."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+        self.grid = {'min_bet': [5, 10], 'deck_count': [1, 6]}
+        self.base = {'rounds': 200, 'players': 2, 'chips': 1000}
+
+    def sweep(self, grid=None, workers=1, **kwargs):
+        return Sweep(grid or self.grid,
+                     self.cache_dir,
+                     base=self.base,
+                     seed=3,
+                     workers=workers,
+                     **kwargs)
+
+    def test_cache(self):
+        """Test reruns read every cell from the cache."""
+        cells = self.sweep(workers=2).run()
+        self.assertEqual([cell.params['min_bet'] for cell in cells],
+                         [5, 5, 10, 10])
+        self.assertFalse(any(cell.cached for cell in cells))
+        self.assertEqual(cells[0].stats.rounds, 200)
+        with mock.patch('blackjack.sweep.run_cell') as mocked_run_cell:
+            cached = self.sweep().run()
+        mocked_run_cell.assert_not_called()
+        self.assertTrue(all(cell.cached for cell in cached))
+        self.assertEqual([vars(cell.stats) for cell in cached],
+                         [vars(cell.stats) for cell in cells])
+
+    def test_changed_cells(self):
+        """Test only new cells or cells of another version are played."""
+        self.sweep().run()
+        grid = dict(self.grid, min_bet=[5, 10, 15])
+        cells = self.sweep(grid).run()
+        self.assertEqual([cell.cached for cell in cells],
+                         [True, True, True, True, False, False])
+        cells = self.sweep(version='other').run()
+        self.assertFalse(any(cell.cached for cell in cells))
+
+    def test_resume(self):
+        """Test a sweep that crashed resumes with the unfinished cells."""
+        calls = []
+
+        def crash_on_third(task):
+            calls.append(task)
+            if len(calls) == 3:
+                raise RuntimeError('crash')
+            return run_cell(task)
+
+        with mock.patch('blackjack.sweep.run_cell',
+                        side_effect=crash_on_third):
+            with self.assertRaises(RuntimeError):
+                self.sweep().run()
+        cells = self.sweep().run()
+        self.assertEqual([cell.cached for cell in cells],
+                         [True, True, False, False])
+
+    def test_cell_key(self):
+        """Test keys depend on the parameters, not on their order."""
+        key = cell_key({'min_bet': 5, 'rules': Rules()}, 0, '1')
+        self.assertEqual(key,
+                         cell_key({'rules': Rules(), 'min_bet': 5}, 0, '1'))
+        self.assertNotEqual(
+            key, cell_key({'min_bet': 5, 'rules': Rules(surrender=True)}, 0,
+                          '1'))
+        self.assertNotEqual(key,
+                            cell_key({'min_bet': 5, 'rules': Rules()}, 1, '1'))
+
+    def test_canonical(self):
+        """Test cells canonicalize to JSON naming rules and policies."""
+        params = {
+            'rules': Rules(surrender=True),
+            'decision_policy': dealer_mimic,
+            'deck_count': (1, 2)
+        }
+        form = canonical(params)
+        self.assertEqual(json.loads(json.dumps(form)), form)
+        self.assertEqual(form['decision_policy'],
+                         'blackjack.simulation.dealer_mimic')
+        self.assertEqual(form['rules']['Rules'],
+                         Rules(surrender=True).arguments())
+        self.assertNotEqual(
+            cell_key(params, 0, '1'),
+            cell_key(dict(params, decision_policy=split_and_double), 0, '1'))
+
+    def test_canonical_policies(self):
+        """Test bound methods and partials keep their state in the key."""
+        analyzer = StrategyAnalyzer()
+        six_decks = analyzer.analyze(shoe_composition(6))
+        tens_gone = analyzer.analyze(
+            shoe_composition(6)[:9] + (shoe_composition(6)[9] - 60, ))
+
+        def key(policy):
+            return cell_key({'decision_policy': policy}, 0, '1')
+
+        again = StrategyAnalyzer().analyze(shoe_composition(6))
+        self.assertIsNot(again, six_decks)
+        self.assertEqual(key(six_decks.decision_policy),
+                         key(again.decision_policy))
+        self.assertNotEqual(key(six_decks.decision_policy),
+                            key(tens_gone.decision_policy))
+        self.assertNotEqual(key(functools.partial(flat_bet, 10)),
+                            key(functools.partial(flat_bet, 20)))
+        with self.assertRaises(TypeError):
+            key(lambda *args: 'S')
+
+
+class TestDealerProbabilities(unittest.TestCase):
+    """Test case for the dealer outcome probabilities."""
+
+    def setUp(self):
+        self.dealer = DealerProbabilities(cache_size=2)
+
+    def test_only_tens_left(self):
+        """Test outcomes when only ten-valued cards are left."""
+        tens = (0, ) * 9 + (5, )
+        self.assertEqual(self.dealer.distribution(10, tens)[3], 1.0)
+        self.assertEqual(self.dealer.bust_probability(6, tens), 1.0)
+        self.assertEqual(self.dealer.distribution(1, tens)[BLACKJACK], 1.0)
+
+    def test_distribution_sums_to_one(self):
+        """Test every upcard gives a full distribution."""
+        composition = shoe_composition(1)
+        for upcard in range(1, 11):
+            distribution = self.dealer.distribution(
+                upcard, remove_cards(composition, upcard))
+            self.assertAlmostEqual(sum(distribution), 1.0)
+
+    def test_cache_eviction(self):
+        """Test the memo keeps at most cache_size entries."""
+        composition = shoe_composition(1)
+        for upcard in (2, 3, 2, 4):
+            self.dealer.distribution(upcard, composition)
+        self.assertEqual(len(self.dealer.cache), 2)
+        self.assertEqual(self.dealer.hits, 1)
+        self.assertEqual(list(self.dealer.cache), [(2, composition),
+                                                   (4, composition)])
+
+    def test_composition_of(self):
+        """Test counting cards by value."""
+        cards = [Card('Ace', 'Spades'), Card('King', 'Clubs'),
+                 Card('10', 'Hearts')]
+        self.assertEqual(composition_of(cards), (1, ) + (0, ) * 8 + (2, ))
+
+
+class TestStrategyAnalyzer(unittest.TestCase):
+    """Test case for the strategy table generator."""
+
+    def setUp(self):
+        self.analyzer = StrategyAnalyzer()
+        self.strategy = self.analyzer.analyze(shoe_composition(6))
+
+    def test_basic_decisions(self):
+        """Test decisions that hold under any sensible strategy."""
+        for upcard in range(1, 11):
+            self.assertEqual(self.strategy.action(0, 11, upcard), 'H')
+            self.assertEqual(self.strategy.action(0, 20, upcard), 'S')
+            self.assertEqual(self.strategy.action(1, 15, upcard), 'H')
+        self.assertEqual(self.strategy.action(0, 16, 7), 'H')
+        self.assertEqual(self.strategy.action(0, 13, 6), 'S')
+
+    def test_stand_ev(self):
+        """Test standing on 21 wins unless the dealer gets 21 too."""
+        dealer = self.analyzer.dealer.distribution(
+            10, remove_cards(shoe_composition(6), 10))
+        expected = 1 - 2 * dealer[4] / (1 - dealer[BLACKJACK])
+        self.assertAlmostEqual(self.strategy.stand_ev[0][21][10], expected)
+
+    def test_memoized_by_composition(self):
+        """Test the same composition reuses the strategy."""
+        shoe = CompactShoe(6)
+        self.assertIs(self.analyzer.for_shoe(shoe), self.strategy)
+        for _ in range(30):
+            shoe.deal()
+        depleted = self.analyzer.for_shoe(shoe)
+        self.assertIsNot(depleted, self.strategy)
+        self.assertEqual(sum(depleted.composition), 6 * DECK_SIZE - 30)
+
+    def test_decision_policy(self):
+        """Test the strategy plays on a HeadlessTable."""
+        table = HeadlessTable(decision_policy=self.strategy.decision_policy)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 10**6}))
+        self.assertEqual(table.run(200).rounds, 200)
+
+
+
+class TestStrategyOptimizer(unittest.TestCase):
+    """Test case for racing strategies through common shoes."""
+
+    def setUp(self):
+        self.basic = LookupPolicy(StrategyAnalyzer().analyze(
+            shoe_composition(6)).table)
+
+    def test_common_shoes(self):
+        """Test candidates playing alike win the same on every shoe."""
+        optimizer = StrategyOptimizer(
+            [Candidate('basic', self.basic),
+             Candidate('copy', LookupPolicy(self.basic.table))],
+            seed=1)
+        first, second = optimizer.run(20)
+        self.assertEqual(optimizer.shoes, 20)
+        self.assertEqual(first.shoe_nets, second.shoe_nets)
+        self.assertEqual(paired_difference(first.shoe_nets,
+                                           second.shoe_nets), (0, 0))
+        self.assertGreater(first.stats.rounds, 20 * 30)
+
+    def test_prune(self):
+        """Test a clearly worse candidate is pruned early."""
+        optimizer = StrategyOptimizer([
+            Candidate('always hit', lambda player, hand, upcard: 'H'),
+            Candidate('basic', self.basic)
+        ], seed=1, batch_shoes=20, min_shoes=20)
+        best, worst = optimizer.run(500)
+        self.assertEqual(best.name, 'basic')
+        self.assertIsNone(best.pruned)
+        self.assertEqual(worst.pruned, 20)
+        self.assertEqual(optimizer.shoes, 20)
+
+    def test_variants(self):
+        """Test variants switch one decision of a copied table."""
+        (candidate, ) = self.basic.variants([(0, 16, 10)])
+        self.assertEqual(candidate.name, 'hard 16 v 10')
+        self.assertEqual(
+            {self.basic.table[0][16][10],
+             candidate.decision_policy.table[0][16][10]}, {HIT, STAND})
+        self.assertEqual(self.basic.table[0][17],
+                         candidate.decision_policy.table[0][17])
+
+    def test_bet_spread(self):
+        """Test the bet follows the true count."""
+        table = HeadlessTable(max_bet=50, counting_systems=(HI_LO, ))
+        player = Player({'id': 1, 'name': 'Bot', 'chips': 1000})
+        bet_spread = BetSpread((1, 2, 4, 8), 10)
+        self.assertEqual(bet_spread(player, table), 10)
+        table.shoe.counter.running_counts[0] = 15
+        self.assertEqual(bet_spread(player, table), 40)
+        table.shoe.counter.running_counts[0] = 60
+        self.assertEqual(bet_spread(player, table), 50)
+
+
+class TestCardCounter(unittest.TestCase):
+    """Test case for counting cards as the shoe deals them."""
+
+    def setUp(self):
+        self.shoe = CompactShoe(2, counting_systems=(HI_LO, KO))
+        self.shoe.shuffle()
+
+    def test_balanced_count_ends_at_zero(self):
+        """Test Hi-Lo counts back to zero over a whole shoe."""
+        for _ in range(2 * DECK_SIZE):
+            self.shoe.deal()
+        self.assertEqual(self.shoe.counter.running_count('Hi-Lo'), 0)
+        self.assertEqual(self.shoe.counter.running_count('KO'), 4)
+        self.assertEqual(self.shoe.counter.cards_left, 0)
+
+    def test_counts_dealt_cards(self):
+        """Test counts match the cards dealt so far."""
+        dealt = [self.shoe.get_top_card() for _ in range(40)]
+        counter = self.shoe.counter
+        hi_lo = sum(HI_LO.tags[RANKS.index(card.rank)] for card in dealt)
+        self.assertEqual(counter.running_count(), hi_lo)
+        self.assertEqual(counter.running_count('KO'),
+                         -4 + sum(KO.tags[RANKS.index(card.rank)]
+                                  for card in dealt))
+        self.assertAlmostEqual(counter.true_count(),
+                               hi_lo / ((2 * DECK_SIZE - 40) / DECK_SIZE))
+        aces = sum(card.rank == 'Ace' for card in dealt)
+        self.assertEqual(counter.remaining[RANKS.index('Ace')], 8 - aces)
+        self.assertEqual(composition_of_shoe(self.shoe)[0], 8 - aces)
+
+    def test_reset(self):
+        """Test the count restarts from the cards reshuffled into the shoe."""
+        dealt = [self.shoe.get_top_card() for _ in range(2 * DECK_SIZE)]
+        self.shoe.discard(dealt[:30])
+        card = self.shoe.get_top_card()
+        counter = self.shoe.counter
+        self.assertEqual(counter.cards_left, 29)
+        self.assertEqual(sum(counter.remaining), 29)
+        self.assertEqual(counter.running_count('KO'),
+                         -4 + KO.tags[RANKS.index(card.rank)])
+
+    def test_legacy_shoe(self):
+        """Test Shoe counts the cards it deals."""
+        shoe = Shoe(1, counting_systems=(HI_LO, ))
+        card = shoe.get_top_card()
+        self.assertEqual(shoe.counter.running_count(),
+                         HI_LO.tags[RANKS.index(card.rank)])
+        self.assertEqual(shoe.counter.cards_left, DECK_SIZE - 1)
+
+
+class TestGameServer(unittest.TestCase):
+    """Test case for the asyncio game server."""
+
+    def play(self, clients, rounds):
+        """Connect clients bots over a unix socket and play rounds."""
+        async def main(path):
+            server = GameServer(seats_per_table=2,
+                                delays={
+                                    'round': 0,
+                                    'deal': 0,
+                                    'shuffle': 0
+                                })
+            listener = await server.start_unix(path)
+
+            async def client(name):
+                reader, writer = await asyncio.open_unix_connection(path)
+                return await play_client(reader,
+                                         writer,
+                                         name,
+                                         chips=1000,
+                                         rounds=rounds)
+
+            tables = []
+            playing = asyncio.gather(
+                *[client(f'Bot {index}') for index in range(clients)])
+            while not playing.done():
+                tables.append(len(server.tables))
+                await asyncio.sleep(0.001)
+            server.close()
+            listener.close()
+            await listener.wait_closed()
+            await asyncio.sleep(0)
+            return await playing, max(tables)
+
+        with tempfile.TemporaryDirectory() as directory:
+            return asyncio.run(main(os.path.join(directory, 'server.sock')))
+
+    def test_clients_play_concurrent_tables(self):
+        """Test clients are spread over tables and play their rounds."""
+        chips, tables = self.play(clients=6, rounds=5)
+        self.assertEqual(len(chips), 6)
+        self.assertEqual(tables, 3)
+        for player_chips in chips:
+            self.assertTrue(975 <= player_chips <= 1025)
+
+    def test_reply_not_an_object(self):
+        """Test a client replying with a JSON array can't stop its table."""
+
+        async def main(path):
+            server = GameServer(seats_per_table=2,
+                                delays={
+                                    'round': 0,
+                                    'deal': 0,
+                                    'shuffle': 0
+                                },
+                                timeout=1)
+            listener = await server.start_unix(path)
+
+            async def bad_client():
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(b'{"type": "join", "name": "Bad"}\n')
+                bets = 0
+                while bets < 2:
+                    message = json.loads(await reader.readline())
+                    if message['type'] == 'bet':
+                        bets += 1
+                        # Bet once the good client sits at the table too
+                        await asyncio.sleep(0.02)
+                        writer.write(b'{"type": "bet", "amount": 5}\n'
+                                     if bets == 1 else b'[1]\n')
+                    elif message['type'] == 'decision':
+                        writer.write(b'{"type": "decision", "action": "S"}\n')
+                await asyncio.sleep(0.02)
+                writer.close()
+
+            async def client():
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(b'{"type": "join", "name": "Good"}\n')
+                results = 0
+                while results < 3:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    message = json.loads(line)
+                    if message['type'] == 'result':
+                        results += 1
+                    elif message['type'] == 'bet':
+                        writer.write(b'{"type": "bet", "amount": 5}\n')
+                    elif message['type'] == 'decision':
+                        writer.write(b'{"type": "decision", "action": "S"}\n')
+                writer.close()
+                return results
+
+            bad = asyncio.ensure_future(bad_client())
+            await asyncio.sleep(0.01)
+            results = await client()
+            await bad
+            server.close()
+            listener.close()
+            await listener.wait_closed()
+            return results
+
+        with tempfile.TemporaryDirectory() as directory:
+            results = asyncio.run(main(os.path.join(directory,
+                                                    'server.sock')))
+        self.assertEqual(results, 3)
+
+    def test_invalid_decision(self):
+        """Test decisions that aren't one of the options are asked again."""
+
+        async def main(path):
+            server = GameServer(seats_per_table=2,
+                                delays={
+                                    'round': 0,
+                                    'deal': 0,
+                                    'shuffle': 0
+                                })
+            listener = await server.start_unix(path)
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'{"type": "join", "name": "Bot"}\n')
+            statuses = []
+            answers = ('', 'HS', 'S')
+            asked = 0
+            while len(statuses) < 20:
+                message = json.loads(await reader.readline())
+                if message['type'] == 'bet':
+                    reply = {'type': 'bet', 'amount': 5}
+                elif message['type'] == 'decision':
+                    reply = {
+                        'type': 'decision',
+                        'action': answers[asked % len(answers)]
+                    }
+                    asked += 1
+                else:
+                    if message['type'] == 'result':
+                        statuses.append(message['status'])
+                    continue
+                writer.write(json.dumps(reply).encode() + b'\n')
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            listener.close()
+            await listener.wait_closed()
+            return statuses
+
+        with tempfile.TemporaryDirectory() as directory:
+            statuses = asyncio.run(main(os.path.join(directory,
+                                                     'server.sock')))
+        self.assertNotIn('surrender', statuses)
+        self.assertIn('stay', statuses)
+
+    def test_garbled_decision(self):
+        """Test garbled decision replies are asked again, not stood."""
+
+        async def main(path):
+            server = GameServer(seats_per_table=2,
+                                delays={
+                                    'round': 0,
+                                    'deal': 0,
+                                    'shuffle': 0
+                                })
+            listener = await server.start_unix(path)
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'{"type": "join", "name": "Bot"}\n')
+            asked = []
+            decisions = 0
+            while len(asked) < 20:
+                message = json.loads(await reader.readline())
+                if message['type'] == 'bet':
+                    writer.write(b'{"type": "bet", "amount": 5}\n')
+                elif message['type'] == 'decision':
+                    decisions += 1
+                    writer.write(b'not json\n' if decisions % 2 else
+                                 b'{"type": "decision", "action": "S"}\n')
+                elif message['type'] == 'result':
+                    asked.append(decisions)
+                    decisions = 0
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            listener.close()
+            await listener.wait_closed()
+            return asked
+
+        with tempfile.TemporaryDirectory() as directory:
+            asked = asyncio.run(main(os.path.join(directory, 'server.sock')))
+        self.assertLessEqual(set(asked), {0, 2})
+        self.assertIn(2, asked)
+
+    def test_close_mid_round(self):
+        """Test closing the server mid-round lets the tables finish it."""
+
+        async def main(path):
+            server = GameServer(seats_per_table=2,
+                                delays={
+                                    'round': 0,
+                                    'deal': 0,
+                                    'shuffle': 0
+                                })
+            listener = await server.start_unix(path)
+
+            async def client(name):
+                reader, writer = await asyncio.open_unix_connection(path)
+                return await play_client(reader,
+                                         writer,
+                                         name,
+                                         decide=close_and_stay)
+
+            def close_and_stay(message):
+                server.close()
+                return 'S'
+
+            with self.assertNoLogs('blackjack', 'ERROR'):
+                chips = await asyncio.gather(client('Bot 0'), client('Bot 1'))
+                await server.wait_closed()
+            listener.close()
+            await listener.wait_closed()
+            return chips, server
+
+        with tempfile.TemporaryDirectory() as directory:
+            chips, server = asyncio.run(
+                main(os.path.join(directory, 'server.sock')))
+        self.assertEqual(len(chips), 2)
+        self.assertEqual(server.tables, [])
+        self.assertEqual(server.tasks, set())
+
+
+class TestEvents(unittest.TestCase):
+    """Test case for routing game output through events."""
+
+    def setUp(self):
+        self.events = EventBus()
+        self.counter = self.events.subscribe(EventCounter())
+        self.table = Table(min_bet=10, max_bet=25, events=self.events)
+        self.table.players = [
+            Player({
+                'id': 1,
+                'name': 'Player 1',
+                'chips': 100
+            })
+        ]
+
+    def test_table_emits_events(self):
+        """Test a settled round emits structured events."""
+        recorded = []
+        self.events.subscribe(recorded.append)
+        self.table.deal_cards()
+        self.table.pay_out_and_collect()
+        kinds = [event.kind for event in recorded]
+        self.assertEqual(kinds[:2], ['deal', 'dealt'])
+        self.assertEqual(kinds[2:4], ['settle', 'dealer_result'])
+        self.assertIn(kinds[4], ('win', 'lose', 'push'))
+        self.assertEqual(recorded[4].fields['chips'],
+                         self.table.players[0].chips)
+        self.assertEqual(self.counter.counts['settled'], 1)
+
+    def test_console_renderer(self):
+        """Test events render as the game's console text."""
+        stream = io.StringIO()
+        renderer = ConsoleRenderer(stream, buffer_size=10)
+        self.events.subscribe(renderer)
+        game_warning('Bet amount must be full dollar', self.events)
+        game_command('Dealing the cards...', self.events)
+        self.assertEqual(stream.getvalue(), '')
+        self.events.flush()
+        self.assertEqual(
+            stream.getvalue(), '*** Bet amount must be full dollar ***\n\n'
+            '\nDealing the cards...\n\n')
+
+    def test_render_push(self):
+        """Test pushes render with the hand, blackjack only for naturals."""
+
+        def hand(*ranks):
+            hand = Hand()
+            hand.cards = [Card(rank, 'Spades') for rank in ranks]
+            hand.check_for_blackjack()
+            return hand
+
+        stream = io.StringIO()
+        self.events.subscribe(ConsoleRenderer(stream, buffer_size=0))
+        player = self.table.players[0]
+        self.events.emit('push',
+                         player=player,
+                         hand=hand('10', '9'),
+                         dealer_hand=hand('King', '9'),
+                         amount=0,
+                         chips=100)
+        self.events.emit('push',
+                         player=player,
+                         hand=hand('Ace', 'King'),
+                         dealer_hand=hand('Ace', 'Queen'),
+                         amount=0,
+                         chips=100)
+        self.assertEqual(
+            stream.getvalue(), f'{player} pushes with 19. PUSH\n'
+            f'{player} and dealer both have blackjack. PUSH\n')
+
+    def test_null_events(self):
+        """Test the null bus drops events and takes no subscribers."""
+        NULL_EVENTS.emit('deal', players=[])
+        with self.assertRaises(TypeError):
+            NULL_EVENTS.subscribe(EventCounter())
+
+
+class TestHandHistory(unittest.TestCase):
+    """Test case for the binary hand history."""
+
+    def setUp(self):
+        random.seed(1)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'hands.bin')
+        self.events = EventBus()
+        self.table = HeadlessTable(min_bet=10,
+                                   max_bet=25,
+                                   events=self.events,
+                                   decision_policy=split_and_double)
+        for player_id in (1, 2):
+            self.table.add_player(
+                Player({
+                    'id': player_id,
+                    'name': f'Bot {player_id}',
+                    'chips': 100000
+                }))
+
+    def test_replay_matches_table(self):
+        """Test replayed rounds settle as the table settled them."""
+        with HandHistoryWriter(self.path, buffer_records=64) as writer:
+            self.events.subscribe(writer)
+            stats = self.table.run(500)
+
+        with HandHistory(self.path) as history:
+            rounds = list(history.rounds())
+            self.assertEqual(len(rounds), 500)
+            self.assertEqual(history[0].kind, ROUND)
+            self.assertEqual(history[0].amount, 2)
+            self.assertEqual(history[-1].kind, SETTLE)
+            net = 0
+            for records in rounds:
+                hands, results = replay(records)
+                self.assertEqual(len(hands), 3)
+                for seat, settled in results.items():
+                    self.assertEqual(len(settled), len(hands[seat]))
+                    for hand, (result, amount) in zip(hands[seat], settled):
+                        self.assertEqual(
+                            settle_hand(hand, hands[DEALER_SEAT][0]), result)
+                        net += amount
+        self.assertEqual(net, stats.net)
+        self.assertGreater(stats.hands, 1000)
+
+    def test_replay_surrender(self):
+        """Test surrendered hands replay as surrendered, losing half."""
+        rules = Rules(surrender=True)
+        table = HeadlessTable(min_bet=10,
+                              max_bet=10,
+                              decision_policy=lambda *args: 'R',
+                              events=self.events,
+                              rules=rules)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 100000}))
+        with HandHistoryWriter(self.path) as writer:
+            self.events.subscribe(writer)
+            table.run(50)
+        surrendered = 0
+        with HandHistory(self.path) as history:
+            for records in history.rounds():
+                hands, results = replay(records)
+                (result, amount), = results[0]
+                if hands[0][0].status_code == SURRENDER:
+                    surrendered += 1
+                    self.assertEqual(amount, -5)
+                self.assertEqual(
+                    settle_hand(hands[0][0], hands[DEALER_SEAT][0], rules) *
+                    10, amount)
+        self.assertGreater(surrendered, 30)
+
+    def test_append(self):
+        """Test a second writer appends to an existing history."""
+        table = Table(min_bet=10,
+                      max_bet=25,
+                      events=self.events,
+                      clock=VirtualClock())
+        table.players = list(self.table.players)
+        for _ in range(2):
+            with HandHistoryWriter(self.path) as writer:
+                self.events.subscribe(writer)
+                table.clear_table()
+                table.deal_cards()
+                self.events.unsubscribe(writer)
+        with HandHistory(self.path) as history:
+            self.assertEqual(len(history), 14)
+            self.assertEqual(
+                [record.round for record in history.records()],
+                [1] * 7 + [1] * 7)
+            self.assertEqual(history[8].kind, DEAL)
+            self.assertEqual(history[8].card,
+                             table.players[0].hand.cards[0].code)
+
+    def test_invalid_file(self):
+        """Test reading a file that isn't a hand history."""
+        with open(self.path, 'wb') as history_file:
+            history_file.write(b'not a history')
+        with self.assertRaises(ValueError):
+            HandHistory(self.path)
+
+
+class TestBenchmark(unittest.TestCase):
+    """Test case for the benchmark suite."""
+
+    def test_run_benchmarks(self):
+        """Test results hold the time and rate of each benchmark."""
+        results = benchmark.run_benchmarks(['hand.calculate_total'], repeat=1)
+        result = results['benchmarks']['hand.calculate_total']
+        self.assertAlmostEqual(
+            result['ns_per_op'] * result['ops_per_sec'] / 1e9, 1)
+
+    def test_table_round(self):
+        """Test scripted players play Table rounds without pauses."""
+        run, hands = benchmark.table_round(rounds=20, players=2)
+        self.assertEqual(hands, 40)
+        run()
+
+    def test_compare(self):
+        """Test regressions beyond the threshold are flagged."""
+        baseline = {'benchmarks': {'a': {'ns_per_op': 100.0},
+                                   'b': {'ns_per_op': 100.0}}}
+        current = {'benchmarks': {'a': {'ns_per_op': 105.0},
+                                  'b': {'ns_per_op': 125.0},
+                                  'c': {'ns_per_op': 1.0}}}
+        rows = benchmark.compare(baseline, current, threshold=.1)
+        self.assertEqual([(row[0], row[4]) for row in rows],
+                         [('a', False), ('b', True)])
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test case for table snapshots."""
+
+    def table(self, seed, rules=None):
+        table = HeadlessTable(rng=random.Random(seed),
+                              counting_systems=(HI_LO, ),
+                              decision_policy=split_and_double,
+                              rules=rules)
+        for player_id in range(3):
+            table.add_player(
+                Player({
+                    'id': player_id,
+                    'name': f'Bot {player_id}',
+                    'chips': 100000
+                }))
+        return table
+
+    def assertSameGame(self, table, other):
+        self.assertEqual(table.stats.net, other.stats.net)
+        self.assertEqual([player.chips for player in table.players],
+                         [player.chips for player in other.players])
+
+    def test_round_trip(self):
+        """Test a restored table plays on exactly like the original."""
+        for rules in (Rules(), Rules(continuous_shuffle=True)):
+            table = self.table(1, rules)
+            table.run(77)
+            data = snapshot(table, rng=True)
+            other = self.table(2, rules)
+            restore(other, data)
+            self.assertEqual(snapshot(other, rng=True), data)
+            self.assertEqual(other.shoe.counter.running_count(),
+                             table.shoe.counter.running_count())
+            table.run(300)
+            other.run(300)
+            self.assertSameGame(table, other)
+
+    def test_mid_round(self):
+        """Test a round dealt on one table is finished on another."""
+        table = self.table(3)
+        table.run(10)
+        table.clear_table()
+        table.take_bets()
+        table.deal_cards()
+        other = self.table(4)
+        other.remove_player(0)
+        restore(other, snapshot(table))
+        self.assertEqual([player.id for player in other.players], [0, 1, 2])
+        self.assertEqual(len(other.active_players), 3)
+        for phase in ('play_hand', 'pay_out_and_collect'):
+            getattr(table, phase)()
+            getattr(other, phase)()
+        self.assertSameGame(table, other)
+
+    def test_console_table(self):
+        """Test a Table's shoe of Card objects is restored."""
+        table = Table(events=NULL_EVENTS, rules=Rules(deck_count=2))
+        table.add_player(Player({'id': 1, 'name': 'Chris', 'chips': 50}))
+        table.shoe.shuffle()
+        table.players[0].hand.add_card(table.shoe.get_top_card())
+        other = Table(events=NULL_EVENTS, rules=Rules(deck_count=2))
+        restore(other, snapshot(table))
+        self.assertEqual([card.code for card in other.shoe.cards],
+                         [card.code for card in table.shoe.cards])
+        self.assertEqual(other.players[0].chips, 50)
+        self.assertEqual(other.players[0].hand.calculate_total(),
+                         table.players[0].hand.calculate_total())
+
+    def test_invalid(self):
+        """Test snapshots of another shoe or format are rejected."""
+        data = snapshot(self.table(5))
+        with self.assertRaises(ValueError):
+            restore(self.table(5, Rules(continuous_shuffle=True)), data)
+        with self.assertRaises(ValueError):
+            restore(self.table(5), b'BJHH' + data[4:])
+
+
+class TestMetrics(unittest.TestCase):
+    """Test case for the metrics registry and Table instrumentation."""
+
+    def setUp(self):
+        self.metrics = Metrics(buckets=(.1, 1))
+
+    def test_histogram(self):
+        """Test histograms export cumulative buckets, sum and count."""
+        histogram = self.metrics.histogram('wait_seconds', kind='bet')
+        for value in (.05, .5, 5):
+            histogram.observe(value)
+        self.metrics.counter('rounds_total').inc(2)
+        self.assertEqual(
+            self.metrics.to_prometheus(), '# TYPE rounds_total counter\n'
+            'rounds_total 2\n'
+            '# TYPE wait_seconds histogram\n'
+            'wait_seconds_bucket{kind="bet",le="0.1"} 1\n'
+            'wait_seconds_bucket{kind="bet",le="1.0"} 2\n'
+            'wait_seconds_bucket{kind="bet",le="+Inf"} 3\n'
+            'wait_seconds_sum{kind="bet"} 5.55\n'
+            'wait_seconds_count{kind="bet"} 3\n')
+        self.assertEqual(
+            self.metrics.to_dict()['wait_seconds'][0]['buckets'], {
+                '0.1': 1,
+                '1.0': 2,
+                '+Inf': 3
+            })
+        with self.assertRaises(ValueError):
+            self.metrics.counter('wait_seconds', kind='bet')
+
+    def test_table_phases(self):
+        """Test start_game times its phases, bets and decisions."""
+        table = Table(min_bet=10,
+                      max_bet=10,
+                      events=NULL_EVENTS,
+                      rng=random.Random(1),
+                      metrics=self.metrics,
+                      clock=VirtualClock())
+        table.add_player(Player({'id': 1, 'name': 'Player 1', 'chips': 30}))
+        answers = {'Decision: ': 'S'}
+        with mock.patch('builtins.input',
+                        lambda prompt: answers.get(prompt, '10')):
+            table.start_game()
+
+        rounds = self.metrics.counter('blackjack_rounds_total').value
+        self.assertGreaterEqual(rounds, 3)
+        for phase in ('clear_table', 'take_bets', 'deal_cards', 'play_hand',
+                      'pay_out_and_collect'):
+            self.assertEqual(
+                self.metrics.histogram('blackjack_phase_seconds',
+                                       phase=phase).count, rounds)
+        self.assertEqual(
+            self.metrics.histogram('blackjack_bet_seconds').count, rounds)
+        self.assertIn('blackjack_decision_seconds_count',
+                      self.metrics.to_prometheus())
+
+    def test_shoe_resets(self):
+        """Test the cut card reshuffle is timed like an empty shoe reset."""
+        table = Table(events=NULL_EVENTS,
+                      rng=random.Random(1),
+                      metrics=self.metrics,
+                      clock=VirtualClock(),
+                      rules=Rules(deck_count=1, penetration=.5))
+        shoe = table.shoe
+        shoe.discard([
+            shoe.get_top_card()
+            for _ in range(len(shoe) - table.rules.reshuffle_at)
+        ])
+        table.clear_table()
+        self.assertEqual(len(shoe), DECK_SIZE)
+        resets = self.metrics.histogram('blackjack_shoe_reset_seconds')
+        self.assertEqual(resets.count, 1)
+        shoe.discard([shoe.get_top_card() for _ in range(DECK_SIZE)])
+        shoe.get_top_card()
+        self.assertEqual(resets.count, 2)
+
+
+class TestBankrollAnalytics(unittest.TestCase):
+    """Test case for the streaming bankroll analytics."""
+
+    def play(self, rounds, seed):
+        events = EventBus()
+        analytics = events.subscribe(BankrollAnalytics(strategy='mimic'))
+        table = HeadlessTable(min_bet=10,
+                              max_bet=10,
+                              events=events,
+                              rng=random.Random(seed),
+                              rules=Rules(blackjack_payout=1.5))
+        for player_id in (1, 2):
+            table.add_player(
+                Player({
+                    'id': player_id,
+                    'name': f'Bot {player_id}',
+                    'chips': 10**6
+                }))
+        return analytics, table.run(rounds)
+
+    def test_matches_table(self):
+        """Test the aggregates agree with the table's own stats."""
+        analytics, stats = self.play(2000, 1)
+        total = analytics.strategies['mimic']
+        self.assertEqual(total.hands, stats.hands)
+        self.assertEqual(total.net, stats.net)
+        self.assertEqual(total.wins, stats.wins)
+        self.assertEqual(sum(total.histogram.values()), stats.hands)
+        self.assertEqual(set(total.histogram) - {-10, 0, 10, 15}, set())
+        self.assertAlmostEqual(total.win_rate, stats.net / stats.hands)
+        self.assertEqual(
+            sum(player.hands for player in analytics.players.values()),
+            stats.hands)
+        self.assertGreater(total.max_drawdown, 0)
+        self.assertGreaterEqual(total.max_drawdown, -total.trough)
+
+    def test_merge(self):
+        """Test merged runs equal one run over the same hands."""
+        amounts = [random.Random(3).choice((-10, 0, 10, 15, -20))
+                   for _ in range(1000)]
+        whole, first, second = (BankrollStats(), BankrollStats(),
+                                BankrollStats())
+        for index, amount in enumerate(amounts):
+            whole.add(amount, 10)
+            (first if index < 400 else second).add(amount, 10)
+        first.merge(second)
+        for name in ('hands', 'net', 'peak', 'trough', 'max_drawdown',
+                     'histogram', 'total_bet'):
+            self.assertEqual(getattr(first, name), getattr(whole, name))
+        self.assertAlmostEqual(first.variance, whole.variance)
+        self.assertAlmostEqual(first.mean, whole.mean)
+        analytics = BankrollAnalytics().merge(self.play(50, 1)[0])
+        self.assertEqual(set(analytics.players), {1, 2})
+
+    def test_risk(self):
+        """Test N0 and risk of ruin follow the win rate and variance."""
+        stats = BankrollStats()
+        for amount in (20, -10, 20, -10):
+            stats.add(amount, 10)
+        self.assertEqual(stats.win_rate, 5)
+        self.assertEqual(stats.variance, 300)
+        self.assertEqual(stats.n0, 12)
+        self.assertAlmostEqual(stats.risk_of_ruin(300), math.exp(-10))
+        stats.add(-100, 10)
+        self.assertEqual(stats.risk_of_ruin(10**6), 1)
+
+
+class TestResultStore(unittest.TestCase):
+    """Test case for the columnar result store."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def play(self, rounds, seed=3):
+        random.seed(seed)
+        events = EventBus()
+        table = HeadlessTable(events=events,
+                              counting_systems=(HI_LO, ),
+                              decision_policy=split_and_double)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 100000}))
+        table.add_player(Player({'id': 2, 'name': 'Bot', 'chips': 100000}))
+        with ResultStoreWriter(self.directory,
+                               counter=table.shoe.counter,
+                               buffer_rows=100) as writer:
+            events.subscribe(writer)
+            table.run(rounds)
+        return table.stats
+
+    def test_rows(self):
+        """Test every settled hand is stored with its actions."""
+        stats = self.play(300)
+        with ResultStore(self.directory) as store:
+            self.assertEqual(len(store), stats.hands)
+            self.assertEqual(sum(store.column('net')), stats.net * 100)
+            actions = {
+                decode_actions(code) for code in store.column('actions')
+            }
+            self.assertLessEqual(set(store.column('upcard')),
+                                 set(range(1, 11)))
+        self.assertIn('', actions)
+        self.assertIn('HS', actions)
+        self.assertIn('D', actions)
+        self.assertTrue(any(action.startswith('P') for action in actions))
+
+    def test_group_by(self):
+        """Test indexed queries match scans of the columns."""
+        stats = self.play(300)
+        with ResultStore(self.directory) as store:
+            total, = store.group_by().values()
+            self.assertEqual(total.rows, stats.hands)
+            self.assertAlmostEqual(total.net, stats.net)
+            by_upcard = store.group_by(['upcard'], {'soft': 0})
+            # dealer_total isn't indexed, so this query scans the columns
+            scanned = store.group_by(['upcard', 'dealer_total'], {'soft': 0})
+        self.assertEqual(len(by_upcard), 10)
+        for (upcard, ), aggregate in by_upcard.items():
+            groups = {
+                dealer_total: group
+                for (key, dealer_total), group in scanned.items()
+                if key == upcard
+            }
+            self.assertEqual(aggregate.rows,
+                             sum(group.rows for group in groups.values()))
+            self.assertAlmostEqual(
+                aggregate.net, sum(group.net for group in groups.values()))
+            self.assertEqual(
+                aggregate.dealer_busts,
+                sum(group.rows for dealer_total, group in groups.items()
+                    if dealer_total > 21))
+
+    def test_append(self):
+        """Test reopened stores are appended to, indexes included."""
+        stats = self.play(100)
+        more_stats = self.play(100, seed=4)
+        with ResultStore(self.directory) as store:
+            self.assertEqual(len(store), stats.hands + more_stats.hands)
+            hits = store.group_by(['true_count'], {'action': 1})
+            first_hits = list(store.column('action')).count(1)
+        self.assertGreater(len(hits), 1)
+        self.assertEqual(sum(aggregate.rows for aggregate in hits.values()),
+                         first_hits)
+
+    def test_crash(self):
+        """Test rows written after the last saved index are dropped."""
+        stats = self.play(100)
+        # A crash in the middle of a flush, only the net column written
+        net_path = os.path.join(self.directory, 'net.col')
+        with open(net_path, 'ab') as file:
+            file.write((100).to_bytes(4, 'little') * 5)
+        more_stats = self.play(100, seed=4)
+        hands = stats.hands + more_stats.hands
+        self.assertEqual(os.path.getsize(net_path), 4 * hands)
+        with ResultStore(self.directory) as store:
+            self.assertEqual(len(store), hands)
+            self.assertAlmostEqual(
+                sum(store.column('net')) / 100, stats.net + more_stats.net)
+
+
+class TestVirtualClock(unittest.TestCase):
+    """Test case for the virtual clock."""
+
+    def test_table_pauses(self):
+        """Test Table pauses advance virtual time without sleeping."""
+        clock = VirtualClock()
+        table = Table(events=NULL_EVENTS, clock=clock)
+        table.players = [Player({'id': 1, 'name': 'Player 1', 'chips': 100})]
+        table.clear_table()
+        table.deal_cards()
+        table.shoe.shuffle()
+        self.assertEqual(clock.spent, {
+            'round': PAUSES['round'],
+            'deal': PAUSES['deal'],
+            'shuffle': PAUSES['shuffle']
+        })
+        self.assertEqual(clock.now(), 6.5)
+
+    def test_headless_shift(self):
+        """Test a simulated shift accounts for pauses and think times."""
+        clock = VirtualClock(think_times={'bet': 1, 'decision': 1})
+        table = HeadlessTable(clock=clock)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 100000}))
+        stats = table.run_shift(3600)
+        self.assertGreaterEqual(clock.elapsed, 3600)
+        self.assertEqual(clock.spent['round'], 3 * stats.rounds)
+        self.assertEqual(clock.spent['bet'], stats.hands)
+        self.assertAlmostEqual(sum(clock.utilisation().values()), 1)
+        self.assertAlmostEqual(clock.hands_per_hour(stats.hands),
+                               stats.hands * 3600 / clock.elapsed)
+        with self.assertRaises(ValueError):
+            HeadlessTable().run_shift(60)
+
+
+class TestRules(unittest.TestCase):
+    """Test case for compiled house rules."""
+
+    def make_hand(self, *ranks):
+        hand = Hand()
+        hand.cards = [Card(rank, 'Spades') for rank in ranks]
+        hand.check_for_bust()
+        hand.check_for_blackjack()
+        return hand
+
+    def test_status_codes(self):
+        """Test statuses are integer codes with their names kept."""
+        hand = self.make_hand('Ace', 'King')
+        self.assertEqual(hand.status_code, BLACKJACK_STATUS)
+        self.assertEqual(hand.status, 'blackjack')
+        hand.status = None
+        self.assertEqual(hand.status_code, 0)
+
+    def test_dealer_soft_17(self):
+        """Test the dealer stands on soft 17 unless the rules say H17."""
+        soft_17 = self.make_hand('Ace', '6')
+        hard_17 = self.make_hand('10', '7')
+        self.assertFalse(Rules().dealer_hits_hand(soft_17))
+        self.assertTrue(
+            Rules(dealer_hits_soft_17=True).dealer_hits_hand(soft_17))
+        self.assertFalse(
+            Rules(dealer_hits_soft_17=True).dealer_hits_hand(hard_17))
+        self.assertTrue(Rules().dealer_hits_hand(self.make_hand('10', '6')))
+
+    def test_settlement(self):
+        """Test payouts follow the blackjack payout and tie rules."""
+        rules = Rules(blackjack_payout=1.5, ties_push=True)
+        blackjack = self.make_hand('Ace', 'King')
+        self.assertEqual(rules.settle(blackjack, self.make_hand('10', '10')),
+                         1.5)
+        self.assertEqual(
+            rules.settle(blackjack, self.make_hand('Ace', 'Jack')), 0)
+        eighteen = self.make_hand('9', '9')
+        dealer_eighteen = self.make_hand('10', '8')
+        self.assertEqual(rules.settle(eighteen, dealer_eighteen), 0)
+        self.assertEqual(Rules().settle(eighteen, dealer_eighteen), -1)
+        surrendered = self.make_hand('10', '6')
+        surrendered.status_code = SURRENDER
+        self.assertEqual(
+            rules.settle(surrendered, self.make_hand('10', '6', '9')), -.5)
+
+    def test_surrender(self):
+        """Test surrendered hands lose half their bet."""
+        random.seed(1)
+        lost = []
+        events = EventBus()
+        events.subscribe(lambda event: event.kind == 'lose' and lost.append(
+            event.fields['amount']))
+        table = HeadlessTable(min_bet=10,
+                              max_bet=10,
+                              decision_policy=lambda *args: 'R',
+                              events=events,
+                              rules=Rules(surrender=True))
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 100000}))
+        stats = table.run(200)
+        self.assertEqual(set(lost), {5, 10})
+        self.assertEqual(stats.wins, stats.blackjacks)
+        for decision in ('R', '', 'HS'):
+            table = HeadlessTable(decision_policy=lambda *args: decision)
+            table.add_player(
+                Player({
+                    'id': 1,
+                    'name': 'Bot',
+                    'chips': 100000
+                }))
+            with self.assertRaises(ValueError):
+                table.run(20)
+
+    def test_penetration(self):
+        """Test the shoe is reshuffled between rounds after the cut card."""
+        with self.assertRaises(ValueError):
+            Rules(penetration=0)
+        table = HeadlessTable(rules=Rules(deck_count=1, penetration=.5))
+        self.assertEqual(table.rules.reshuffle_at, 26)
+        table.shoe.discard_codes([table.shoe.deal() for _ in range(25)])
+        table.clear_table()
+        self.assertEqual(len(table.shoe), 27)
+        table.shoe.discard_codes([table.shoe.deal()])
+        table.clear_table()
+        self.assertEqual(len(table.shoe), DECK_SIZE)
+
+
+class TestSplitAndDouble(unittest.TestCase):
+    """Test case for splitting and doubling down."""
+
+    def make_hands(self, *ranks, bet=10):
+        hands = Hands()
+        hands[0].cards = [Card(rank, 'Spades') for rank in ranks]
+        hands[0].set_bet_amt(bet)
+        return hands
+
+    def test_split(self):
+        """Test splitting moves the second card to a hand after it."""
+        hands = self.make_hands('8', '8')
+        hands[0].status_code = SPLIT
+        new_hand = hands.split(0)
+        self.assertEqual(len(hands), 2)
+        self.assertIs(hands[1], new_hand)
+        self.assertIs(hands[-1], new_hand)
+        for hand in hands:
+            self.assertEqual(hand.calculate_total(), 8)
+            self.assertEqual(hand.bet_amt, 10)
+            self.assertEqual(hand.status_code, SPLIT)
+        hands[0].add_card(Card('8', 'Hearts'))
+        hands.split(0)
+        self.assertEqual([len(hand.cards) for hand in hands], [1, 1, 1])
+        self.assertIs(hands[2], new_hand)
+        self.assertEqual(hands.total_bet(), 30)
+        with self.assertRaises(IndexError):
+            hands[3]
+
+    def test_reuse(self):
+        """Test cleared hands are reused by later splits."""
+        hands = self.make_hands('Ace', 'Ace')
+        first = hands[0]
+        second = hands.split(0)
+        hands.clear()
+        self.assertEqual(len(hands), 1)
+        self.assertIs(hands[0], first)
+        self.assertEqual(first.cards, [])
+        self.assertEqual(first.bet_amt, 0)
+        hands[0].cards = [Card('9', 'Spades'), Card('9', 'Hearts')]
+        self.assertIs(hands.split(0), second)
+        self.assertEqual(second.calculate_total(), 9)
+
+    def test_actions(self):
+        """Test the rules decide when a hand may double or split."""
+        rules = Rules()
+        self.assertEqual(rules.actions(self.make_hands('8', '8'),
+                                       self.make_hands('8', '8')[0], 100),
+                         'HSDP')
+        hands = self.make_hands('8', '8')
+        self.assertEqual(rules.actions(hands, hands[0], 15), 'HS')
+        rules_without = Rules(double_down=False, max_hands=1)
+        self.assertEqual(rules_without.actions(hands, hands[0], 100), 'HS')
+        hands = self.make_hands('Ace', 'Ace')
+        hands.split(0)
+        hands[0].add_card(Card('Ace', 'Hearts'))
+        self.assertEqual(rules.actions(hands, hands[0], 100), 'S')
+        self.assertEqual(
+            Rules(resplit_aces=True).actions(hands, hands[0], 100), 'SP')
+        hands[0].pop_card()
+        hands[0].add_card(Card('5', 'Hearts'))
+        self.assertEqual(rules.actions(hands, hands[0], 100), 'S')
+        self.assertEqual(
+            Rules(surrender=True).actions(self.make_hands('10', '6'),
+                                          self.make_hands('10', '6')[0], 100),
+            'HSDR')
+
+    def test_double(self):
+        """Test doubling doubles the bet for one card."""
+        hand = self.make_hands('6', '5')[0]
+        hand.double(Card('King', 'Hearts'))
+        self.assertEqual(hand.bet_amt, 20)
+        self.assertEqual(hand.calculate_total(), 21)
+        self.assertEqual(hand.status_code, DOUBLE)
+        self.assertEqual(settle_hand(hand, self.make_hands('10', '9')[0]), 1)
+
+    def test_headless(self):
+        """Test split and doubled hands settle into the chips and stats."""
+        random.seed(1)
+        table = HeadlessTable(min_bet=10,
+                              max_bet=10,
+                              decision_policy=split_and_double)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 100000}))
+        stats = table.run(2000)
+        self.assertGreater(stats.hands, 2000)
+        self.assertGreater(stats.total_bet, 20000 + 10 * (stats.hands - 2000))
+        self.assertEqual(table.players[0].chips - 100000, stats.net)
+        self.assertLessEqual(len(table.players[0].hands.pool), 4)
+
+    def test_table(self):
+        """Test Table offers and plays splits and doubles."""
+        table = Table(min_bet=10,
+                      max_bet=10,
+                      events=NULL_EVENTS,
+                      clock=VirtualClock())
+        player = Player({'id': 1, 'name': 'Player 1', 'chips': 100})
+        table.add_player(player)
+        player.hand.set_bet_amt(10)
+        player.hand.cards = [Card('8', 'Spades'), Card('8', 'Hearts')]
+        table.dealer.hand.cards = [Card('10', 'Spades'), Card('7', 'Hearts')]
+        table.shoe.cards = [Card('3', 'Clubs'), Card('King', 'Clubs'),
+                            Card('5', 'Clubs')]
+        with mock.patch('builtins.input', side_effect=['P', 'D', 'S']):
+            table.play_hand()
+        self.assertEqual([hand.calculate_total() for hand in player.hands],
+                         [21, 13])
+        self.assertEqual([hand.bet_amt for hand in player.hands], [20, 10])
+        table.pay_out_and_collect()
+        self.assertEqual(player.chips, 100 + 20 - 10)
+
+    def test_history(self):
+        """Test splits are recorded with the index of the split hand."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'hands.bin')
+        random.seed(3)
+        events = EventBus()
+        table = HeadlessTable(events=events, decision_policy=split_and_double)
+        table.add_player(Player({'id': 1, 'name': 'Bot', 'chips': 100000}))
+        with HandHistoryWriter(path) as writer:
+            events.subscribe(writer)
+            table.run(300)
+        with HandHistory(path) as history:
+            splits = [
+                records for records in history.rounds()
+                if any(record.kind == SPLIT_RECORD for record in records)
+            ]
+        self.assertTrue(splits)
+        for records in splits:
+            hands, results = replay(records)
+            self.assertEqual(len(hands[0]), len(results[0]))
+            self.assertGreater(len(hands[0]), 1)
+
+
+class TestLobby(unittest.TestCase):
+    """Test case for the sharded lobby."""
+
+    def setUp(self):
+        self.lobby = Lobby(shards=3,
+                           seats_per_table=4,
+                           table_config={
+                               'min_bet': 10,
+                               'max_bet': 10
+                           },
+                           seed=1)
+        for player_id in range(60):
+            self.lobby.join(
+                Player({
+                    'id': player_id,
+                    'name': f'P{player_id}',
+                    'chips': 100
+                }))
+
+    def assertSeating(self):
+        lobby = self.lobby
+        seated = 0
+        for shard in lobby.shards:
+            self.assertEqual(
+                shard.player_count,
+                sum(len(table) for table in shard.tables.values()))
+            seated += shard.player_count
+            for table in shard.tables.values():
+                self.assertIs(table.shard, shard)
+                self.assertTrue(0 < len(table) <= lobby.seats_per_table)
+                self.assertEqual(table.id in shard.open_tables,
+                                 len(table) < lobby.seats_per_table)
+                for player in table.players:
+                    self.assertIs(lobby.table_of(player.id), table)
+        self.assertEqual(seated, len(lobby))
+
+    def test_join(self):
+        """Test players fill tables spread evenly over the shards."""
+        self.assertSeating()
+        self.assertEqual([shard.player_count for shard in self.lobby.shards],
+                         [20, 20, 20])
+        self.assertEqual(
+            sum(len(shard.tables) for shard in self.lobby.shards), 15)
+        with self.assertRaises(ValueError):
+            self.lobby.join(Player({'id': 0, 'name': 'P0', 'chips': 100}))
+
+    def test_leave(self):
+        """Test leaving players merge tables and rebalance shards."""
+        rng = random.Random(2)
+        player_ids = list(range(60))
+        rng.shuffle(player_ids)
+        for player_id in player_ids[:45]:
+            self.assertEqual(self.lobby.leave(player_id).id, player_id)
+            self.assertSeating()
+        counts = [shard.player_count for shard in self.lobby.shards]
+        self.assertLessEqual(max(counts) - min(counts), 8)
+        with self.assertRaises(KeyError):
+            self.lobby.leave(player_ids[0])
+
+    def test_play(self):
+        """Test playing updates chips and unseats busted players."""
+        stats, busted = self.lobby.play(30, workers=1)
+        self.assertLessEqual(stats.rounds, 15 * 30)
+        self.assertTrue(busted)
+        self.assertTrue(all(player.chips < 10 for player in busted))
+        self.assertEqual(len(self.lobby) + len(busted), 60)
+        self.assertSeating()
+        self.assertEqual(
+            sum(player.chips for player in self.lobby.players.values()) +
+            sum(player.chips for player in busted), 6000 + stats.net)